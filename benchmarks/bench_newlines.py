@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Benchmarks indenting very long multiline values with handle_newlines.
+
+Run from the repository root::
+
+    python benchmarks/bench_newlines.py [--lines 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json2rst import utils
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    #: A pasted log: many repeated lines, which used to trip up ``list.index``.
+    value = "\n".join("2021-06-01 12:00:{:02d} INFO request handled".format(i % 60) for i in range(args.lines))
+
+    times = list()
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        utils.handle_newlines(value)
+        times.append(time.perf_counter() - start)
+
+    print("{} lines ({} bytes), best of {}: {:.2f} ms".format(
+        args.lines, len(value), args.repeat, min(times) * 1000))
+
+if __name__ == "__main__":
+    main()
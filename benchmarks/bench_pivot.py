@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmarks pivot throughput at increasing file counts.
+
+If pivot scales linearly, time per file stays roughly flat
+as the number of files grows.
+
+Run from the repository root::
+
+    python benchmarks/bench_pivot.py [--sizes 1000,2000,4000,8000] [--keys 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json2rst.pivot import Pivot
+
+def make_corpus(dirname: str, count: int, keys: int) -> list:
+    files = list()
+    for i in range(count):
+        path = os.path.join(dirname, "record-{:06d}.json".format(i))
+        obj = {"key{}".format(k): "value {} {}".format(i, k) for k in range(keys)}
+        with open(path, "w") as f:
+            json.dump(obj, f)
+        files.append(path)
+    return files
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,2000,4000,8000")
+    parser.add_argument("--keys", type=int, default=20)
+    args = parser.parse_args()
+
+    sizes = [int(n) for n in args.sizes.split(",")]
+    headers = ["key{}".format(k) for k in range(0, args.keys, 2)]
+
+    print("{:>8} {:>10} {:>14}".format("files", "seconds", "us/file"))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = make_corpus(tmpdir, max(sizes), args.keys)
+        csv_out = os.path.join(tmpdir, "pivot.csv")
+
+        for n in sizes:
+            start = time.perf_counter()
+            Pivot(files[:n], headers, False, csv_out, None, None).pivot()
+            elapsed = time.perf_counter() - start
+            print("{:>8} {:>10.3f} {:>14.1f}".format(n, elapsed, elapsed / n * 1e6))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmarks rendering a page with one very long rich content cell.
+
+Run from the repository root::
+
+    python benchmarks/bench_render.py [--nodes 10000] [--repeat 5]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json2rst import utils
+
+NODE_MIX = [
+    {"heading": "A heading"},
+    {"p": "A paragraph that\nspans a few\nlines."},
+    {"ul": "an unordered list item"},
+    {"ol": "an ordered list item"},
+    {"code": "x = 1"},
+    {"code-block": "def f():"},
+    {"code-block": "    return 1"},
+]
+
+def make_page(nodes: int) -> dict:
+    rich = [NODE_MIX[i % len(NODE_MIX)] for i in range(nodes)]
+    return {"ID": "bench", "Description": "A page with {} rich nodes".format(nodes), "Assessment": rich}
+
+def best_of(repeat: int, func) -> float:
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_page(args.nodes)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        outfile = os.path.join(tmpdir, "bench.rst")
+
+        def to_file():
+            with open(outfile, "w") as f:
+                utils.write_page(f, "bench.json", data)
+
+        results = [
+            ("render_data (str)", best_of(args.repeat, lambda: utils.render_data("bench.json", data))),
+            ("write_page (StringIO)", best_of(args.repeat, lambda: utils.write_page(io.StringIO(), "bench.json", data))),
+            ("write_page (file)", best_of(args.repeat, to_file)),
+        ]
+
+    print("{} rich nodes, best of {}".format(args.nodes, args.repeat))
+    for name, seconds in results:
+        print("{:<24} {:>8.2f} ms".format(name, seconds * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Checks that importing the json2rst CLI stays within a startup budget.
+
+json2rst is often run once per file from make rules, so interpreter
+startup and import time add up. This script fails (exits with 1) if:
+
+- importing ``json2rst.cmd`` takes longer than ``--budget`` milliseconds
+  more than starting a bare interpreter (best of ``--repeat`` runs), or
+- importing ``json2rst.cmd`` imports a module that should only be
+  imported when it's needed (see :data:`LAZY_MODULES`).
+
+Run from the repository root, e.g. in CI::
+
+    python benchmarks/check_import_time.py [--budget 100] [--repeat 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+#: Modules that only some runs need. They must not be imported at startup.
+LAZY_MODULES = [
+    "base64",
+    "concurrent.futures",
+    "cProfile",
+    "csv",
+    "ctypes",
+    "json",
+    "multiprocessing",
+    "pickle",
+    "shutil",
+    "subprocess",
+    "tempfile",
+    "uuid",
+    "json2rst.pivot",
+    "json2rst.shards",
+    "json2rst.watch",
+]
+
+def best_time(code: str, repeat: int) -> float:
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def eager_imports() -> list:
+    code = "import sys, json2rst.cmd; print('\\n'.join(sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True).stdout
+    return sorted(set(out.split()) & set(LAZY_MODULES))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget", type=float, default=100.0, help="Milliseconds. Defaults to 100.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+
+    eager = eager_imports()
+    if eager:
+        print("FAIL: importing json2rst.cmd imports {}".format(", ".join(eager)))
+        failed = True
+
+    baseline = best_time("pass", args.repeat)
+    imported = best_time("import json2rst.cmd", args.repeat)
+    cost = (imported - baseline) * 1000
+
+    print("python startup: {:.1f} ms, import json2rst.cmd: +{:.1f} ms (budget {:.0f} ms)".format(
+        baseline * 1000, cost, args.budget))
+
+    if cost > args.budget:
+        print("FAIL: import time is over budget.")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
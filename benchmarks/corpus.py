@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Generates a deterministic corpus of JSON files to benchmark json2rst with.
+
+The same arguments (including --seed) always produce the same files,
+so results are comparable across commits.
+
+Run from the repository root::
+
+    python benchmarks/corpus.py OUTDIR [--files 1000] [--keys 20] [--value-size 40]
+        [--rich 0.2] [--rich-nodes 20] [--multiline 0.1] [--images 0.05] [--seed 0]
+"""
+import argparse
+import json
+import os
+import random
+from typing import List, NamedTuple
+
+class CorpusSpec(NamedTuple):
+    files: int = 1000 #: Number of JSON files.
+    keys: int = 20 #: Keys per JSON object.
+    value_size: int = 40 #: Approximate length of each plain value, in characters.
+    rich: float = 0.2 #: Fraction of values that are rich content cells.
+    rich_nodes: int = 20 #: Nodes per rich content cell.
+    multiline: float = 0.1 #: Fraction of plain values that span several lines.
+    images: float = 0.05 #: Fraction of rich nodes that are images.
+    seed: int = 0
+
+#: Rich node types other than images, weighted roughly like real reports.
+RICH_NODES = ["p"] * 4 + ["ul"] * 3 + ["ol", "heading", "code", "code-block"]
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua").split()
+
+IMAGE_DIR = "img"
+IMAGE_COUNT = 8 #: Images are shared between pages, like logos and diagrams.
+
+#: A 1x1 PNG, padded so embedding it costs something.
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d4944415478da63646060f80f0000050001a5f645"
+    "400000000049454e44ae426082") + b"\0" * 4096
+
+def words(rng: random.Random, size: int) -> str:
+    out = list()
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        out.append(word)
+        length += len(word) + 1
+    return " ".join(out)
+
+def make_value(rng: random.Random, spec: CorpusSpec) -> str:
+    if rng.random() < spec.multiline:
+        return "\n".join(words(rng, spec.value_size) for _ in range(rng.randint(2, 8)))
+    return words(rng, spec.value_size)
+
+def make_rich(rng: random.Random, spec: CorpusSpec) -> list:
+    out = list()
+    for _ in range(spec.rich_nodes):
+        if rng.random() < spec.images:
+            out.append({"image": "../{}/image-{}.png".format(IMAGE_DIR, rng.randrange(IMAGE_COUNT))})
+        else:
+            out.append({rng.choice(RICH_NODES): make_value(rng, spec)})
+    return out
+
+def make_object(rng: random.Random, spec: CorpusSpec, index: int) -> dict:
+    obj = {"ID": "REC-{:06d}".format(index)}
+    for k in range(1, spec.keys):
+        key = "key{}".format(k)
+        obj[key] = make_rich(rng, spec) if rng.random() < spec.rich else make_value(rng, spec)
+    return obj
+
+def generate(dirname: str, spec: CorpusSpec = CorpusSpec()) -> List[str]:
+    """
+    Writes ``spec.files`` JSON files to ``dirname/json``,
+    and the images they reference to ``dirname/img``.
+
+    Returns:
+        The paths of the JSON files, in order.
+    """
+    rng = random.Random(spec.seed)
+    jsondir = os.path.join(dirname, "json")
+    imgdir = os.path.join(dirname, IMAGE_DIR)
+    os.makedirs(jsondir, exist_ok=True)
+    os.makedirs(imgdir, exist_ok=True)
+
+    for i in range(IMAGE_COUNT):
+        with open(os.path.join(imgdir, "image-{}.png".format(i)), "wb") as f:
+            f.write(PNG + bytes([i]))
+
+    files = list()
+    for i in range(spec.files):
+        path = os.path.join(jsondir, "record-{:06d}.json".format(i))
+        with open(path, "w") as f:
+            json.dump(make_object(rng, spec, i), f)
+        files.append(path)
+
+    return files
+
+def add_spec_arguments(parser: argparse.ArgumentParser, spec: CorpusSpec = CorpusSpec()) -> None:
+    """Adds an option for each field of :class:`CorpusSpec` to ``parser``."""
+    for field, default in spec._asdict().items():
+        parser.add_argument(
+            "--" + field.replace("_", "-"),
+            dest=field,
+            type=type(default),
+            default=default,
+            help="Defaults to {}.".format(default))
+
+def spec_from_args(args: argparse.Namespace) -> CorpusSpec:
+    return CorpusSpec(**{field: getattr(args, field) for field in CorpusSpec._fields})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("outdir")
+    add_spec_arguments(parser)
+    args = parser.parse_args()
+
+    files = generate(args.outdir, spec_from_args(args))
+    print("Wrote {} files to {}".format(len(files), os.path.join(args.outdir, "json")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Runs the json2rst benchmark suites, and saves or compares the results.
+
+Each benchmark runs a warmup, then ``--repeat`` timed samples, and
+reports the best, median, mean, and standard deviation. Conversion and
+pivot benchmarks run on a corpus from :mod:`corpus`; the corpus options
+(``--files``, ``--keys``, ...) are the same as for ``corpus.py``.
+
+Run from the repository root::
+
+    python benchmarks/run.py [--suite convert --suite pivot ...] [--save results.json]
+
+Compare against a saved run (exits with 1 if anything got slower than --threshold)::
+
+    git checkout main && python benchmarks/run.py --save main.json
+    git checkout my-branch && python benchmarks/run.py --compare main.json
+
+Or compare two saved runs without running anything::
+
+    python benchmarks/run.py --load my-branch.json --compare main.json
+"""
+import argparse
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+import bench_render
+import corpus
+from json2rst import cmd
+from json2rst import jsonbackend
+from json2rst import utils
+from json2rst.pivot import Pivot
+
+Result = Dict[str, Any]
+
+class Context:
+    """Shared state for suites: options, a scratch directory, and the corpus."""
+    def __init__(self, args: argparse.Namespace, tmpdir: str) -> None:
+        self.args = args
+        self.repeat = args.repeat
+        self.tmpdir = tmpdir
+        self.spec = corpus.spec_from_args(args)
+        self._files = None
+
+    @property
+    def files(self) -> List[str]:
+        """The corpus, generated the first time a suite needs it."""
+        if self._files is None:
+            self._files = corpus.generate(os.path.join(self.tmpdir, "corpus"), self.spec)
+        return self._files
+
+    @property
+    def jsondir(self) -> str:
+        return os.path.dirname(self.files[0])
+
+    def scratch(self) -> str:
+        return tempfile.mkdtemp(dir=self.tmpdir)
+
+def summarize(name: str, samples: List[float], unit: str = "s", items: int = None) -> Result:
+    result = {
+        "name": name,
+        "unit": unit,
+        "samples": samples,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+    if items:
+        result["items"] = items
+        result["per_second"] = items / result["min"]
+    return result
+
+def bench(
+    name: str,
+    func: Callable[[Any], None],
+    repeat: int,
+    setup: Callable[[], Any] = None,
+    items: int = None,
+    ) -> Result:
+    """
+    Times ``func(setup())`` ``repeat`` times, after one untimed warmup run.
+    ``setup`` isn't timed.
+
+    Args:
+        items (int): Number of files (or other items) each run processes,
+            to also report throughput.
+    """
+    setup = setup if setup else lambda: None
+    func(setup())
+
+    samples = list()
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+
+    return summarize(name, samples, items=items)
+
+def peak_memory(name: str, func: Callable[[], None]) -> Result:
+    """Peak memory allocated by Python while running ``func``, in bytes."""
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return summarize(name, [float(peak)], unit="bytes")
+
+def suite_render(ctx: Context) -> List[Result]:
+    page = bench_render.make_page(10000)
+    value = "\n".join("line {}".format(i % 60) for i in range(100000))
+
+    return [
+        bench("render.write_page.10k_nodes", lambda _: utils.write_page(io.StringIO(), "bench.json", page), ctx.repeat),
+        bench("render.handle_newlines.100k_lines", lambda _: utils.handle_newlines(value), ctx.repeat),
+    ]
+
+def suite_convert(ctx: Context) -> List[Result]:
+    jobs = os.cpu_count() or 1
+    files = len(ctx.files)
+
+    def convert(jobs: int, force: bool = True, **kwargs) -> Callable[[str], None]:
+        return lambda outdir: cmd._convert_json_to_rst(ctx.jsondir, outdir, jobs, force, **kwargs)
+
+    built = ctx.scratch()
+    convert(1)(built)
+
+    return [
+        bench("convert.jobs_1", convert(1), ctx.repeat, ctx.scratch, files),
+        bench("convert.jobs_all_cpus", convert(jobs), ctx.repeat, ctx.scratch, files),
+        bench("convert.pipeline", convert(1, pipelined=True), ctx.repeat, ctx.scratch, files),
+        bench("convert.images_copy", convert(1, images="copy"), ctx.repeat, ctx.scratch, files),
+        bench("convert.incremental_noop", convert(1, force=False), ctx.repeat, lambda: built, files),
+        bench("convert.sharded_1000", lambda outdir: cmd._shard_json_to_rst(ctx.jsondir, outdir, 1000, jobs=1),
+              ctx.repeat, ctx.scratch, files),
+    ]
+
+def suite_pivot(ctx: Context) -> List[Result]:
+    files = ctx.files
+    headers = ["ID"] + ["key{}".format(k) for k in range(1, ctx.spec.keys, 2)]
+
+    def pivot(**kwargs) -> Callable[[str], None]:
+        def run(outdir: str) -> None:
+            fmt = kwargs.get("fmt", "csv")
+            csv_out = os.path.join(outdir, "pivot." + fmt)
+            Pivot(files, headers, False, csv_out, kwargs.get("sort_key"), None, kwargs.get("sort_memory"),
+                  fmt=fmt, group_by=kwargs.get("group_by"), jobs=kwargs.get("jobs", 1)).pivot()
+        return run
+
+    return [
+        bench("pivot.unsorted", pivot(), ctx.repeat, ctx.scratch, len(files)),
+        bench("pivot.sorted", pivot(sort_key="key1,ID:natural"), ctx.repeat, ctx.scratch, len(files)),
+        bench("pivot.list_table", pivot(fmt="list-table"), ctx.repeat, ctx.scratch, len(files)),
+        bench("pivot.jobs_all_cpus", pivot(jobs=os.cpu_count() or 1), ctx.repeat, ctx.scratch, len(files)),
+        bench("pivot.group_by", pivot(group_by=["key1"]), ctx.repeat, ctx.scratch, len(files)),
+        bench("pivot.sorted_external", pivot(sort_key="key1", sort_memory=64 * 1024), ctx.repeat, ctx.scratch, len(files)),
+    ]
+
+def suite_memory(ctx: Context) -> List[Result]:
+    files = ctx.files
+    headers = ["ID"] + ["key{}".format(k) for k in range(1, ctx.spec.keys, 2)]
+    csv_out = os.path.join(ctx.scratch(), "pivot.csv")
+
+    return [
+        peak_memory("memory.convert.jobs_1", lambda: cmd._convert_json_to_rst(ctx.jsondir, ctx.scratch(), 1, True)),
+        peak_memory("memory.pivot.sorted", lambda: Pivot(files, headers, False, csv_out, "key1", None).pivot()),
+    ]
+
+def suite_startup(ctx: Context) -> List[Result]:
+    def run(argv: List[str]) -> Callable[[Any], None]:
+        return lambda _: subprocess.run(
+            [sys.executable] + argv,
+            cwd=ROOT,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True)
+
+    return [
+        bench("startup.python", run(["-c", "pass"]), ctx.repeat),
+        bench("startup.import", run(["-c", "import json2rst.cmd"]), ctx.repeat),
+        bench("startup.help", run(["-m", "json2rst", "--help"]), ctx.repeat),
+    ]
+
+SUITES = {
+    "render": suite_render,
+    "convert": suite_convert,
+    "pivot": suite_pivot,
+    "memory": suite_memory,
+    "startup": suite_startup,
+}
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suites(args: argparse.Namespace) -> Dict[str, Any]:
+    results = list()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ctx = Context(args, tmpdir)
+
+        for name in args.suites or list(SUITES):
+            for result in SUITES[name](ctx):
+                print_result(result)
+                results.append(result)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "json_backend": jsonbackend.name(),
+            "repeat": args.repeat,
+            "corpus": ctx.spec._asdict(),
+        },
+        "results": results,
+    }
+
+def format_value(value: float, unit: str) -> str:
+    if unit == "bytes":
+        return "{:.1f} MB".format(value / 1024 / 1024)
+    return "{:.2f} ms".format(value * 1000)
+
+def print_result(result: Result) -> None:
+    line = "{:<36} {:>12} ± {:<10}".format(
+        result["name"],
+        format_value(result["min"], result["unit"]),
+        format_value(result["stdev"], result["unit"]))
+    if "per_second" in result:
+        line += " {:>10.0f} /s".format(result["per_second"])
+    print(line)
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], threshold: float) -> int:
+    """
+    Prints how each benchmark in ``new`` changed from ``base``,
+    comparing best times (or peak memory).
+
+    Returns:
+        The number of benchmarks that got worse by more than ``threshold`` percent.
+    """
+    base_results = {result["name"]: result for result in base["results"]}
+    regressions = 0
+
+    print("Comparing {} (base) with {}".format(base["meta"].get("commit"), new["meta"].get("commit")))
+    if base["meta"].get("corpus") != new["meta"].get("corpus"):
+        print("WARNING: the runs used different corpora.")
+
+    for result in new["results"]:
+        old = base_results.get(result["name"])
+        if old is None:
+            continue
+
+        change = (result["min"] / old["min"] - 1) * 100 if old["min"] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  SLOWER" if result["unit"] == "s" else "  MORE"
+            regressions += 1
+        elif change < -threshold:
+            mark = "  faster" if result["unit"] == "s" else "  less"
+
+        print("{:<36} {:>12} -> {:>12} {:>+8.1f}%{}".format(
+            result["name"],
+            format_value(old["min"], old["unit"]),
+            format_value(result["min"], result["unit"]),
+            change,
+            mark))
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--suite",
+        dest="suites",
+        action="append",
+        choices=list(SUITES),
+        help="Suite to run. Can be repeated. Defaults to all suites.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed samples per benchmark. Defaults to 5.")
+    parser.add_argument("--save", metavar="FILE", help="Save the results to this JSON file.")
+    parser.add_argument("--load", metavar="FILE", help="Don't run anything; use results saved in this JSON file.")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the results with a run saved in this JSON file.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="With --compare, percent change that counts as a regression. Defaults to 10.")
+    corpus.add_spec_arguments(parser, corpus.CorpusSpec(files=500))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING) #: Don't time per-file log messages.
+
+    if args.load:
+        with open(args.load) as f:
+            run = json.load(f)
+    else:
+        run = run_suites(args)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if compare(base, run, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
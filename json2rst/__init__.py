@@ -0,0 +1,12 @@
+__version__ = "0.0.1-dev"
+
+from .api import Renderer, pivot_rows, render, render_many, render_to
+from .errors import (
+    InvalidDocumentError,
+    InvalidImageError,
+    InvalidNodeError,
+    InvalidOptionError,
+    InvalidPathError,
+    Json2RstError,
+    PivotKeyError,
+)
@@ -30,12 +30,12 @@ TODO:
 - ✅ implement positional awareness e.g. ``prev`` and
   ``next``, so that we can detect consecutive "ul", "ol",
   and "code-block" nodes
-- allow users to select whether to embed images as base64,
+- ✅ allow users to select whether to embed images as base64,
   or resolve and keep their paths. This also means we have
   to package the output together with the images.
 - ✅ Set filename write to from command line args.
-- By default, write to files named after the ``ID`` key in
-  JSON. This is to capture the SA name as the filename.
+- ✅ By default, write to files named after the ``ID`` key in
+  JSON (``--name-key ID``). This is to capture the SA name as the filename.
 - ✅ Write proper example.json file.
 - ✅ Write example.json file for rich content
 - Write tests
@@ -45,12 +45,7 @@ TODO:
   data:image/png;base64,iVBORw0KGgoAAAANSUhEU<lots more>``
 
 """
-import os
-import sys
-
 from . import cmd
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
-
 if __name__ == "__main__":
     cmd.cmd()
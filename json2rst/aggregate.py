@@ -0,0 +1,225 @@
+"""
+Group-by aggregation for pivots (``--group-by`` and ``--agg``).
+
+Rows are aggregated as they stream past, in a hash table of groups,
+so memory use is proportional to the number of groups, not the
+number of JSON files. Aggregates are partial until all rows have been
+added; partial aggregates (e.g. from worker processes) are combined
+with :meth:`Aggregator.merge`.
+
+Aggregate functions (:data:`AGG_FUNCS`):
+
+- ``count``: values that aren't missing or ``null``. ``*:count`` counts rows.
+- ``sum``: sum of numbers. Numeric strings (e.g. ``"3"``) are converted;
+  other values are skipped. Float sums are exact until the final rounding,
+  so they're the same however rows are split across workers.
+- ``min`` and ``max``: smallest and largest values. Numeric strings
+  are converted, like for ``sum``. Numbers sort before other strings.
+
+Output columns are the group-by headers, then one column per aggregate,
+named ``func(field)``, e.g. ``count(*)`` or ``sum(Effort)``.
+"""
+import math
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+from .errors import InvalidOptionError
+
+ALL_ROWS = "*" #: Field for ``*:count``.
+
+def _count(state: int, val: Any) -> int:
+    return state if val is None else state + 1
+
+def _add(a: int, b: int) -> int:
+    return a + b
+
+def _number(val: Any) -> Any:
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        return val
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+def _add_float(partials: List[float], x: float) -> None:
+    """
+    Adds ``x`` to a list of non-overlapping partial sums (Shewchuk's algorithm,
+    as used by ``math.fsum``), so float sums are exact until the final
+    rounding, and don't depend on the order values were added or merged in.
+    """
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+def _sum(state: Any, val: Any) -> Any:
+    """State is ``None``, or [int total, float partials]."""
+    if val is None:
+        return state
+    val = _number(val)
+    if val is None:
+        return state
+    if state is None:
+        state = [0, list()]
+    if isinstance(val, int):
+        state[0] += val
+    else:
+        _add_float(state[1], val)
+    return state
+
+def _merge_sums(a: Any, b: Any) -> Any:
+    if b is None:
+        return a
+    if a is None:
+        return [b[0], list(b[1])]
+    a[0] += b[0]
+    for x in b[1]:
+        _add_float(a[1], x)
+    return a
+
+def _sum_result(state: Any) -> Any:
+    if state is None:
+        return None
+    total, partials = state
+    return total + math.fsum(partials) if partials else total
+
+def _identity(state: Any) -> Any:
+    return state
+
+def _order_key(val: Any) -> tuple:
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        return (0, val)
+    return (1, str(val))
+
+def _min(state: Any, val: Any) -> Any:
+    if val is None:
+        return state
+    num = _number(val)
+    val = val if num is None else num
+    if state is None or _order_key(val) < _order_key(state):
+        return val
+    return state
+
+def _max(state: Any, val: Any) -> Any:
+    if val is None:
+        return state
+    num = _number(val)
+    val = val if num is None else num
+    if state is None or _order_key(val) > _order_key(state):
+        return val
+    return state
+
+class AggFunc(NamedTuple):
+    initial: Any #: State of an empty group.
+    update: Callable[[Any, Any], Any] #: (state, value) -> state.
+    merge: Callable[[Any, Any], Any] #: (state, state) -> state.
+    result: Callable[[Any], Any] #: state -> output value.
+
+AGG_FUNCS = {
+    "count": AggFunc(0, _count, _add, _identity),
+    "sum": AggFunc(None, _sum, _merge_sums, _sum_result),
+    "min": AggFunc(None, _min, _min, _identity),
+    "max": AggFunc(None, _max, _max, _identity),
+} #: Aggregate functions for ``--agg field:func``.
+
+def parse_agg_spec(spec: str) -> List[Tuple[str, str]]:
+    """
+    Args:
+        spec (str): Value from ``--agg``. A comma-separated list
+            of ``field:func``. E.g. ``*:count,Effort:sum,Effort:max``.
+
+    Returns:
+        A list of (field, func) tuples.
+
+    Raises:
+        errors.InvalidOptionError: If an item isn't ``field:func``,
+            or ``func`` isn't one of :data:`AGG_FUNCS`.
+    """
+    out = list()
+
+    for item in spec.split(","):
+        field, _, func = item.strip().rpartition(":")
+        field = field.strip()
+        func = func.strip()
+        if not (field and func in AGG_FUNCS):
+            raise InvalidOptionError(
+                "--agg '{}' must be field:func, where func is one of {}".format(item.strip(), list(AGG_FUNCS)))
+        if field == ALL_ROWS and func != "count":
+            raise InvalidOptionError("Only count can aggregate '*'")
+        out.append((field, func))
+
+    return out
+
+def _hashable(val: Any) -> Any:
+    if isinstance(val, (list, dict)):
+        return str(val) #: e.g. a [*] header without --explode.
+    return val
+
+class Aggregator:
+    def __init__(self, group_by: List[str], aggs: List[Tuple[str, str]]) -> None:
+        """
+        Hash aggregation of projected rows.
+
+        Args:
+            group_by (List[str]): Headers to group rows by.
+            aggs (List[Tuple[str, str]]): (field, func) pairs. See :func:`parse_agg_spec`.
+        """
+        self.group_by = group_by
+        self.aggs = aggs
+        #: Headers to project from each JSON object: group-by headers, then aggregated fields.
+        self.fields = list(group_by)
+        for field, _ in aggs:
+            if field != ALL_ROWS and field not in self.fields:
+                self.fields.append(field)
+        #: Output column names.
+        self.headers = list(group_by) + ["{}({})".format(func, field) for field, func in aggs]
+
+        self._funcs = [AGG_FUNCS[func] for _, func in aggs]
+        self._key_index = list(range(len(group_by)))
+        self._agg_index = [None if field == ALL_ROWS else self.fields.index(field) for field, _ in aggs]
+        #: Group key -> list of aggregate states, in first-seen order.
+        self.groups = dict() # type: Dict[tuple, list]
+
+    def add(self, values: tuple) -> None:
+        """
+        Adds a row.
+
+        Args:
+            values (tuple): One value per header in :attr:`fields`.
+        """
+        key = tuple([_hashable(values[i]) for i in self._key_index])
+        states = self.groups.get(key)
+        if states is None:
+            states = self.groups[key] = [func.initial for func in self._funcs]
+
+        for n, func in enumerate(self._funcs):
+            index = self._agg_index[n]
+            states[n] = func.update(states[n], True if index is None else values[index])
+
+    def merge(self, other: "Aggregator") -> None:
+        """Adds the groups of another aggregator with the same ``group_by`` and ``aggs``."""
+        for key, other_states in other.groups.items():
+            states = self.groups.get(key)
+            if states is None:
+                states = self.groups[key] = [func.initial for func in self._funcs]
+            for n, func in enumerate(self._funcs):
+                states[n] = func.merge(states[n], other_states[n])
+
+    def empty(self) -> "Aggregator":
+        """Returns a new aggregator with the same ``group_by`` and ``aggs``, and no groups."""
+        return Aggregator(self.group_by, self.aggs)
+
+    def rows(self) -> Iterator[tuple]:
+        """Yields one row per group (group-by values, then aggregates), in first-seen order."""
+        results = [func.result for func in self._funcs]
+        for key, states in self.groups.items():
+            yield key + tuple([result(state) for result, state in zip(results, states)])
+
+    def __len__(self) -> int:
+        return len(self.groups)
@@ -0,0 +1,235 @@
+"""
+Library API, for rendering JSON objects that are already in memory.
+
+Nothing here reads input files or writes output files
+(except image files, and only with ``images="copy"`` or ``"hardlink"``),
+and bad input raises a :class:`errors.Json2RstError`,
+so json2rst can run inside a long-lived host process, like a Sphinx
+extension or a web service:
+
+..  code-block:: python
+
+    import json2rst
+
+    rst = json2rst.render({"ID": "EIQ-2021-1234", "Status": "Open"}, "EIQ-2021-1234")
+
+    for name, rst in json2rst.render_many(objects_by_name.items(), workers=4):
+        ...
+
+    rows = json2rst.pivot_rows(objects, ["ID", "Status"], sort_by="ID:natural")
+
+The module-level functions share one :class:`Renderer`. Its worker
+processes (for ``render_many``) are started once, on first use,
+and reused by later calls. Encoded images are cached per process
+(see :mod:`images`), so images embedded by many pages are only read once.
+"""
+import io
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
+
+from . import jsonbackend
+from . import pipeline
+from . import utils
+from .errors import PivotKeyError
+from .images import ImageHandler
+
+CHUNK_SIZE = 32 #: Objects sent to a worker process at a time by ``render_many``.
+
+class Renderer:
+    def __init__(self, images: str = "embed", outdir: str = ".", workers: int = None) -> None:
+        """
+        Renders JSON objects to rST pages.
+
+        Args:
+            images (str): How to write image nodes. One of ``images.IMAGE_MODES``.
+                Defaults to embedding them as base64, which needs no output directory.
+            outdir (str): Directory the rST pages will be saved in. Image paths
+                (with ``images`` other than ``embed``) are made relative to it.
+            workers (int): Default number of worker processes for
+                :meth:`render_many`. Defaults to 1, i.e. no worker processes.
+
+        Raises:
+            errors.InvalidOptionError: If ``images`` isn't a valid mode.
+        """
+        self.image_handler = ImageHandler(images, Path(outdir).absolute())
+        self.workers = workers
+        self._executor = None
+        self._executor_workers = 0
+
+    def render(self, obj: Any, name: str, source: str = None) -> str:
+        """
+        Args:
+            obj (Any): A JSON object, or a list of JSON objects.
+                Each object is rendered as a table.
+            name (str): Page title.
+            source (str): Path of the JSON file ``obj`` came from, if any.
+                Relative image paths (``./`` or ``../``) are resolved from
+                its directory. Defaults to the current directory.
+
+        Returns:
+            The rST page.
+
+        Raises:
+            errors.Json2RstError: If ``obj`` can't be rendered.
+        """
+        out = io.StringIO()
+        self.render_to(out, obj, name, source)
+        return out.getvalue()
+
+    def render_to(self, stream: TextIO, obj: Any, name: str, source: str = None) -> None:
+        """
+        Same as :meth:`render`, but writes the page to ``stream``
+        piece by piece, instead of building up a string.
+        """
+        utils.write_page(stream, source if source else name, obj, self.image_handler, title=name)
+
+    def render_many(
+        self,
+        items: Iterable[Tuple[str, Any]],
+        workers: int = None,
+        ) -> Iterator[Tuple[str, str]]:
+        """
+        Renders many JSON objects, optionally across worker processes.
+
+        ``items`` is consumed lazily, a few chunks at a time,
+        so it can be a generator over more objects than fit in memory.
+
+        Args:
+            items (Iterable[Tuple[str, Any]]): (name, JSON object) pairs,
+                e.g. ``dict.items()``. Parsed JSON objects, or JSON text
+                (``str`` or ``bytes``), which is then parsed in the workers.
+            workers (int): Number of worker processes.
+                Defaults to ``self.workers``. With 1, renders in this process.
+
+        Yields:
+            (name, rST page) pairs, in the order of ``items``.
+
+        Raises:
+            errors.Json2RstError: If an object can't be rendered.
+                Pages before it have already been yielded.
+        """
+        workers = workers if workers else (self.workers if self.workers else 1)
+
+        if workers == 1:
+            for name, obj in items:
+                yield (name, self.render(_parse(obj), name))
+            return
+
+        executor = self._get_executor(workers)
+        for pages in pipeline.imap_chunks(executor, self._render_chunk, items, workers, CHUNK_SIZE):
+            yield from pages
+
+    def close(self) -> None:
+        """Stops the worker processes, if any."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "Renderer":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
+
+    def _render_chunk(self, chunk: List[Tuple[str, Any]]) -> List[Tuple[str, str]]:
+        return [(name, self.render(_parse(obj), name)) for name, obj in chunk]
+
+    def _get_executor(self, workers: int):
+        if self._executor is not None and self._executor_workers != workers:
+            self.close()
+
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=jsonbackend.use,
+                initargs=(jsonbackend.name(),),
+            )
+            self._executor_workers = workers
+
+        return self._executor
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Worker processes get a copy of the renderer, without the process pool."""
+        state = dict(self.__dict__)
+        state["_executor"] = None
+        state["_executor_workers"] = 0
+        return state
+
+def _parse(obj: Any) -> Any:
+    if isinstance(obj, (str, bytes)):
+        return jsonbackend.loads(obj)
+    return obj
+
+def pivot_rows(
+    objects: Iterable[Dict[str, Any]],
+    headers: List[str],
+    strict: bool = False,
+    sort_by: str = None,
+    sort_order: str = None,
+    limit: int = None,
+    explode: bool = False,
+    group_by: List[str] = None,
+    aggs: str = None,
+    ) -> List[Dict[str, Any]]:
+    """
+    Pivots JSON objects into table rows, in memory. See :class:`pivot.Pivot`.
+
+    Args:
+        objects (Iterable[Dict[str, Any]]): JSON objects.
+        headers (List[str]): Keys to extract from each object,
+            or paths to nested values, e.g. ``meta.owner.team``. See :mod:`paths`.
+            Not used with ``group_by``.
+        strict (bool): Raise if any object is missing a key in ``headers``,
+            or has a key that isn't in ``headers``.
+        sort_by (str): Keys to sort rows by, e.g. ``"Status,ID:natural"``.
+            See :func:`pivot.parse_sort_spec`.
+        sort_order (str): ``ascending`` (default) or ``descending``.
+        limit (int): Only return the first (or, when sorting, the top) ``limit`` rows.
+        explode (bool): Return one row per element of ``[*]`` headers.
+        group_by (List[str]): Return one row per group, with ``aggs``.
+        aggs (str): Aggregates for ``group_by``, e.g. ``"*:count,Effort:sum"``.
+            See :mod:`aggregate`.
+
+    Returns:
+        One dict per row, mapping every header to its value, or ``None`` if it's missing.
+
+    Raises:
+        errors.PivotKeyError: In strict mode, if any object didn't match ``headers``.
+            Objects are named by their index in ``objects``.
+        errors.InvalidDocumentError: If an object isn't a JSON object.
+        errors.InvalidOptionError: If ``sort_by``, ``sort_order``, or ``aggs`` isn't valid.
+    """
+    from .pivot import Pivot
+
+    named = (("[{}]".format(index), obj) for index, obj in enumerate(objects))
+    table = Pivot(list(), headers, strict, None, sort_by, sort_order, limit=limit, objects=named,
+                  explode=explode, group_by=group_by, aggs=aggs)
+    rows = list(table.rows())
+
+    if strict and table.report:
+        raise PivotKeyError(table.report)
+
+    return rows
+
+_default = None # type: Renderer
+
+def _default_renderer() -> Renderer:
+    global _default
+    if _default is None:
+        _default = Renderer()
+    return _default
+
+def render(obj: Any, name: str, source: str = None) -> str:
+    """Renders a JSON object as an rST page. See :meth:`Renderer.render`."""
+    return _default_renderer().render(obj, name, source)
+
+def render_to(stream: TextIO, obj: Any, name: str, source: str = None) -> None:
+    """Renders a JSON object as an rST page, into ``stream``. See :meth:`Renderer.render_to`."""
+    _default_renderer().render_to(stream, obj, name, source)
+
+def render_many(items: Iterable[Tuple[str, Any]], workers: int = None) -> Iterator[Tuple[str, str]]:
+    """Renders many JSON objects. See :meth:`Renderer.render_many`."""
+    return _default_renderer().render_many(items, workers)
@@ -1,12 +1,29 @@
 import argparse
+import collections
+import itertools
 import logging
+import os
+import sys
+import time
 from pathlib import Path
-from typing import Tuple, Set
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Tuple, Set
 
+from . import jsonbackend
+from . import manifest
+from . import pipeline
+from . import records
+from . import stats
+from . import tables
 from . import utils
-from .pivot import Pivot
+from .images import ImageHandler, IMAGE_MODES
+from .errors import Json2RstError
+from .manifest import Manifest
 
-logging.basicConfig(level=logging.DEBUG)
+if TYPE_CHECKING:
+  from concurrent.futures import Executor
+
+#: Modules that only some runs need (process pools, pivot, watch mode)
+#: are imported where they're used, to keep startup fast.
 
 def _cli() -> any:
     """
@@ -18,6 +35,19 @@ def _cli() -> any:
 
     parser = argparse.ArgumentParser()
 
+    parser.add_argument(
+        "--verbose", "-v",
+        action="count",
+        default=0,
+        help="""Log more. -v logs each step (e.g. watch mode),
+-vv also logs every file converted. By default, only warnings
+and errors are logged.""")
+    parser.add_argument(
+        "--quiet", "-q",
+        action="count",
+        default=0,
+        help="Log less. -q only logs errors, -qq logs nothing.")
+
     cmd_rst = parser.add_argument_group("General options")
     cmd_rst.add_argument(
         "--input",
@@ -29,6 +59,155 @@ def _cli() -> any:
         dest="outdir",
         default=".",
         help="Output directory. Defaults to current directory.")
+    cmd_rst.add_argument(
+        "--recursive", "-r",
+        action="store_true",
+        help="""Also read JSON files in subdirectories of --input.
+Output files mirror the directory structure of --input.""")
+    cmd_rst.add_argument(
+        "--include",
+        action="append",
+        metavar="PATTERN",
+        help="""Only read input files whose path (relative to --input) or
+name matches this glob, e.g. --include='2021/*.json'. Can be repeated.""")
+    cmd_rst.add_argument(
+        "--exclude",
+        action="append",
+        metavar="PATTERN",
+        help="""Skip input files and directories whose path (relative to
+--input) or name matches this glob, e.g. --exclude='drafts'. Can be repeated.""")
+    cmd_rst.add_argument(
+        "--json-backend",
+        dest="json_backend",
+        choices=jsonbackend.BACKENDS,
+        default="auto",
+        help="""JSON parser to use. 'auto' (default) picks the fastest
+one installed: orjson, ujson, simdjson, then the standard library json.
+Files the fast parser rejects (e.g. NaN, or integers wider than 64 bits)
+are parsed again with json.""")
+    cmd_rst.add_argument(
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=None,
+        help="""Number of worker processes used to convert or pivot files.
+Defaults to the number of CPUs. Use 1 to run in a single process.""")
+    cmd_rst.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="""Convert with a pipeline of threads instead of --jobs processes.
+Reading, rendering, and writing run in separate stages, so disk and
+network I/O overlap with rendering. Best for inputs and outputs on slow
+or network filesystems.""")
+    cmd_rst.add_argument(
+        "--read-workers",
+        dest="read_workers",
+        type=int,
+        default=4,
+        help="With --pipeline, number of threads reading input files. Defaults to 4.")
+    cmd_rst.add_argument(
+        "--render-workers",
+        dest="render_workers",
+        type=int,
+        default=2,
+        help="With --pipeline, number of threads rendering pages. Defaults to 2.")
+    cmd_rst.add_argument(
+        "--write-workers",
+        dest="write_workers",
+        type=int,
+        default=4,
+        help="With --pipeline, number of threads writing output files. Defaults to 4.")
+    cmd_rst.add_argument(
+        "--queue-size",
+        dest="queue_size",
+        type=int,
+        default=64,
+        help="""With --pipeline, maximum number of files waiting between
+two stages. Bounds memory use. Defaults to 64.""")
+    cmd_rst.add_argument(
+        "--force",
+        action="store_true",
+        help="""Re-render every file, even if its input and images
+are unchanged since the last build.""")
+    cmd_rst.add_argument(
+        "--images",
+        dest="images",
+        choices=IMAGE_MODES,
+        default="embed",
+        help="""How to write image nodes. 'embed' inlines images as base64
+(default). 'copy' and 'hardlink' store each unique image once in
+_images/ in the output directory. 'reference' points to images where
+they are. All but 'embed' use paths relative to the rST file.""")
+    cmd_rst.add_argument(
+        "--name-key",
+        dest="name_key",
+        default=None,
+        help="""Name each output file (and its page title) after the value
+of this key, e.g. --name-key=ID. Records in .jsonl files and
+JSON arrays are named <file>-<index> if they don't have the key.""")
+    cmd_rst.add_argument(
+        "--shard-size",
+        dest="shard_size",
+        type=int,
+        default=None,
+        metavar="N",
+        help="""Pack up to N records into each rST file (shard), as sections
+with labels, and write an index page with a toctree of the shards, named
+after --input. Much faster to build with Sphinx than one file per record.""")
+    cmd_rst.add_argument(
+        "--shard-kb",
+        dest="shard_kb",
+        type=int,
+        default=None,
+        metavar="KB",
+        help="""Like --shard-size, but start a new shard before one grows
+past KB kilobytes. Can be combined with --shard-size.""")
+    cmd_rst.add_argument(
+        "--watch",
+        action="store_true",
+        help="""After converting, keep watching --input and the images
+its pages embed, and convert files again as they change. Outputs of
+deleted input files are removed. Stop with Ctrl-C.""")
+    cmd_rst.add_argument(
+        "--debounce",
+        type=int,
+        default=50,
+        metavar="MS",
+        help="""With --watch, wait until files have stopped changing for
+this many milliseconds before converting them. Defaults to 50.""")
+    cmd_rst.add_argument(
+        "--poll-interval",
+        dest="poll_interval",
+        type=float,
+        default=0.5,
+        metavar="SECONDS",
+        help="""With --watch, how often to check files for changes when
+inotify isn't available (i.e. not on Linux). Defaults to 0.5.""")
+
+    cmd_stats = parser.add_argument_group("Profiling")
+    cmd_stats.add_argument(
+        "--stats",
+        action="store_true",
+        help="""When done, print how long each stage took (reading, parsing,
+rendering, images, writing), bytes read and written, rich nodes by type,
+and the slowest files.""")
+    cmd_stats.add_argument(
+        "--stats-json",
+        dest="stats_json",
+        metavar="FILE",
+        help="Write the same stats as --stats to a JSON file.")
+    cmd_stats.add_argument(
+        "--slowest",
+        type=int,
+        default=stats.SLOWEST,
+        metavar="N",
+        help="Number of slowest files to report with --stats. Defaults to {}.".format(stats.SLOWEST))
+    cmd_stats.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="""Run under cProfile, and save the profile to FILE.
+Read it with 'python -m pstats FILE'. Only profiles the main
+process, so use --jobs 1 to profile conversion itself.""")
 
     cmd_pivot = parser.add_argument_group("Pivot a directory of JSON files.")
 
@@ -49,12 +228,15 @@ and write to a csv-table.
         dest="pivot_headers",
         type=str,
         required=False,
-        help="""Required for pivot.
+        help="""Required for pivot, unless --group-by is set.
 Add a list of header names as comma-separated values.
 JSON files from --input will be pivoted against this list.
 
 Headers MUST BE UNIQUE (RFC8259 §4). Duplicate headers are discarded.
 
+A header can be a path to a nested value: meta.owner.team,
+metrics[0].value, or metrics[*].value for every array element.
+
 E.g.: --headers='key1,key2,key3'
 """
     )
@@ -67,13 +249,45 @@ E.g.: --headers='key1,key2,key3'
         """
     )
 
+    cmd_pivot.add_argument(
+        "--explode",
+        action="store_true",
+        required=False,
+        help="""Write one row per array element of [*] headers,
+        instead of one row per JSON file. Headers over the same array
+        (e.g. metrics[*].name and metrics[*].value) share rows."""
+    )
+
+    cmd_pivot.add_argument(
+        "--group-by",
+        dest="group_by",
+        type=str,
+        required=False,
+        help="""Instead of --headers, write one row per distinct combination
+        of these comma-separated headers, with the --agg aggregates.
+        E.g.: --group-by='Status,meta.owner.team'"""
+    )
+
+    cmd_pivot.add_argument(
+        "--agg",
+        dest="aggs",
+        type=str,
+        required=False,
+        help="""Aggregates for --group-by, as comma-separated field:func.
+        func is count, sum, min, or max. '*:count' counts rows (the default).
+        Aggregate columns are named func(field), e.g. sum(Effort).
+        E.g.: --agg='*:count,Effort:sum,Effort:max'"""
+    )
+
     cmd_pivot.add_argument(
         "--sort-by",
         dest="sort_by",
         type=str,
         required=False,
-        help="""Sort the pivot table by a given key.
-        Specify only one key.
+        help="""Sort the pivot table by one or more comma-separated keys.
+        Each key can have a type: str (default), numeric, date (ISO 8601),
+        or natural (so 'ID-2' sorts before 'ID-10').
+        E.g.: --sort-by='Status,ID:natural'
         """
     )
 
@@ -85,47 +299,625 @@ E.g.: --headers='key1,key2,key3'
         help="""Sort --sort-by in 'ascending' or 'descending' order."""
     )
 
+    cmd_pivot.add_argument(
+        "--sort-memory",
+        dest="sort_memory",
+        type=int,
+        required=False,
+        help="""Memory budget for --sort-by, in MB. Defaults to 64.
+        Larger pivots are sorted in chunks on disk, then merged."""
+    )
+
+    cmd_pivot.add_argument(
+        "--limit",
+        dest="limit",
+        type=int,
+        required=False,
+        help="""Only write the first N rows. With --sort-by, writes the top N rows."""
+    )
+
+    cmd_pivot.add_argument(
+      "--format",
+      dest="pivot_format",
+      type=str,
+      choices=tables.FORMATS,
+      default="csv",
+      help="""Pivot output format. Defaults to csv.
+      csv-table and list-table write an rST table directive.
+      parquet and arrow (Arrow IPC) write typed, compressed columns,
+      and need pyarrow (pip install pyarrow)."""
+    )
+
     cmd_pivot.add_argument(
       "--csv-out",
       dest="csv_out",
       type=str,
       required=False,
-      help="Name of output CSV file saved in --output dir."
+      help="""Name of pivot output file. Defaults to pivot.csv,
+      or pivot.rst, pivot.parquet, or pivot.arrow, to match --format."""
     )
 
     return parser.parse_args()
 
-def _convert_json_to_rst(infiles: str, outdir: str):
-  infile_list = utils.smart_filepaths(infiles)
-  outputdir = Path(outdir).absolute()
+ConvertTask = Tuple[str, Callable[..., utils.PageJob], tuple]
+"""(manifest key, job factory, arguments). The job factory
+is :meth:`utils.PageJob.for_file` or :meth:`utils.PageJob.for_record`."""
+
+TASK_CHUNK_SIZE = 32 #: Tasks sent to a worker process at a time.
+
+def _convert_task(task: ConvertTask) -> Tuple[str, str, dict, str]:
+  """
+  Converts a single file or record. Runs inside a worker process,
+  so it must stay a module-level function (picklable).
+
+  Returns:
+    (manifest key, status, manifest entry, error message).
+    The error message is ``None`` if the conversion succeeded.
+  """
+  key, factory, args = task
+  start = time.perf_counter()
+  try:
+    status, entry = factory(*args).run()
+  except Exception as e:
+    return (key, "failed", None, "{}: {}".format(type(e).__name__, e))
+  finally:
+    if stats.current is not None:
+      stats.current.file(key, time.perf_counter() - start)
+
+  return (key, status, entry, None)
+
+def _convert_chunk(tasks: List[ConvertTask]) -> Tuple[List[Tuple[str, str, dict, str]], dict]:
+  """
+  Returns:
+    The results of the tasks, and the stats collected while converting
+    them (``None`` unless ``--stats`` is on), to merge in the parent process.
+  """
+  results = [_convert_task(task) for task in tasks]
+  return (results, stats.current.take() if stats.current is not None else None)
+
+def _imap_ordered(executor: "Executor", tasks: Iterable[ConvertTask], jobs: int) -> Iterator[Tuple[str, str, dict, str]]:
+  """
+  Like ``executor.map(_convert_task, tasks)``, but consumes ``tasks`` lazily
+  (see :func:`pipeline.imap_chunks`), so a huge batch file is never
+  held in memory. Results are yielded in input order.
+  """
+  for results, worker_stats in pipeline.imap_chunks(executor, _convert_chunk, tasks, jobs, TASK_CHUNK_SIZE):
+    if worker_stats:
+      stats.current.merge(worker_stats)
+    yield from results
+
+def _pipeline_step(step: Callable[[utils.PageJob], Any]) -> Callable[[tuple], tuple]:
+  """
+  Wraps a :class:`utils.PageJob` step as a pipeline stage function.
+
+  Items are (manifest key, job, error message, seconds spent so far).
+  The step is skipped for jobs that already failed, or that need no more
+  steps (e.g. skipped as up-to-date). Errors are recorded in the item,
+  so one failing file doesn't stop the pipeline.
+  """
+  def run(item: tuple) -> tuple:
+    key, job, error, seconds = item
+    if error is None and job.status is None:
+      start = time.perf_counter()
+      try:
+        step(job)
+      except Exception as e:
+        error = "{}: {}".format(type(e).__name__, e)
+      seconds += time.perf_counter() - start
+    return (key, job, error, seconds)
+
+  return run
+
+def _pipeline_start(task: ConvertTask) -> tuple:
+  key, factory, args = task
+  try:
+    return (key, factory(*args), None, 0.0)
+  except Exception as e:
+    return (key, None, "{}: {}".format(type(e).__name__, e), 0.0)
+
+def _run_pipeline(
+  tasks: Iterable[ConvertTask],
+  workers: Tuple[int, int, int],
+  queue_size: int,
+  ) -> Iterator[Tuple[str, str, dict, str]]:
+  """
+  Converts files through a read → render → write pipeline of threads.
+
+  Args:
+    tasks (Iterable[ConvertTask]): Conversion tasks.
+    workers (Tuple[int, int, int]): Number of read, render, and write threads.
+    queue_size (int): Maximum number of files waiting in front of each stage.
+
+  Yields:
+    Same results as :func:`_convert_task`, in input order.
+  """
+  read_workers, render_workers, write_workers = workers
+  stages = [
+    pipeline.Stage("read", _pipeline_step(utils.PageJob.read), read_workers),
+    pipeline.Stage("render", _pipeline_step(utils.PageJob.render), render_workers),
+    pipeline.Stage("write", _pipeline_step(utils.PageJob.write), write_workers),
+  ]
+
+  for key, job, error, seconds in pipeline.run(map(_pipeline_start, tasks), stages, queue_size):
+    if stats.current is not None:
+      stats.current.file(key, seconds)
+    if error:
+      yield (key, "failed", None, error)
+    else:
+      yield (key, job.status, job.entry, None)
+
+def _iter_tasks(
+  infile_list: Iterable[Path],
+  inputdir: Path,
+  outputdir: Path,
+  build_manifest: Manifest,
+  force: bool,
+  image_handler: ImageHandler,
+  name_key: str,
+  errors: List[str],
+  ) -> Iterator[ConvertTask]:
+  """
+  Yields a conversion task for each JSON file, and for each record
+  in each batch file (``.jsonl`` files and JSON arrays).
+
+  Output files are placed at the same path relative to ``outputdir``
+  as their input files are relative to ``inputdir``.
+
+  Batch files are parsed here, one record at a time,
+  so the records can be named and named uniquely.
+  Batch files that fail to parse are added to ``errors``.
+  """
+  made_dirs = set()
 
   for thisfile in infile_list:
-      with open(thisfile) as f:
-          output = utils.render_page(thisfile, f.read())
+    srcfile = str(thisfile)
+    thisoutdir = outputdir.joinpath(Path(thisfile).parent.relative_to(inputdir))
+    outfile = str(thisoutdir.joinpath(Path(thisfile).stem + ".rst"))
 
+    if thisoutdir not in made_dirs:
+      thisoutdir.mkdir(parents=True, exist_ok=True)
+      made_dirs.add(thisoutdir)
 
-          utils.write_file(
-              Path.joinpath(
-                  outputdir,
-                  Path(thisfile).stem + ".rst"),
-                  output
-                  )
+    try:
+      is_batch = records.is_batch_file(srcfile)
+    except OSError as e:
+      errors.append("{}: {}".format(srcfile, e))
+      continue
+
+    if not is_batch:
+      entry = None if force else build_manifest.get(srcfile)
+      yield (srcfile, utils.PageJob.for_file, (srcfile, outfile, entry, image_handler, name_key))
+      continue
+
+    stem = Path(thisfile).stem
+    used_names = set()
+
+    batch = records.iter_records(srcfile)
+    if stats.current is not None:
+      batch = stats.current.timed_iter("batch", batch)
+
+    try:
+      for index, (raw, record) in enumerate(batch):
+        name = records.record_name(record, name_key, "{}-{:05d}".format(stem, index), used_names)
+        key = manifest.record_key(srcfile, name)
+        entry = None if force else build_manifest.get(key)
+        args = (
+          srcfile,
+          name,
+          manifest.hash_bytes(raw),
+          record,
+          str(thisoutdir.joinpath(name + ".rst")),
+          entry,
+          image_handler,
+        )
+        yield (key, utils.PageJob.for_record, args)
+    except (OSError, ValueError) as e:
+      errors.append(str(e))
+
+def _convert_json_to_rst(
+  infiles: str,
+  outdir: str,
+  jobs: int = None,
+  force: bool = False,
+  images: str = "embed",
+  name_key: str = None,
+  json_backend: str = "auto",
+  pipelined: bool = False,
+  pipeline_workers: Tuple[int, int, int] = (4, 2, 4),
+  queue_size: int = 64,
+  recursive: bool = False,
+  include: List[str] = None,
+  exclude: List[str] = None,
+  files: Iterable[Path] = None,
+  build_manifest: Manifest = None,
+  ) -> int:
+  """
+  Converts JSON files to rST files, optionally across a pool of processes.
+
+  Each ``.jsonl`` file, or ``.json`` file holding a top-level array,
+  is streamed record by record, and each record becomes its own rST file.
+
+  Files whose input and embedded images are unchanged since the last build
+  (as recorded in the build manifest in ``outdir``) are skipped.
+
+  Args:
+    infiles (str): Input JSON file, or a directory containing JSON files.
+    outdir (str): Output directory.
+    jobs (int): Number of worker processes. Defaults to the CPU count.
+    force (bool): Ignore the build manifest and re-render every file.
+    images (str): How to write image nodes. One of ``images.IMAGE_MODES``.
+    name_key (str): Name output files after the value of this key.
+    json_backend (str): JSON parser to use. One of ``jsonbackend.BACKENDS``.
+    pipelined (bool): Convert with a pipeline of threads instead of ``jobs`` processes.
+    pipeline_workers (Tuple[int, int, int]): Number of read, render, and write
+      threads, with ``pipelined``.
+    queue_size (int): Maximum number of files waiting between two pipeline stages.
+    recursive, include, exclude: Which input files to read.
+      See :func:`utils.iter_filepaths`.
+    files (Iterable[Path]): Only convert these input files, instead
+      of every file in ``infiles``. Used by :func:`_watch`.
+    build_manifest (Manifest): Build manifest to use, instead
+      of loading it from ``outdir``. It is saved either way.
+
+  Returns:
+    The number of files (or records) that failed to convert.
+  """
+  #: Files are converted as they're found, in a deterministic order.
+  if files is None:
+    files = utils.iter_filepaths(infiles, recursive, include, exclude)
+  if stats.current is not None:
+    files = stats.current.timed_iter("discover", files)
+  inputdir = Path(infiles).absolute()
+  inputdir = inputdir if inputdir.is_dir() else inputdir.parent
+  outputdir = Path(outdir).absolute()
+  outputdir.mkdir(parents=True, exist_ok=True)
+  build_manifest = build_manifest if build_manifest else Manifest(outputdir)
+  image_handler = ImageHandler(images, outputdir)
+
+  errors = list()
+  tasks = _iter_tasks(
+    files,
+    inputdir,
+    outputdir,
+    build_manifest,
+    force,
+    image_handler,
+    name_key,
+    errors,
+  )
+
+  jobs = jobs or os.cpu_count() or 1
+
+  if pipelined:
+    results = _run_pipeline(tasks, pipeline_workers, queue_size)
+    failures = _report_conversions(results, build_manifest)
+  elif jobs == 1:
+    results = map(_convert_task, tasks)
+    failures = _report_conversions(results, build_manifest)
+  else:
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+      max_workers=jobs,
+      initializer=pipeline.init_worker,
+      initargs=(json_backend, stats.current is not None),
+      ) as executor:
+      results = _imap_ordered(executor, tasks, jobs)
+      failures = _report_conversions(results, build_manifest)
+
+  with stats.stage("manifest"):
+    build_manifest.save()
+
+  for error in errors:
+    logging.error("Failed to read {}".format(error))
+
+  return failures + len(errors)
+
+SHARD_CHUNK_SIZE = 64 #: Records sent to a worker process at a time, with sharded output.
+
+def _shard_json_to_rst(
+  infiles: str,
+  outdir: str,
+  shard_size: int = None,
+  shard_bytes: int = None,
+  jobs: int = None,
+  images: str = "embed",
+  name_key: str = None,
+  json_backend: str = "auto",
+  recursive: bool = False,
+  include: List[str] = None,
+  exclude: List[str] = None,
+  ) -> int:
+  """
+  Converts JSON files to rST shards, each holding many records,
+  and an index page with a toctree of the shards. See :mod:`shards`.
+
+  Every record is rendered on every run; there's no build manifest.
+  Shards whose content didn't change aren't rewritten.
+
+  Args:
+    shard_size (int): Maximum records per shard.
+    shard_bytes (int): Maximum size of a shard, in bytes.
+    Other arguments: see :func:`_convert_json_to_rst`.
+
+  Returns:
+    The number of files (or records) that failed to convert.
+  """
+  from . import shards
+
+  files = utils.iter_filepaths(infiles, recursive, include, exclude)
+  if stats.current is not None:
+    files = stats.current.timed_iter("discover", files)
+  outputdir = Path(outdir).absolute()
+  outputdir.mkdir(parents=True, exist_ok=True)
+
+  writer = shards.ShardWriter(outputdir, Path(infiles).absolute().stem, shard_size, shard_bytes)
+  task = shards.RenderTask(ImageHandler(images, outputdir), str(writer.index_path), name_key)
+  errors = list()
+  items = shards.iter_items(files, name_key, errors)
+
+  jobs = jobs or os.cpu_count() or 1
+  failures = 0
+
+  def add(results: Iterable[Tuple[str, str, str]]) -> int:
+    failed = 0
+    for title, section, error in results:
+      if error:
+        failed += 1
+        logging.error("Failed to convert {}: {}".format(title, error))
+      else:
+        writer.add(title, section)
+    return failed
+
+  if jobs == 1:
+    failures = add(shards.render_item(task, item) for item in items)
+  else:
+    import functools
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+      max_workers=jobs,
+      initializer=pipeline.init_worker,
+      initargs=(json_backend, stats.current is not None),
+      ) as executor:
+      chunks = pipeline.imap_chunks(executor, functools.partial(shards.render_chunk, task), items, jobs, SHARD_CHUNK_SIZE)
+      for results, worker_stats in chunks:
+        if worker_stats:
+          stats.current.merge(worker_stats)
+        failures += add(results)
+
+  with stats.stage("write"):
+    writer.close()
+  logging.info("Wrote {} shard(s) ({} changed), indexed in {}".format(len(writer.shards), writer.written, writer.index_path))
+
+  for error in errors:
+    logging.error("Failed to read {}".format(error))
+
+  if failures:
+    logging.error("{} file(s) failed to convert.".format(failures))
+
+  return failures + len(errors)
+
+def _report_conversions(results, build_manifest: Manifest) -> int:
+  """
+  Logs each conversion result, in input order,
+  and records successful conversions in the build manifest.
+  If an input was written to a different output file than last time
+  (e.g. after adding --name-key), its old output file is removed.
+
+  Returns:
+    The number of failed conversions.
+  """
+  failures = 0
+  outfiles = dict() #: Output file -> manifest key, to catch name clashes.
+  moved = list() #: Previous output files of inputs whose output file changed, e.g. with --name-key.
+
+  for key, status, entry, error in results:
+    if stats.current is not None:
+      stats.current.count("files." + (status if not error else "failed"))
+
+    if error:
+      failures += 1
+      logging.error("Failed to convert {}: {}".format(key, error))
+      continue
+
+    previous = build_manifest.get(key)
+    if previous and previous.get("output") != entry["output"]:
+      moved.append(previous["output"])
+
+    build_manifest.update(key, entry)
+    outfile = entry["output"]
+    logging.debug("{} {}".format(status.capitalize(), outfile))
+
+    if outfile in outfiles:
+      logging.warning("{} and {} were both written to {}".format(outfiles[outfile], key, outfile))
+    outfiles[outfile] = key
+
+  if moved:
+    outputs = {e.get("output") for e in build_manifest.entries.values()}
+    for outfile in moved:
+      if outfile not in outputs and os.path.isfile(outfile):
+        os.remove(outfile)
+        logging.debug("Removed {}".format(outfile))
+
+  if failures:
+    logging.error("{} file(s) failed to convert.".format(failures))
+
+  return failures
+
+def _watch(args: any) -> None:
+  """
+  Watches ``--input``, and the images its pages embed, and converts
+  files again as they change. Runs until interrupted with Ctrl-C.
+
+  Uses inotify when available, and polls otherwise (see :mod:`watch`).
+  """
+  from . import watch
+
+  root = Path(args.infiles).absolute()
+  watchdir = root if root.is_dir() else root.parent
+  build_manifest = Manifest(Path(args.outdir).absolute())
+
+  def image_paths() -> Iterator[str]:
+    for entry in build_manifest.entries.values():
+      yield from entry.get("images", {})
+
+  def snapshot() -> watch.Snapshot:
+    try:
+      inputs = list(map(str, utils.iter_filepaths(args.infiles, args.recursive, args.include, args.exclude)))
+    except FileNotFoundError:
+      inputs = list()
+
+    out = dict()
+    for path in itertools.chain(inputs, image_paths()):
+      try:
+        st = os.stat(path)
+      except OSError:
+        continue
+      out[path] = (st.st_mtime_ns, st.st_size)
+    return out
+
+  def image_dirs() -> Set[str]:
+    return {os.path.dirname(img) for img in image_paths()}
+
+  watcher = watch.make_watcher([str(watchdir)] + sorted(image_dirs()), args.recursive, snapshot, args.poll_interval)
+  logging.info("Watching {} for changes. Press Ctrl-C to stop.".format(watchdir))
+
+  try:
+    while True:
+      changed = watcher.poll()
+      if watcher.overflowed: #: Lost track of changes, so check everything.
+        watcher.overflowed = False
+        changed.add(str(watchdir))
+      if not changed:
+        continue
+
+      changed = watch.debounce(watcher, changed, args.debounce / 1000)
+      _rebuild(args, changed, build_manifest)
+
+      for dirpath in image_dirs():
+        watcher.add_dir(dirpath)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    watcher.close()
+
+def _rebuild(args: any, changed: Set[str], build_manifest: Manifest) -> int:
+  """
+  Converts the input files affected by a set of changed paths:
+
+  - input files that changed, or that were created,
+  - input files with a page that embeds a changed image,
+  - input files in a created (or moved-in) directory.
+
+  Removes the outputs of input files that were deleted,
+  of records that are no longer in their batch file,
+  and of pages that were renamed (with ``--name-key``).
+
+  Returns:
+    The number of files (or records) that failed to convert.
+  """
+  def is_input(path: str) -> bool:
+    return utils.is_input_file(path, args.infiles, args.recursive, args.include, args.exclude)
+
+  by_source = build_manifest.by_source()
+  by_image = collections.defaultdict(set)
+  for source, entries in by_source.items():
+    for entry in entries.values():
+      for img in entry.get("images", {}):
+        by_image[os.path.abspath(img)].add(source) #: Watchers report normalized paths.
+
+  inputs = set()
+
+  for path in changed:
+    if os.path.isdir(path):
+      inputs.update(str(f) for f in utils.iter_filepaths(path, True) if is_input(f))
+    elif is_input(path):
+      inputs.add(path)
+    elif not os.path.exists(path) and os.path.abspath(path) not in by_image: #: Maybe a deleted directory.
+      inputs.update(src for src in by_source if src.startswith(path + os.sep))
+    inputs.update(by_image.get(os.path.abspath(path), ()))
+
+  existing = sorted(src for src in inputs if os.path.isfile(src))
+  build_manifest.updated.clear()
+  failures = 0
+
+  if existing:
+    failures = _convert_json_to_rst(
+      args.infiles,
+      args.outdir,
+      1 if len(existing) < TASK_CHUNK_SIZE else args.jobs, #: Not worth starting processes for a few files.
+      args.force,
+      args.images,
+      args.name_key,
+      args.json_backend,
+      args.pipeline,
+      (args.read_workers, args.render_workers, args.write_workers),
+      args.queue_size,
+      files=map(Path, existing),
+      build_manifest=build_manifest,
+      )
+
+  outputs = {build_manifest.get(key)["output"] for key in build_manifest.updated}
+  removed = False
+
+  for src in sorted(inputs):
+    for key, entry in by_source.get(src, {}).items():
+      if key in build_manifest.updated:
+        if build_manifest.get(key)["output"] == entry["output"]:
+          continue
+      elif failures and os.path.isfile(src):
+        continue #: Keep the last good output of an input that failed to convert.
+      else:
+        build_manifest.remove(key)
+
+      removed = True
+      if entry["output"] not in outputs and os.path.isfile(entry["output"]):
+        os.remove(entry["output"])
+        logging.debug("Removed {}".format(entry["output"]))
+
+  if removed:
+    build_manifest.save()
+
+  return failures
 
 def _pivot(args: any):
   """
   TODO: All this file wrangling should be offloaded
   """
-  pivot_headers = _parse_headers(args.pivot_headers)
-  infile_list = utils.smart_filepaths(args.infiles)
+  from .pivot import Pivot
+
+  if bool(args.pivot_headers) == bool(args.group_by):
+    logging.error("Pivot needs either --headers or --group-by.")
+    sys.exit(1)
+
+  pivot_headers = _parse_headers(args.pivot_headers) if args.pivot_headers else list()
+  infile_list = utils.smart_filepaths(
+    args.infiles,
+    args.recursive,
+    args.include,
+    args.exclude,
+    )
 
-  Pivot(
-    infile_list,
-    pivot_headers,
-    args.strict,
-    args.csv_out,
-    args.sort_by,
-    args.sort_order,
-    ).pivot()
+  try:
+    Pivot(
+      infile_list,
+      pivot_headers,
+      args.strict,
+      args.csv_out,
+      args.sort_by,
+      args.sort_order,
+      args.sort_memory * 1024 * 1024 if args.sort_memory else None,
+      args.limit,
+      fmt=args.pivot_format,
+      explode=args.explode,
+      group_by=_parse_headers(args.group_by) if args.group_by else None,
+      aggs=args.aggs,
+      jobs=args.jobs or os.cpu_count() or 1,
+      ).pivot()
+  except (Json2RstError, ImportError) as e:
+    logging.error(e)
+    sys.exit(1)
 
 def _parse_headers(raw_headers: str) -> Set[str]:
   """
@@ -145,14 +937,73 @@ def _parse_headers(raw_headers: str) -> Set[str]:
 
   return output
 
+LOG_LEVELS = [logging.CRITICAL + 1, logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG]
+"""Log levels from ``-qq`` to ``-vv``. The default is ``logging.WARNING``."""
+
+def _setup_logging(verbose: int, quiet: int) -> None:
+  index = LOG_LEVELS.index(logging.WARNING) + verbose - quiet
+  logging.basicConfig(level=LOG_LEVELS[max(0, min(index, len(LOG_LEVELS) - 1))])
+
 def cmd():
   args = _cli()
 
+  _setup_logging(args.verbose, args.quiet)
   logging.debug(args)
 
-  if not args.pivot:
-    _convert_json_to_rst(args.infiles, args.outdir)
+  jsonbackend.use(args.json_backend)
+  try:
+    logging.debug("Parsing JSON with {}".format(jsonbackend.name()))
+  except ImportError as e:
+    logging.error(e)
+    sys.exit(1)
 
-  else:
-    _pivot(args)
-    logging.debug("YOU HAVE REACHED THE END OF EARLY ACCESS CONTENT.")
+  if not Path(args.infiles).exists():
+    logging.error("{} does not exist.".format(args.infiles))
+    sys.exit(1)
+
+  sharded = bool(args.shard_size or args.shard_kb)
+  if sharded and (args.watch or args.pipeline):
+    logging.error("--shard-size and --shard-kb can't be used with --watch or --pipeline.")
+    sys.exit(1)
+
+  with stats.collect(args.stats, args.stats_json, args.profile, args.slowest):
+    if not args.pivot and sharded:
+      if _shard_json_to_rst(
+        args.infiles,
+        args.outdir,
+        args.shard_size,
+        args.shard_kb * 1024 if args.shard_kb else None,
+        args.jobs,
+        args.images,
+        args.name_key,
+        args.json_backend,
+        args.recursive,
+        args.include,
+        args.exclude,
+        ):
+        sys.exit(1)
+
+    elif not args.pivot:
+      failures = _convert_json_to_rst(
+        args.infiles,
+        args.outdir,
+        args.jobs,
+        args.force,
+        args.images,
+        args.name_key,
+        args.json_backend,
+        args.pipeline,
+        (args.read_workers, args.render_workers, args.write_workers),
+        args.queue_size,
+        args.recursive,
+        args.include,
+        args.exclude,
+        )
+      if args.watch:
+        _watch(args)
+      elif failures:
+        sys.exit(1)
+
+    else:
+      _pivot(args)
+      logging.debug("YOU HAVE REACHED THE END OF EARLY ACCESS CONTENT.")
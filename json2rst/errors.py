@@ -0,0 +1,48 @@
+"""
+Exceptions raised by json2rst.
+
+Everything json2rst raises on bad input is a :class:`Json2RstError`,
+so a host process (e.g. a Sphinx extension) can catch one type,
+and keep running:
+
+..  code-block:: python
+
+    try:
+        rst = json2rst.render(obj, "page")
+    except json2rst.Json2RstError as e:
+        logger.warning(e)
+"""
+from typing import List
+
+class Json2RstError(Exception):
+    """Base class for errors raised by json2rst."""
+
+class InvalidDocumentError(Json2RstError, ValueError):
+    """A JSON document isn't a JSON object, or a list of JSON objects."""
+
+class InvalidNodeError(Json2RstError, ValueError):
+    """A rich content node has an unknown type, or isn't shaped like ``{"type": "content"}``."""
+
+class InvalidImageError(Json2RstError, ValueError):
+    """An ``image`` node points to a file that doesn't exist, or isn't a supported image type."""
+
+class InvalidPathError(Json2RstError, ValueError):
+    """A string passed to :func:`paths.parse_path` isn't a valid key path, e.g. ``metrics[0`` or ``meta..team``."""
+
+class InvalidOptionError(Json2RstError, ValueError):
+    """An option has a value json2rst doesn't support, e.g. an unknown sort type or image mode."""
+
+class PivotKeyError(Json2RstError):
+    """
+    Raised after a pivot when JSON files don't match ``--headers``.
+    ``report`` holds a :class:`pivot.KeyReport` for every offending file.
+    """
+    def __init__(self, report: List["KeyReport"]) -> None:
+        self.report = report
+        lines = ["{} file(s) don't match the pivot headers:".format(len(report))]
+        for r in report:
+            lines.append("{}: missing {}, extra {}".format(r.file, r.missing, r.extra))
+        super().__init__("\n".join(lines))
+
+    def __reduce__(self):
+        return (type(self), (self.report,)) #: So it survives being sent from a worker process.
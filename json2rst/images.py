@@ -0,0 +1,253 @@
+"""
+Handles the images in ``image`` rich nodes.
+
+Images are either embedded as base64 ``data:`` URIs,
+or copied, linked, or referenced from the output directory.
+See :class:`ImageHandler`.
+
+Encoded images are kept in a process-wide LRU cache,
+keyed on (path, size, mtime), so an image embedded
+by many pages is only read and encoded once.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+
+from . import reader
+from . import stats
+from .errors import InvalidOptionError
+
+
+CHUNK_SIZE = 3 * 256 * 1024
+"""Bytes read per chunk when encoding. A multiple of 3,
+so each chunk encodes to base64 without padding and
+chunks can simply be concatenated."""
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024 #: Default byte budget of :data:`cache`.
+
+class ImageCache:
+    def __init__(self, max_bytes: int) -> None:
+        """
+        LRU cache of base64-encoded images.
+
+        Args:
+            max_bytes (int): Byte budget. The least recently used images
+                are evicted when the cache grows past it. Images bigger
+                than the whole budget are never cached.
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict() # type: OrderedDict[tuple, str]
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, int, int]) -> str:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple[str, int, int], value: str) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                return
+
+            self._entries[key] = value
+            self.size += len(value)
+
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+cache = ImageCache(DEFAULT_CACHE_BYTES)
+
+_hash_cache = dict() # type: Dict[tuple, str]
+"""Hashes of files already seen in this process,
+keyed on (path, size, mtime). Saves re-hashing the same
+image for every page that embeds it."""
+
+def hash_file(filepath: str) -> str:
+    """
+    Returns:
+        The sha256 hex digest of a file, or ``None`` if the file doesn't exist.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+
+    cache_key = (str(filepath), st.st_size, st.st_mtime_ns)
+    if cache_key in _hash_cache:
+        return _hash_cache[cache_key]
+
+    with stats.stage("images"):
+        with reader.open_buffer(filepath) as buf:
+            _hash_cache[cache_key] = hashlib.sha256(buf).hexdigest()
+    return _hash_cache[cache_key]
+
+def encode_image(path: str) -> str:
+    """
+    Args:
+        path (str): Path to an image file.
+
+    Returns:
+        The base64-encoded content of the image, as an ASCII string.
+    """
+    st = os.stat(path)
+    key = (str(path), st.st_size, st.st_mtime_ns)
+
+    encoded = cache.get(key)
+    cached = encoded is not None
+    if not cached:
+        with stats.stage("images"):
+            encoded = _encode_file(path)
+        cache.put(key, encoded)
+
+    if stats.current is not None:
+        stats.current.count("images.cached" if cached else "images.encoded")
+
+    return encoded
+
+def _encode_file(path: str) -> str:
+    """
+    Encodes a file in chunks of :data:`CHUNK_SIZE`. Each chunk is
+    a zero-copy slice of the file's buffer (a memory map for large files,
+    see :mod:`reader`), so only the encoded output grows with the size
+    of the file.
+    """
+    import base64
+
+    out = bytearray()
+
+    with reader.open_buffer(path) as buf:
+        view = memoryview(buf)
+        try:
+            for start in range(0, len(view), CHUNK_SIZE):
+                with view[start:start + CHUNK_SIZE] as chunk:
+                    out += base64.b64encode(chunk)
+        finally:
+            view.release()
+
+    return out.decode("ascii")
+
+IMAGE_MODES = ["embed", "copy", "hardlink", "reference"]
+"""How ``image`` nodes are written to rST:
+
+- ``embed``: inline the image as a base64 ``data:`` URI.
+- ``copy``: copy the image into :data:`ASSETS_DIR` in the output directory.
+- ``hardlink``: like ``copy``, but hard-link the image if possible.
+- ``reference``: point to the image where it is, with a relative path.
+"""
+
+ASSETS_DIR = "_images" #: Directory in the output directory that ``copy`` and ``hardlink`` put images in.
+
+class ImageHandler:
+    def __init__(self, mode: str = "embed", outdir: str = ".") -> None:
+        """
+        Decides what goes after ``..  image::`` for each image node.
+
+        In ``copy`` and ``hardlink`` mode, images are stored once under
+        their content hash, e.g. ``_images/3f2a...9c.png``. An image used
+        by many pages, or by several files with identical content,
+        is only copied once. This is safe across worker processes:
+        each asset is written to a temp file, then atomically renamed.
+
+        Args:
+            mode (str): One of :data:`IMAGE_MODES`.
+            outdir (str): Output directory.
+
+        Raises:
+            errors.InvalidOptionError: If ``mode`` isn't one of :data:`IMAGE_MODES`.
+        """
+        if mode not in IMAGE_MODES:
+            raise InvalidOptionError("Image mode must be one of {}".format(IMAGE_MODES))
+        self.mode = mode
+        self.outdir = Path(outdir).absolute()
+        self.assets_dir = self.outdir.joinpath(ASSETS_DIR)
+
+    def target(self, img_path: Path, outfile: str = None) -> str:
+        """
+        Args:
+            img_path (Path): Resolved path to the image file.
+            outfile (str): rST file the image node is written to.
+                Relative image paths are relative to its directory.
+                Defaults to a file in the output directory.
+
+        Returns:
+            The target of the ``..  image::`` directive.
+        """
+        if self.mode == "embed":
+            return "data:image/{};base64,{}".format(img_path.suffix.strip("."), encode_image(img_path))
+
+        if self.mode == "reference":
+            return self._relpath(img_path, outfile)
+
+        return self._relpath(self._publish(img_path), outfile)
+
+    def asset_path(self, img_path: Path, img_hash: str = None) -> Path:
+        """
+        Returns:
+            Where ``copy`` and ``hardlink`` mode store an image.
+        """
+        img_hash = img_hash if img_hash else hash_file(img_path)
+        return self.assets_dir.joinpath(img_hash[:32] + Path(img_path).suffix)
+
+    def has_assets(self, img_hashes: Dict[str, str]) -> bool:
+        """
+        Args:
+            img_hashes (Dict[str, str]): Image paths and their content hashes,
+                as recorded in the build manifest.
+
+        Returns:
+            ``False`` if a page's stored images have gone missing
+            from the output directory, and the page must be rebuilt.
+        """
+        if self.mode not in ["copy", "hardlink"]:
+            return True
+
+        return all(
+            img_hash and self.asset_path(img, img_hash).is_file()
+            for img, img_hash in img_hashes.items()
+        )
+
+    def _publish(self, img_path: Path) -> Path:
+        """
+        Copies or links an image into the assets directory,
+        unless an image with the same content is already there.
+        """
+        asset = self.asset_path(img_path)
+        if asset.is_file():
+            return asset
+
+        self.assets_dir.mkdir(parents=True, exist_ok=True)
+        tmp = asset.with_name("{}.{}.tmp".format(asset.name, os.urandom(4).hex()))
+
+        linked = False
+        if self.mode == "hardlink":
+            try:
+                os.link(img_path, tmp)
+                linked = True
+            except OSError: # e.g. the output directory is on another filesystem.
+                pass
+
+        if not linked:
+            import shutil
+            shutil.copyfile(img_path, tmp)
+
+        os.replace(tmp, asset)
+        return asset
+
+    def _relpath(self, path: Path, outfile: str = None) -> str:
+        base = Path(outfile).absolute().parent if outfile else self.outdir
+        return Path(os.path.relpath(path, base)).as_posix()
@@ -0,0 +1,144 @@
+"""
+Pluggable JSON parser.
+
+json2rst parses JSON with the fastest parser that is installed:
+``orjson``, then ``ujson``, then ``simdjson`` (pysimdjson),
+and falls back to the standard library ``json`` module.
+Use :func:`use` (or ``--json-backend``) to pick one explicitly.
+
+The fast parsers are stricter than ``json``: e.g. orjson rejects
+``NaN``, ``Infinity``, and integers wider than 64 bits. So with ``auto``,
+a document the fast parser rejects is parsed again with ``json``,
+and only fails if ``json`` rejects it too.
+
+Parsers are only imported the first time something is parsed,
+so importing json2rst stays cheap.
+
+All parsers are fed raw bytes. None of them needs the input
+decoded to ``str`` first.
+"""
+import importlib
+from typing import Any, Callable, Union
+
+from . import reader
+from . import stats
+from .errors import InvalidOptionError
+
+BACKENDS = ["auto", "orjson", "ujson", "simdjson", "json"] #: Valid values for :func:`use`.
+
+_AUTO_ORDER = ["orjson", "ujson", "simdjson", "json"]
+
+Buffer = Union[bytes, bytearray, memoryview, str]
+
+_requested = "auto"
+_loads = None # type: Callable[[Buffer], Any]
+_name = None # type: str
+
+def use(backend: str = "auto") -> None:
+    """
+    Selects the JSON parser. Nothing is imported until the next parse.
+
+    Args:
+        backend (str): One of :data:`BACKENDS`.
+
+    Raises:
+        errors.InvalidOptionError: If ``backend`` isn't one of :data:`BACKENDS`.
+    """
+    global _requested, _loads, _name
+
+    if backend not in BACKENDS:
+        raise InvalidOptionError("JSON backend must be one of {}".format(BACKENDS))
+    _requested = backend
+    _loads = None
+    _name = None
+
+def name() -> str:
+    """
+    Returns:
+        Name of the JSON parser in use. Imports it if needed.
+    """
+    _resolve()
+    return _name
+
+def loads(data: Buffer) -> Any:
+    """
+    Parses a JSON document.
+
+    Args:
+        data (Buffer): Raw JSON bytes (or any buffer, or a str).
+    """
+    if _loads is None:
+        _resolve()
+    return _loads(data)
+
+def load_file(filepath: str) -> Any:
+    """
+    Reads and parses a JSON file. Large files are memory-mapped
+    and parsed in place (see :mod:`reader`).
+    """
+    with reader.open_buffer(filepath) as buf:
+        if stats.current is not None:
+            stats.current.count("bytes_read", len(buf))
+        with stats.stage("parse"):
+            return loads(buf)
+
+def _resolve() -> None:
+    global _loads, _name
+
+    if _loads is not None:
+        return
+
+    candidates = _AUTO_ORDER if _requested == "auto" else [_requested]
+
+    for candidate in candidates:
+        try:
+            _loads = _LOADERS[candidate]()
+        except ImportError:
+            if _requested != "auto":
+                raise ImportError(
+                    "JSON backend '{}' is not installed.".format(candidate)) from None
+            continue
+
+        _name = candidate
+        if _requested == "auto" and candidate != "json":
+            _loads = _with_fallback(_loads)
+        return
+
+def _with_fallback(fast: Callable[[Buffer], Any]) -> Callable[[Buffer], Any]:
+    """Wraps a fast parser, so documents it rejects are parsed again with ``json``."""
+    slow = _json_loader()
+
+    def loads(data: Buffer) -> Any:
+        try:
+            return fast(data)
+        except (ValueError, OverflowError): #: Each parser's decode error is a ValueError.
+            return slow(data)
+
+    return loads
+
+def _as_bytes(data: Buffer) -> Union[bytes, str]:
+    """Parsers that don't take buffers get bytes. A no-op for bytes and str."""
+    return data if isinstance(data, (bytes, str)) else bytes(data)
+
+def _orjson_loader() -> Callable[[Buffer], Any]:
+    orjson = importlib.import_module("orjson")
+    return orjson.loads #: Takes bytes, bytearray, memoryview and str.
+
+def _ujson_loader() -> Callable[[Buffer], Any]:
+    ujson = importlib.import_module("ujson")
+    return lambda data: ujson.loads(_as_bytes(data))
+
+def _simdjson_loader() -> Callable[[Buffer], Any]:
+    simdjson = importlib.import_module("simdjson")
+    return lambda data: simdjson.loads(_as_bytes(data))
+
+def _json_loader() -> Callable[[Buffer], Any]:
+    json = importlib.import_module("json")
+    return lambda data: json.loads(_as_bytes(data)) #: Detects UTF-8/16/32 from bytes.
+
+_LOADERS = {
+    "orjson": _orjson_loader,
+    "ujson": _ujson_loader,
+    "simdjson": _simdjson_loader,
+    "json": _json_loader,
+}
@@ -0,0 +1,219 @@
+"""
+Build manifest for incremental rebuilds.
+
+The manifest is a JSON file kept in the output directory.
+For every input JSON file, it records:
+
+- a content hash of the input file,
+- the input file it came from, for records of batch files,
+- the output rST file it was rendered to, relative to the output directory,
+  so the output directory can be moved or restored elsewhere,
+- a content hash of every image the page embeds,
+- the options that change how the page is rendered or named,
+  e.g. ``--images`` and ``--name-key``,
+- the version of json2rst that rendered it.
+
+Entries rendered by another json2rst version are stale, so upgrading
+json2rst re-renders everything. A manifest saved by another version
+isn't loaded at all.
+
+An input is only re-rendered when one of these hashes changes,
+or when its output file has gone missing.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from . import __version__
+from . import images
+from . import nodes
+
+MANIFEST_NAME = ".json2rst-manifest.json"
+SHARD_MANIFEST_NAME = ".json2rst-shards.json" #: Written by :class:`shards.ShardWriter`.
+OUTPUT_FILES = frozenset([MANIFEST_NAME, SHARD_MANIFEST_NAME])
+"""Files json2rst keeps in the output directory. They're never read as input,
+even when the input and output directories are the same."""
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def record_key(srcfile: str, name: str) -> str:
+    """
+    Returns:
+        The manifest key of one record in a batch input file.
+    """
+    return "{}#{}".format(srcfile, name)
+
+def image_deps(srcfile: str, data: Any) -> List[str]:
+    """
+    Finds the images embedded by ``image`` rich nodes in a JSON document.
+
+    Args:
+        srcfile (str): Path to the JSON file. Relative image paths are resolved against it.
+        data (Any): The parsed JSON document. Either a JSON object,
+            or a list of JSON objects.
+
+    Returns:
+        A list of resolved image paths, in document order.
+    """
+    out = list()
+
+    for obj in (data if isinstance(data, list) else [data]):
+        if not isinstance(obj, dict):
+            continue
+
+        for val in obj.values():
+            if not isinstance(val, list):
+                continue
+
+            for line in val:
+                if isinstance(line, dict) and "image" in line:
+                    img_path = str(nodes.resolve_image_path(srcfile, line["image"]))
+                    if img_path not in out:
+                        out.append(img_path)
+
+    return out
+
+def make_entry(srcfile: str, outfile: str, src_hash: str, data: Any, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Builds the manifest entry for a freshly-rendered input file.
+    """
+    return {
+        "source": str(srcfile),
+        "output": str(outfile),
+        "hash": src_hash,
+        "images": {img: images.hash_file(img) for img in image_deps(srcfile, data)},
+        "options": options,
+        "renderer": __version__,
+    }
+
+def is_fresh(entry: Dict[str, Any], outfile: str, src_hash: str, options: Dict[str, Any]) -> bool:
+    """
+    Checks a manifest entry against the current state of an input file.
+
+    Args:
+        entry (Dict[str, Any]): Manifest entry recorded by the last build.
+        outfile (str): Output file the input will be rendered to.
+        src_hash (str): Content hash of the input file as it is now.
+        options (Dict[str, Any]): Rendering options of this build.
+
+    Returns:
+        ``True`` if the output is up-to-date and the input can be skipped.
+    """
+    if not entry:
+        return False
+
+    if entry.get("output") != str(outfile) or not Path(outfile).is_file():
+        return False
+
+    if entry.get("hash") != src_hash or entry.get("options") != options:
+        return False
+
+    if entry.get("renderer") != __version__:
+        return False
+
+    for img, img_hash in entry.get("images", {}).items():
+        if images.hash_file(img) != img_hash:
+            return False
+
+    return True
+
+class Manifest:
+    def __init__(self, outdir: str) -> None:
+        """
+        Loads the build manifest from ``outdir``.
+        A missing, unreadable, or outdated manifest starts out empty.
+
+        Args:
+            outdir (str): Output directory.
+        """
+        self.root = Path(outdir)
+        self.path = self.root.joinpath(MANIFEST_NAME)
+        self.entries = dict() # type: Dict[str, Dict[str, Any]]
+        #: Keys updated since loading, or since ``updated`` was last cleared.
+        self.updated = set() # type: Set[str]
+
+        import json
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("version") != __version__:
+            return
+
+        self.entries = data.get("files", {})
+        for entry in self.entries.values():
+            if "output" in entry:
+                entry["output"] = str(self.root.joinpath(entry["output"]))
+
+    def get(self, srcfile: str) -> Dict[str, Any]:
+        return self.entries.get(str(srcfile))
+
+    def update(self, srcfile: str, entry: Dict[str, Any]) -> None:
+        self.entries[str(srcfile)] = entry
+        self.updated.add(str(srcfile))
+
+    def remove(self, key: str) -> Dict[str, Any]:
+        """
+        Forgets an entry, e.g. because its input was deleted.
+
+        Returns:
+            The removed entry, or ``None``.
+        """
+        self.updated.discard(key)
+        return self.entries.pop(key, None)
+
+    def by_source(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Groups entries by the input file they were rendered from.
+
+        Returns:
+            Input file -> {key: entry}. A plain JSON file has one entry,
+            under its own path. A batch file has one entry per record.
+        """
+        out = dict() # type: Dict[str, Dict[str, Dict[str, Any]]]
+
+        for key, entry in self.entries.items():
+            out.setdefault(entry.get("source", key), dict())[key] = entry
+
+        return out
+
+    def save(self) -> None:
+        """
+        Writes the manifest. Writes to a temp file first
+        so an interrupted build never leaves a half-written manifest.
+        """
+        import json
+
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        files = {key: self._relative(entry) for key, entry in self.entries.items()}
+
+        with open(tmp, "w") as f:
+            json.dump(
+                {"version": __version__, "files": files},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+
+        os.replace(tmp, self.path)
+
+    def _relative(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns:
+            A copy of ``entry`` with its output path relative to the output directory.
+            An output outside the output directory keeps its full path.
+        """
+        if "output" not in entry:
+            return entry
+
+        try:
+            output = Path(entry["output"]).relative_to(self.root)
+        except ValueError:
+            return entry
+
+        return dict(entry, output=output.as_posix())
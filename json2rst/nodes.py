@@ -1,8 +1,10 @@
-import base64
 from pathlib import Path
+from typing import Callable, Dict, Tuple
 from enum import Enum
 
+from . import images
 from . import utils
+from .errors import InvalidImageError, InvalidNodeError
 
 class Nodes(Enum):
     """Enum type for rst nodes"""
@@ -25,16 +27,38 @@ Works only if the root table is at col 0
     CODE_BLOCK_PAD = '    '
     IMAGE = '..  image:: '
 
+def resolve_image_path(srcfile: str, content: str) -> Path:
+    """
+    Resolves the path of an ``image`` node.
+
+    Args:
+        srcfile (str): JSON file containing the node. Relative paths (``./`` or ``../``) are resolved from its directory.
+        content (str): Content of the ``image`` node.
+    """
+    resource_path = Path(srcfile).parent
+    if content.startswith("./") or content.startswith("../"): # if image path is a relative path
+        return resource_path.joinpath(Path(content)) # just join
+
+    return Path(content).resolve().absolute()
+
 class RichNode:
-    RICH_NODE_TYPES = [
-        "heading",
-        "p",
-        "ul",
-        "ol",
-        "code",
-        "code-block",
-        "image",
-    ]
+    """
+    A single rich content node, e.g. ``{"ul": "list item"}``.
+
+    Rendering is delegated to the renderer registered for
+    the node type in :data:`NODE_RENDERERS`.
+    """
+    __slots__ = (
+        "srcfile",
+        "n",
+        "content",
+        "first",
+        "pad",
+        "prev",
+        "next",
+        "image_handler",
+        "outfile",
+    )
 
     def __init__(self,
         srcfile: str,
@@ -43,130 +67,140 @@ class RichNode:
         first: bool,
         prev_node_type: str,
         next_node_type: str,
+        image_handler: images.ImageHandler = None,
+        outfile: str = None,
         ) -> None:
         """
         Args:
-            node_type (str): One of RICH_NODE_TYPES.
+            node_type (str): One of the node types in NODE_RENDERERS.
             content (str): Content of node.
             first (bool): Whether this node is the first 
+            image_handler (images.ImageHandler): Decides how ``image`` nodes
+                are written. Defaults to embedding images as base64.
+            outfile (str): rST file this node is written to.
         """
         self.content = content
         self.n = node_type
         self.first = first
+        self.pad = "" if first else Nodes.LEFTPAD.value
+        #: If this is the first node in a rich content block, don't add LEFTPAD output
         self.srcfile = srcfile
         self.prev = prev_node_type
         self.next = next_node_type
-        
+        self.image_handler = image_handler
+        self.outfile = outfile
+
         self._is_rich_node()
 
     def parse(self) -> str:
-        return self._handle_node()
+        """
+        Returns:
+            An rST-formatted string ready to plug into our output file.
+        """
+        return NODE_RENDERERS[self.n](self)
 
     def _is_rich_node(self) -> bool:
-        if self.n not in self.RICH_NODE_TYPES:
-            print(f"Invalid node type: [{self.srcfile}]: {self.n}\n" \
-                  f"JSON key should be one of {self.RICH_NODE_TYPES}")
-            exit(1) # TODO: exception handling.
-            # return False
+        if self.n not in NODE_RENDERERS:
+            raise InvalidNodeError(
+                f"Invalid node type: [{self.srcfile}]: {self.n}\n" \
+                f"JSON key should be one of {list(NODE_RENDERERS)}")
 
         return True
 
-    def _handle_node(self) -> str:
-        """
-        Would *really* love to have Python 3.10 pattern matching
-        syntax here right now :(
+NodeRenderer = Callable[[RichNode], str]
 
-        Args:
-            n (str): Node type. Must be one of self.RICH_NODE_TYPES.
-        Returns:
-            An rST-formatted string ready to plug into our output file.
-        """
+NODE_RENDERERS = dict() # type: Dict[str, NodeRenderer]
+"""Registry of rich node types and the functions that render them.
+Use :func:`register_node` to add node types."""
 
-        LEFTPAD = "" if self.first else Nodes.LEFTPAD.value
-        #: If this is the first node in a rich content block, don't add LEFTPAD output
+def register_node(node_type: str, renderer: NodeRenderer = None):
+    """
+    Registers a renderer for a rich node type, replacing any existing one.
+
+    A renderer takes a :class:`RichNode` and returns rST.
+    ``node.content`` is the node's JSON value, so it isn't always a str.
+    Every line it returns must start with ``node.pad``, and it should
+    end with a blank line, like the built-in renderers. Can be used
+    as a decorator:
+
+    ..  code-block:: python
+
+        from json2rst import nodes
+
+        @nodes.register_node("note")
+        def render_note(node):
+            return "{}..  note:: {}\n\n".format(node.pad, node.content)
+
+    Args:
+        node_type (str): JSON key of the node, e.g. ``"note"``.
+        renderer (NodeRenderer): Function that renders the node.
+    """
+    if renderer is None:
+        return lambda func: register_node(node_type, func)
+
+    NODE_RENDERERS[node_type] = renderer
+    return renderer
+
+LINE_END = "\n\n"
+
+def _prefixes(prefix: str) -> Tuple[str, str]:
+    """
+    Returns:
+        ``prefix`` with and without LEFTPAD, indexed by ``RichNode.first``.
+    """
+    return (Nodes.LEFTPAD.value + prefix, prefix)
+
+_HEADING = _prefixes("**")
+_UL = _prefixes(Nodes.UL_ITEM.value)
+_OL = _prefixes(Nodes.OL_ITEM.value)
+_CODE = _prefixes("``")
+_CODE_BLOCK_INIT = _prefixes(Nodes.CODE_BLOCK_INIT.value + "\n")
+_CODE_BLOCK_LINE = _prefixes(Nodes.CODE_BLOCK_PAD.value)
+_IMAGE = _prefixes(Nodes.IMAGE.value)
+_IMAGE_EXTS = [".jpg", ".png"] #: keep supported image types
+
+_default_image_handler = images.ImageHandler()
+
+@register_node("heading")
+def _render_heading(node: RichNode) -> str:
+    return _HEADING[node.first] + str(node.content) + "**" + LINE_END
+
+@register_node("p")
+def _render_p(node: RichNode) -> str:
+    return node.pad + utils.handle_newlines(str(node.content)) + LINE_END
+
+@register_node("ul")
+def _render_ul(node: RichNode) -> str:
+    return _UL[node.first] + str(node.content) + LINE_END
+
+@register_node("ol")
+def _render_ol(node: RichNode) -> str:
+    return _OL[node.first] + str(node.content) + LINE_END
+
+@register_node("code")
+def _render_code(node: RichNode) -> str:
+    return _CODE[node.first] + str(node.content) + "``" + LINE_END
+
+@register_node("code-block")
+def _render_code_block(node: RichNode) -> str:
+    """
+    Consecutive ``code-block`` nodes are joined into one code block.
+    """
+    init = "" if node.prev == "code-block" else _CODE_BLOCK_INIT[node.first]
+    end = "\n" if node.next == "code-block" else LINE_END
+
+    return init + _CODE_BLOCK_LINE[node.first] + str(node.content) + end
+
+@register_node("image")
+def _render_image(node: RichNode) -> str:
+    img_path = resolve_image_path(node.srcfile, str(node.content))
+
+    if not img_path.is_file():
+        raise InvalidImageError(f"{img_path} must be an image file. Paths are resolved from directory you're running json2rst in.")
+
+    if img_path.suffix not in _IMAGE_EXTS:
+        raise InvalidImageError(f"{img_path} must have one of these file extensions: {_IMAGE_EXTS}")
 
-        LINE_END = "\n\n"
-
-
-        if self.n == "heading":
-            return "{}**{}**{}".format(
-                LEFTPAD,
-                self.content,
-                LINE_END,
-            )
-
-        elif self.n == "p":
-            return "{}{}{}".format(
-                LEFTPAD,
-                utils.handle_newlines(self.content),
-                LINE_END,
-            )
-
-        elif self.n == "ul":
-            return "{}{}{}{}".format(
-                LEFTPAD,
-                Nodes.UL_ITEM.value,
-                self.content,
-                LINE_END,
-            )
-
-        elif self.n == "ol":
-            return "{}{}{}{}".format(
-                LEFTPAD,
-                Nodes.OL_ITEM.value,
-                self.content,
-                LINE_END,
-            )
-
-        elif self.n == "code":
-            return "{}``{}``{}".format(
-                LEFTPAD,
-                self.content,
-                LINE_END,
-            )
-
-        elif self.n == "code-block":
-            code_out = ""
-            
-            if self.prev != "code-block":
-                code_out = f"{LEFTPAD}{Nodes.CODE_BLOCK_INIT.value}\n"
-            
-            code_out = code_out + "{}{}{}".format(
-                LEFTPAD,
-                Nodes.CODE_BLOCK_PAD.value,
-                self.content,
-            )
-
-            if self.next == "code-block":
-                code_out = code_out + "\n"
-            else:
-                code_out = code_out + LINE_END
-
-            return code_out
-            
-
-        elif self.n == "image":
-            # might need to embed as base64 image.
-            resource_path = Path(self.srcfile).parent
-            if self.content.startswith("./") or self.content.startswith("../"): # if image path is a relative path
-                img_path = resource_path.joinpath(Path(self.content)) # just join 
-            else:
-                img_path = Path(self.content).resolve().absolute()
-            img_exts = [".jpg",".png"] #: keep supported image types
-
-            if not img_path.is_file():
-                print(f"{img_path} must be an image file. Paths are resolved from directory you're running json2rst in.")
-                exit(1)
-
-            if img_path.suffix not in img_exts:
-                print(f"{img_path} must have one of these file extensions: {img_exts}")
-                exit(1)
-
-            return f"{LEFTPAD}{Nodes.IMAGE.value}data:image/{img_path.suffix.strip('.')};base64,{self._encode_image(img_path)}\n\n"
-
-    def _encode_image(self, file: str) -> str:
-        with open(file, "rb") as f:
-            img = base64.b64encode(f.read())
-
-        return str(img).strip("b").strip("'")
+    handler = node.image_handler if node.image_handler else _default_image_handler
 
+    return _IMAGE[node.first] + handler.target(img_path, node.outfile) + LINE_END
@@ -0,0 +1,210 @@
+"""
+Paths into nested JSON objects, for pivot ``--headers``.
+
+A header is a key, or a path of keys and array indexes,
+in a small subset of JSONPath:
+
+- ``ID``: the top-level key ``ID``.
+- ``meta.owner.team``: nested keys.
+- ``metrics[0].value``: an array element. Negative indexes count from the end.
+- ``metrics[*].value``: every element of an array, as a list.
+  With ``--explode``, each element gets its own row instead.
+- ``meta["a.b"]``: a key with dots or brackets in it.
+
+A leading ``$`` or ``$.`` is allowed, and ignored.
+If an object has a top-level key that is exactly the header
+(e.g. ``"v1.2"``), that key wins over the path.
+A header that isn't a valid path (e.g. ``Owner's team`` or ``Time [s]``)
+is read as a top-level key.
+
+Each header is compiled once, by :func:`compile_path`, into an accessor
+that walks straight to its value, so projecting an object costs one
+lookup per path step, however many keys the object has.
+"""
+import itertools
+import re
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
+
+from .errors import InvalidPathError
+
+MISSING = object() #: Returned by accessors when an object doesn't have the path.
+
+KEY = "key"
+INDEX = "index"
+ALL = "all"
+
+Step = Tuple[str, Union[str, int, None]]
+"""(kind, argument): (``KEY``, key), (``INDEX``, index), or (``ALL``, None)."""
+
+_TOKEN = re.compile(r"""
+    \.?(?P<key>[^.\[\]"']+)
+    | \[(?P<index>-?\d+)\]
+    | \[(?P<all>\*)\]
+    | \[(?P<quote>["'])(?P<quoted>(?:\\.|(?!(?P=quote)).)*)(?P=quote)\]
+    """, re.VERBOSE)
+
+_ESCAPE = re.compile(r"\\(.)")
+
+def parse_path(path: str) -> List[Step]:
+    """
+    Args:
+        path (str): A pivot header, e.g. ``metrics[0].value``.
+
+    Returns:
+        The steps of the path.
+
+    Raises:
+        errors.InvalidPathError: If ``path`` isn't a valid path.
+    """
+    text = path[1:] if path.startswith("$") else path
+    if text.startswith("."):
+        text = text[1:]
+
+    steps = list() # type: List[Step]
+    pos = 0
+
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if match is None:
+            raise InvalidPathError("Invalid header path {!r} at position {}.".format(path, pos))
+
+        if match.group("key") is not None:
+            if (text[pos] == ".") != (pos > 0):
+                raise InvalidPathError("Invalid header path {!r} at position {}: "
+                                       "expected '.' or '['.".format(path, pos))
+            steps.append((KEY, match.group("key")))
+        elif match.group("index") is not None:
+            steps.append((INDEX, int(match.group("index"))))
+        elif match.group("all") is not None:
+            steps.append((ALL, None))
+        else:
+            steps.append((KEY, _ESCAPE.sub(r"\1", match.group("quoted"))))
+
+        pos = match.end()
+
+    if not steps:
+        raise InvalidPathError("Header path {!r} is empty.".format(path))
+
+    return steps
+
+def _walk(obj: Any, steps: List[Step], start: int) -> Any:
+    for i in range(start, len(steps)):
+        kind, arg = steps[i]
+
+        if kind == KEY:
+            if not isinstance(obj, dict) or arg not in obj:
+                return MISSING
+            obj = obj[arg]
+        elif kind == INDEX:
+            if not isinstance(obj, list) or not -len(obj) <= arg < len(obj):
+                return MISSING
+            obj = obj[arg]
+        else:
+            if not isinstance(obj, list):
+                return MISSING
+            out = list()
+            nested = any(step[0] == ALL for step in steps[i + 1:])
+            for item in obj:
+                val = _walk(item, steps, i + 1)
+                if val is MISSING:
+                    continue
+                if nested:
+                    out.extend(val) #: Flatten a[*].b[*] into one list.
+                else:
+                    out.append(val)
+            return out
+
+    return obj
+
+def _header_steps(header: str) -> List[Step]:
+    """
+    Returns:
+        The steps of ``header``, or a single key step if it isn't a valid path.
+    """
+    try:
+        return parse_path(header)
+    except InvalidPathError:
+        return [(KEY, header)]
+
+def compile_path(path: str) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Returns:
+        A function that takes a JSON object, and returns the value at ``path``,
+        or :data:`MISSING`. If ``path`` isn't a valid path,
+        the function looks it up as a top-level key.
+    """
+    steps = _header_steps(path)
+
+    if steps == [(KEY, path)]:
+        return lambda obj: obj.get(path, MISSING)
+
+    def get(obj: Dict[str, Any]) -> Any:
+        if path in obj:
+            return obj[path]
+        return _walk(obj, steps, 0)
+
+    return get
+
+class Projection:
+    """
+    Projects JSON objects onto a list of header paths.
+    """
+    def __init__(self, headers: List[str]) -> None:
+        self.headers = headers
+        self.accessors = [compile_path(h) for h in headers]
+        #: Whether every header is a top-level key. Then objects are projected with a single ``map``.
+        self.plain = all(_header_steps(h) == [(KEY, h)] for h in headers)
+        #: Top-level keys that headers read from.
+        self.roots = frozenset(itertools.chain(headers, (_root(h) for h in headers)))
+
+        #: Indexes of ``[*]`` headers, grouped by the array they fan out.
+        #: Headers in the same group (e.g. ``metrics[*].name`` and ``metrics[*].value``)
+        #: are exploded side by side; different groups are crossed.
+        groups = dict() # type: Dict[Tuple[Step, ...], List[int]]
+        for index, header in enumerate(headers):
+            steps = _header_steps(header)
+            if (ALL, None) in steps:
+                groups.setdefault(tuple(steps[:steps.index((ALL, None))]), list()).append(index)
+        self.fanout = list(groups.values())
+
+    def __call__(self, obj: Dict[str, Any]) -> Tuple[tuple, List[str]]:
+        """
+        Returns:
+            (values, missing headers). Missing values are ``None``.
+        """
+        if self.plain:
+            values = tuple(map(obj.get, self.headers))
+            if None not in values:
+                return (values, list())
+            return (values, [h for h, v in zip(self.headers, values) if v is None and h not in obj])
+
+        values = [get(obj) for get in self.accessors]
+        missing = [h for h, v in zip(self.headers, values) if v is MISSING]
+        if missing:
+            values = [None if v is MISSING else v for v in values]
+        return (tuple(values), missing)
+
+    def explode(self, values: tuple) -> Iterator[tuple]:
+        """
+        Yields one row per element of each ``[*]`` header's list.
+        A header with no elements yields one row, with ``None`` in that column.
+        """
+        if not self.fanout:
+            yield values
+            return
+
+        group_rows = list()
+        for group in self.fanout:
+            lists = [values[i] if isinstance(values[i], list) else list() for i in group]
+            group_rows.append(list(itertools.zip_longest(*lists)) or [(None,) * len(group)])
+
+        for combo in itertools.product(*group_rows):
+            row = list(values)
+            for group, group_values in zip(self.fanout, combo):
+                for index, val in zip(group, group_values):
+                    row[index] = val
+            yield tuple(row)
+
+def _root(path: str) -> str:
+    kind, arg = _header_steps(path)[0]
+    return arg if kind == KEY else path
@@ -0,0 +1,180 @@
+"""
+A threaded pipeline, for overlapping I/O with rendering.
+
+Each item flows through a fixed list of stages, e.g.
+read → render → write. Each stage has its own pool of
+worker threads, and stages are joined by bounded queues:
+when a stage falls behind, the stages before it block
+instead of piling up items in memory (backpressure).
+
+Threads suit I/O-bound stages, e.g. reading from and writing to
+network filesystems. For CPU-bound work, prefer worker processes:
+:func:`imap_chunks` feeds a process pool the same lazy, in-order way.
+"""
+import collections
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, NamedTuple
+
+from . import jsonbackend
+from . import stats
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[[Any], Any] #: Takes an item, and returns the item for the next stage.
+    workers: int = 1
+
+class _Failed:
+    """Wraps an exception raised by a stage. Later stages pass it along untouched."""
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException) -> None:
+        self.exc = exc
+
+_DONE = object() #: Tells a worker that no more items are coming.
+
+def run(items: Iterable[Any], stages: List[Stage], queue_size: int = 64) -> Iterator[Any]:
+    """
+    Runs each item through each stage, and yields the results in input order.
+
+    ``items`` is consumed lazily, from a separate thread,
+    so the first results come out before ``items`` runs out.
+    At most ``2 * queue_size`` items are in flight (fed but not yet yielded),
+    so one slow item can't make later results pile up while they wait for it.
+
+    Args:
+        items (Iterable[Any]): Items to process.
+        stages (List[Stage]): Stages, in order.
+        queue_size (int): Maximum number of items waiting in front of each stage.
+
+    Raises:
+        The first exception raised by a stage (in input order),
+        or by iterating ``items``.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    remaining = [stage.workers for stage in stages]
+    lock = threading.Lock()
+    feed_error = list()
+    window = 2 * queue_size #: Maximum number of items in flight.
+    emitted = threading.Condition()
+    next_index = 0 #: Index of the next result to yield.
+
+    def feed() -> None:
+        try:
+            for index, item in enumerate(items):
+                with emitted:
+                    while index >= next_index + window:
+                        emitted.wait()
+                queues[0].put((index, item))
+        except BaseException as e:
+            feed_error.append(e)
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    def work(i: int) -> None:
+        func = stages[i].func
+        q_in, q_out = queues[i], queues[i + 1]
+
+        while True:
+            got = q_in.get()
+            if got is _DONE:
+                break
+
+            index, item = got
+            if not isinstance(item, _Failed):
+                try:
+                    item = func(item)
+                except BaseException as e:
+                    item = _Failed(e)
+            q_out.put((index, item))
+
+        with lock:
+            remaining[i] -= 1
+            last = remaining[i] == 0
+
+        if last: #: Pass the end of input on to the next stage.
+            next_workers = stages[i + 1].workers if i + 1 < len(stages) else 1
+            for _ in range(next_workers):
+                q_out.put(_DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+    for i, stage in enumerate(stages):
+        for n in range(stage.workers):
+            threads.append(threading.Thread(
+                target=work,
+                args=(i,),
+                name="pipeline-{}-{}".format(stage.name, n),
+                daemon=True,
+            ))
+
+    for thread in threads:
+        thread.start()
+
+    results = queues[-1]
+    pending = dict() # type: Dict[int, Any]
+
+    while True:
+        got = results.get()
+        if got is _DONE:
+            break
+
+        index, item = got
+        pending[index] = item
+
+        while next_index in pending: #: Reorder results back into input order.
+            item = pending.pop(next_index)
+            with emitted:
+                next_index += 1
+                emitted.notify()
+            if isinstance(item, _Failed):
+                raise item.exc
+            yield item
+
+    if feed_error:
+        raise feed_error[0]
+
+def imap_chunks(
+    executor: "Executor",
+    func: Callable[[List[Any]], Any],
+    items: Iterable[Any],
+    workers: int,
+    chunk_size: int = 32,
+    ) -> Iterator[Any]:
+    """
+    Like ``executor.map(func, chunks)``, where ``chunks`` are lists of
+    up to ``chunk_size`` items, but consumes ``items`` lazily: at most
+    a few chunks per worker are in flight at once, so a huge input is
+    never held in memory. Results are yielded in input order.
+
+    Args:
+        func (Callable[[List[Any]], Any]): Takes a chunk of items.
+            Must be picklable for a process pool, e.g. a module-level function.
+
+    Yields:
+        ``func(chunk)`` for each chunk.
+    """
+    pending = collections.deque()
+    items = iter(items)
+
+    while True:
+        chunk = [item for _, item in zip(range(chunk_size), items)]
+        if chunk:
+            pending.append(executor.submit(func, chunk))
+
+        if pending and (not chunk or len(pending) >= workers * 4):
+            yield pending.popleft().result()
+        elif not chunk:
+            return
+
+def init_worker(json_backend: str, collect_stats: bool) -> None:
+    """
+    Initializer for worker processes fed by :func:`imap_chunks`: uses the
+    parent's JSON parser, and collects stats if the parent does.
+    """
+    jsonbackend.use(json_backend)
+    if collect_stats:
+        stats.enable()
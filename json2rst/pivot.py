@@ -32,116 +32,570 @@ TODO:
 - Handle rich nodes in csv content?
 
 """
-import csv
-import json
-import operator
-import sys, os
-from typing import List, Dict
+import functools
+import heapq
+import itertools
+import logging
+import os
+import pickle
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Tuple
 
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '.')))
+from . import aggregate
+from . import jsonbackend
+from . import paths
+from . import pipeline
+from . import stats
+from . import tables
+from .errors import InvalidDocumentError, InvalidOptionError, PivotKeyError
+
+def _numeric_key(val: Any) -> tuple:
+    try:
+        return (0, float(val))
+    except (TypeError, ValueError):
+        return (1, str(val))
+
+_ISO_DATETIME = re.compile(r"""
+    (\d{4})-(\d{2})-(\d{2})
+    (?:[T\ ](\d{2}):(\d{2})(?::(\d{2})(?:[.,](\d{1,6})\d*)?)?
+    \s*(Z|[+-]\d{2}:?\d{2})?)?$
+    """, re.VERBOSE)
+
+def _date_key(val: Any) -> tuple:
+    """
+    Parses ISO 8601 dates and times, e.g. ``2021-03-25`` or ``2021-03-25T10:00:00+08:00``.
+    Times without an offset are taken to be UTC, so they compare with times that have one.
+    """
+    match = _ISO_DATETIME.match(str(val).strip())
+    if match is None:
+        return (1, str(val))
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+
+    try:
+        if offset is None or offset == "Z":
+            tz = timezone.utc
+        else:
+            sign = -1 if offset[0] == "-" else 1
+            digits = offset[1:].replace(":", "")
+            tz = timezone(sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:])))
+
+        return (0, datetime(
+            int(year), int(month), int(day),
+            int(hour or 0), int(minute or 0), int(second or 0),
+            int((fraction or "0").ljust(6, "0")),
+            tzinfo=tz,
+            ))
+    except ValueError:
+        return (1, str(val))
+
+_DIGITS = re.compile(r"(\d+)")
+
+def _natural_key(val: Any) -> tuple:
+    """
+    Sorts ``ID-2`` before ``ID-10``. Splitting on digit runs always
+    puts strings at even positions and ints at odd positions,
+    so two natural keys never compare a str with an int.
+    """
+    parts = _DIGITS.split(str(val))
+    return (0, tuple(int(p) if i % 2 else p for i, p in enumerate(parts)))
+
+def _str_key(val: Any) -> tuple:
+    return (0, str(val))
+
+SORT_TYPES = {
+    "str": _str_key,
+    "numeric": _numeric_key,
+    "date": _date_key,
+    "natural": _natural_key,
+} #: Sort key types for ``--sort-by key:type``. ``date`` expects ISO 8601 dates. See :func:`_date_key`.
+
+def parse_sort_spec(spec: str) -> List[Tuple[str, str]]:
+    """
+    Args:
+        spec (str): Value from ``--sort-by``. A comma-separated list
+            of keys, each with an optional type. E.g. ``Status,ID:natural,Score:numeric``.
+
+    Returns:
+        A list of (key, type) tuples.
+
+    Raises:
+        errors.InvalidOptionError: If a sort type isn't one of :data:`SORT_TYPES`.
+    """
+    out = list()
+
+    for item in spec.split(","):
+        key, _, sort_type = item.strip().partition(":")
+        sort_type = sort_type.strip() or "str"
+        if sort_type not in SORT_TYPES:
+            raise InvalidOptionError(
+                "Sort type for '{}' must be one of {}".format(key, list(SORT_TYPES)))
+        out.append((key.strip(), sort_type))
+
+    return out
+
+SORT_ORDERS = ["ascending", "descending"] #: Values for ``--sort-order``.
+
+class KeyReport(NamedTuple):
+    """Keys that didn't match ``--headers`` in one JSON file."""
+    file: str
+    missing: List[str] #: Headers that the JSON object doesn't have.
+    extra: List[str] #: Keys in the JSON object that aren't headers.
 
 class Pivot:
+    SORT_MEMORY = 64 * 1024 * 1024
+    """Default memory budget, in bytes, for sorting rows in memory with ``--sort-by``.
+Larger inputs are sorted in chunks that are spilled to disk,
+then merged."""
+
+    JOB_CHUNK_SIZE = 64 #: Files sent to a worker process at a time, with ``jobs``.
+
+    BATCH_ROWS = 64 * 1024
+    """Rows per :class:`tables.ColumnBatch` handed to the output writer.
+Also the row group size of Parquet output."""
+
     def __init__(self,
                  file_list: List[str],
                  header_list: List[str],
                  strict: bool,
                  csv_out: str,
                  sort_key: str,
-                 sort_order: str) -> None:
+                 sort_order: str,
+                 sort_memory: int = None,
+                 limit: int = None,
+                 objects: Iterable[Tuple[str, Dict[str, Any]]] = None,
+                 fmt: str = "csv",
+                 explode: bool = False,
+                 group_by: List[str] = None,
+                 aggs: str = None,
+                 jobs: int = 1) -> None:
         """
         Pivot object.
 
+        JSON files are only read when :meth:`pivot` runs, one at a time,
+        so memory use is bounded by the largest single JSON file.
+        With ``jobs``, worker processes read and project files in chunks.
+
         Args:
-            json_objects (List[Dict[str,str]]): Takes a list
-                of JSON objects and pivots.
-        """
-        json_objects = list()
+            file_list (List[str]): List of JSON files to pivot.
+                Each file must contain a single JSON object.
+            header_list (List[str]): Keys to extract from each JSON object.
+                Each can be a path to a nested value, e.g. ``meta.owner.team``
+                or ``metrics[*].value``. See :mod:`paths`.
+                Not used with ``group_by``.
+            strict (bool): Fail if any JSON object is missing a key in
+                ``header_list``, or has a key that isn't in ``header_list``.
+                Otherwise, missing keys are left blank and logged.
+            csv_out (str): Name of output file. Defaults to ``pivot``,
+                with the suffix of ``fmt``.
+            sort_key (str): Keys to sort rows by. See :func:`parse_sort_spec`.
+                Each key must be one of the output headers.
+            sort_order (str): ``ascending`` or ``descending``.
+            sort_memory (int): Memory budget for sorting, in bytes.
+                Defaults to :attr:`SORT_MEMORY`.
+            limit (int): Only write the first ``limit`` rows.
+                When sorting, only the top ``limit`` rows are kept in memory.
+            objects (Iterable[Tuple[str, Dict[str, Any]]]): (name, JSON object)
+                pairs to pivot instead of the files in ``file_list``,
+                e.g. objects already in memory. Names are used in ``self.report``.
+            fmt (str): Output format. One of ``tables.TABLE_WRITERS``.
+            explode (bool): Write one row per element of ``[*]`` headers,
+                instead of one row per object, with the elements in a list.
+            group_by (List[str]): Write one row per distinct combination
+                of these headers, with ``aggs``, instead of one row per object.
+            aggs (str): Aggregates to write with ``group_by``,
+                e.g. ``*:count,Effort:sum``. See :func:`aggregate.parse_agg_spec`.
+                Defaults to ``*:count``.
+            jobs (int): Number of worker processes that read and project files.
+                Output is the same as with 1 (the default). Not used with ``objects``.
 
-        for filepath in file_list:
-            with open(filepath) as f:
-                j = json.load(f)
-                json_objects.append(j)
+        Raises:
+            errors.InvalidOptionError: If ``fmt``, ``sort_key``, ``sort_order``,
+                or ``aggs`` isn't valid.
+        """
+        if fmt not in tables.TABLE_WRITERS:
+            raise InvalidOptionError("Pivot format must be one of {}".format(list(tables.TABLE_WRITERS)))
+        if sort_order and sort_order not in SORT_ORDERS:
+            raise InvalidOptionError("Sort order must be one of {}".format(SORT_ORDERS))
 
-        assert(isinstance(json_objects, list)), \
-            "Pivot only takes a list of JSON objects: {}"
-        for obj in json_objects:
-            assert(isinstance(obj, dict)), \
-                "{} must be a dictionary.".format(obj)
+        self.aggregator = None # type: aggregate.Aggregator
+        if group_by:
+            self.aggregator = aggregate.Aggregator(
+                group_by,
+                aggregate.parse_agg_spec(aggs if aggs else "*:count"),
+                )
+            header_list = self.aggregator.headers
+            fields = self.aggregator.fields
+        else:
+            fields = header_list
 
-        self.json_objects = json_objects
-        self.header_list = header_list
+        self.file_list = file_list
+        self.header_list = header_list #: Output columns.
+        self.header_set = frozenset(header_list)
+        self.projection = paths.Projection(fields)
+        self.report = list() # type: List[KeyReport]
         self.strict = strict
         self.csv_out = csv_out
         self.sort_key = sort_key
+        self.sort_keys = parse_sort_spec(sort_key) if sort_key else list()
+        for name, _ in self.sort_keys:
+            if name not in self.header_set:
+                raise InvalidOptionError(
+                    "Sort key '{}' must be one of the pivot headers: {}".format(name, header_list))
         self.sort_order = sort_order
-
+        self.sort_memory = sort_memory if sort_memory else self.SORT_MEMORY
+        self.limit = limit
+        self.objects = objects
+        self.fmt = fmt
+        self.explode = explode and bool(self.projection.fanout)
+        self.jobs = jobs if jobs else 1
 
     def pivot(self) -> None:
         """
-        Returns:
-            Returns the pivoted data in a CSV-formatted string
+        Writes the pivoted data to a file, in ``self.fmt``.
+
+        Every JSON file is validated against the headers as it is read.
+        Afterwards, ``self.report`` lists the files that didn't match.
+
+        Raises:
+            PivotKeyError: In strict mode, if any file didn't match the headers.
+                The output file is not written.
+            ImportError: If ``self.fmt`` needs a library that isn't installed.
         """
-        csvout = self.csv_out if self.csv_out else "pivot.csv"
+        writer_class = tables.TABLE_WRITERS[self.fmt]
+        out = self.csv_out if self.csv_out else "pivot" + writer_class.suffix
+        tmpout = out + ".tmp"
+        batches = self.batches()
 
-        self._write_csv(csvout)
+        try:
+            with writer_class(tmpout, self.header_list) as writer:
+                for batch in batches:
+                    with stats.stage("write"):
+                        writer.write(batch)
 
-        if self.sort_key:
-            self._sort_by_keys(csvout)
+            if self.strict and self.report:
+                raise PivotKeyError(self.report)
+        except BaseException:
+            if os.path.exists(tmpout):
+                os.remove(tmpout)
+            raise
 
-    def _write_csv(self, filename:str) -> None:
-        with open(filename,"w") as csvfile:
-            writer = csv.DictWriter(
-                    csvfile,
-                   fieldnames=self.header_list
-                )
-            
-            writer.writeheader()
+        os.replace(tmpout, out)
+
+    def batches(self) -> Iterator[tables.ColumnBatch]:
+        """
+        Yields the pivoted rows, sorted and limited, in column batches
+        of up to :attr:`BATCH_ROWS` rows. Columns are in the order of
+        ``self.header_list``; missing values are ``None``.
+
+        ``self.report`` is filled in as batches are yielded,
+        so it is only complete once all batches have been consumed.
+        """
+        rows = self._rows()
+
+        while True:
+            chunk = list(itertools.islice(rows, self.BATCH_ROWS))
+            if not chunk:
+                return
+            yield tables.ColumnBatch.from_rows(self.header_list, chunk)
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        """
+        Same as :meth:`batches`, but yields one dict per row,
+        mapping every header to its value, or ``None`` if it's missing.
+        """
+        for values in self._rows():
+            yield dict(zip(self.header_list, values))
+
+    def _rows(self) -> Iterator[tuple]:
+        """
+        Yields the pivoted rows as tuples of values, in the order of ``self.header_list``.
+        """
+        self.report = list()
+
+        if self.aggregator is not None:
+            rows = self._aggregate()
+            if stats.current is not None:
+                rows = stats.current.timed_iter("aggregate", rows)
+        else:
+            rows = self._iter_rows()
+
+        if self.sort_keys:
+            rows = self._sort_rows(rows)
+            if stats.current is not None:
+                rows = stats.current.timed_iter("sort", rows)
+        elif self.limit is not None:
+            rows = itertools.islice(rows, self.limit)
+
+        return rows
+
+    def _aggregate(self) -> Iterator[tuple]:
+        """
+        Yields one row per group, once all input files have been aggregated.
+        With worker processes, each worker aggregates its chunks of files,
+        and the partial aggregates are merged here.
+        """
+        aggregator = self.aggregator.empty()
+
+        if self._parallel():
+            for partial in self._iter_chunks():
+                aggregator.merge(partial)
+        else:
+            for values in self._iter_rows():
+                aggregator.add(values)
+
+        if stats.current is not None:
+            stats.current.count("pivot.groups", len(aggregator))
 
-            for obj in self.json_objects:
-                self._check_pivot_keys()
-                writer.writerow(self._get_fields(obj))
+        yield from aggregator.rows()
 
-    def _get_fields(self, obj: Dict[str, str]) -> Dict[str, str]:
-        out = dict()
-        for (k, v) in obj.items():
-            if k in self.header_list:
-                out[k] = v
-            elif self.strict:
-                raise Exception("{} key not found in {}".format(k, obj))
-        return out
+    def _parallel(self) -> bool:
+        """Whether to read files in worker processes. Not worth it for a few files."""
+        return self.jobs > 1 and self.objects is None and len(self.file_list) > self.JOB_CHUNK_SIZE
 
-    def _check_pivot_keys(self) -> bool:
+    def _iter_objects(self) -> Iterator[Tuple[str, Any]]:
         """
-        Checks if all important keys are
-        available in JSON objects to pivot.
+        Yields (filepath, JSON object) for each input file, one file at a time.
+        """
+        if self.objects is not None:
+            return iter(self.objects)
+        return _load_files(self.file_list)
+
+    def _iter_rows(self) -> Iterator[tuple]:
+        """
+        Yields one projected row per input file,
+        or one per ``[*]`` element with ``self.explode``.
+        """
+        if self._parallel():
+            for rows in self._iter_chunks():
+                yield from rows
+            return
+
+        yield from _project(self.projection, self.explode, self.strict, self._iter_objects(), self._add_report)
+
+    def _iter_chunks(self) -> Iterator[Any]:
+        """
+        Reads and projects files in worker processes, :attr:`JOB_CHUNK_SIZE` at a time.
+        Workers send back projected rows (or, with ``group_by``, a partial
+        :class:`aggregate.Aggregator`) instead of whole JSON objects.
 
+        Yields:
+            The result of each chunk, in input order.
         """
-        for obj in self.json_objects:
-            for item in self.header_list:
-                assert(item in list(obj.keys())), \
-                    "Dictionaries used in Pivot must have '{}' key".format(item)
+        from concurrent.futures import ProcessPoolExecutor
+
+        task = PivotTask(
+            self.projection.headers,
+            self.explode,
+            self.strict,
+            self.aggregator.empty() if self.aggregator is not None else None,
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            initializer=pipeline.init_worker,
+            initargs=(jsonbackend.name(), stats.current is not None),
+            ) as executor:
+            chunks = pipeline.imap_chunks(
+                executor,
+                functools.partial(_pivot_chunk, task),
+                self.file_list,
+                self.jobs,
+                self.JOB_CHUNK_SIZE,
+            )
+            for result, reports, worker_stats in chunks:
+                if worker_stats:
+                    stats.current.merge(worker_stats)
+                for report in reports:
+                    self._add_report(report)
+                yield result
 
-        return True
+    def _add_report(self, report: KeyReport) -> None:
+        self.report.append(report)
+
+        if report.missing and not self.strict:
+            logging.warning("{} is missing pivot headers: {}".format(report.file, report.missing))
+
+    def _sort_key_func(self, rev: bool) -> Callable[[tuple], tuple]:
+        """
+        Args:
+            rev (bool): Whether rows will be sorted in descending order.
 
-    def _sort_by_keys(self, filename: str) -> None:
+        Returns:
+            A function that extracts the typed sort key of a row.
+            Rows missing a sort key sort after rows that have it,
+            in either order.
         """
-        Another crude function.
-        Instead of getting the csv data to sort from a buffer,
-        we're reading from a file and then writing back to it. 🙃
+        getters = [(self.header_list.index(name), SORT_TYPES[sort_type]) for name, sort_type in self.sort_keys]
+        missing = (-1, "") if rev else (2, "")
+
+        def key(row: tuple) -> tuple:
+            out = list()
+            for index, typed_key in getters:
+                val = row[index]
+                out.append(missing if val is None else typed_key(val))
+            return tuple(out)
+
+        return key
+
+    def _sort_rows(self, rows: Iterator[tuple]) -> Iterator[tuple]:
         """
-        sort_types = ["ascending", "descending"]
-        assert(self.sort_order in sort_types), "Sort order must be one of {}".format(sort_types)
+        Sorts rows by ``self.sort_keys``. The sort is stable.
 
+        - With ``self.limit``, keeps only the top ``limit`` rows in a heap.
+        - If all rows fit in ``self.sort_memory``, they are sorted in memory.
+        - Otherwise, each chunk of rows that fits in ``self.sort_memory``
+          is sorted and spilled to a temp file, and the chunks are merged
+          back together (an external merge sort).
+        """
         rev = True if self.sort_order == "descending" else False
+        key = self._sort_key_func(rev)
+
+        if self.limit is not None:
+            top_k = heapq.nlargest if rev else heapq.nsmallest
+            yield from top_k(self.limit, rows, key=key)
+            return
+
+        chunk, exhausted = self._take_chunk(rows)
+
+        if exhausted:
+            yield from sorted(chunk, key=key, reverse=rev)
+            return
+
+        with tempfile.TemporaryDirectory(prefix="json2rst-sort-") as tmpdir:
+            runs = list()
+
+            while chunk:
+                chunk.sort(key=key, reverse=rev)
+                runs.append(_spill_run(chunk, tmpdir, len(runs)))
+                chunk, _ = self._take_chunk(rows)
+
+            yield from heapq.merge(
+                *[_read_run(run) for run in runs],
+                key=key,
+                reverse=rev,
+            )
+
+    def _take_chunk(self, rows: Iterator[tuple]) -> Tuple[List[tuple], bool]:
+        """
+        Takes rows until their estimated size reaches ``self.sort_memory``.
+
+        Returns:
+            A tuple of (rows, whether ``rows`` ran out).
+        """
+        chunk = list()
+        size = 0
+
+        for row in rows:
+            chunk.append(row)
+            size += sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row)
+            if size >= self.sort_memory:
+                return (chunk, False)
+
+        return (chunk, True)
+
+class PivotTask(NamedTuple):
+    """What a worker process needs to project files, from :meth:`Pivot._iter_chunks`."""
+    fields: List[str] #: Headers to project.
+    explode: bool
+    strict: bool
+    aggregator: aggregate.Aggregator #: An empty aggregator, or ``None`` if not aggregating.
+
+_projections = dict() # type: Dict[Tuple[str, ...], paths.Projection]
+"""Compiled projections in a worker process, so headers are compiled once per worker."""
+
+def _pivot_chunk(task: PivotTask, files: List[str]) -> Tuple[Any, List[KeyReport], dict]:
+    """
+    Reads and projects a chunk of files. Runs inside a worker process.
+
+    Returns:
+        (projected rows, or a partial aggregate with ``task.aggregator``;
+        key reports; stats to merge in the parent, or ``None``).
+    """
+    fields = tuple(task.fields)
+    projection = _projections.get(fields)
+    if projection is None:
+        projection = _projections[fields] = paths.Projection(task.fields)
+
+    reports = list()
+    rows = _project(projection, task.explode, task.strict, _load_files(files), reports.append)
+
+    if task.aggregator is not None:
+        result = task.aggregator.empty()
+        for values in rows:
+            result.add(values)
+    else:
+        result = list(rows)
+
+    return (result, reports, stats.current.take() if stats.current is not None else None)
+
+def _load_files(files: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    for filepath in files:
+        yield (filepath, jsonbackend.load_file(filepath))
+
+def _project(
+    projection: paths.Projection,
+    explode: bool,
+    strict: bool,
+    pairs: Iterable[Tuple[str, Any]],
+    on_report: Callable[[KeyReport], None],
+    ) -> Iterator[tuple]:
+    """
+    Projects (filepath, JSON object) pairs into rows, and checks each
+    object against the pivot headers, once. Mismatches are passed to ``on_report``.
+
+    Extra keys (top-level keys that no header reads from) are
+    only looked for in strict mode, since they're only an error there.
+
+    Raises:
+        InvalidDocumentError: If an object isn't a JSON object.
+    """
+    roots = projection.roots
+    for filepath, obj in pairs:
+        if not isinstance(obj, dict):
+            raise InvalidDocumentError("{} must contain a JSON object.".format(filepath))
+
+        values, missing = projection(obj)
+
+        extra = list()
+        if strict:
+            exact = projection.plain and not missing and len(obj) == len(roots)
+            if not exact:
+                extra = [k for k in obj if k not in roots]
+
+        if missing or extra:
+            on_report(KeyReport(str(filepath), missing, extra))
+
+        if explode:
+            yield from projection.explode(values)
+        else:
+            yield values
+
+def _spill_run(rows: List[tuple], tmpdir: str, index: int) -> str:
+    """
+    Writes a sorted run of rows to a temp file.
+
+    Returns:
+        Path to the temp file.
+    """
+    path = os.path.join(tmpdir, "run-{}.pickle".format(index))
 
-        with open(filename, "r") as csvfile:
-            tmp = csv.DictReader(csvfile)
-            # sortedlist = sorted(spamreader, key=lambda row:(row['column_1'],row['column_2']), reverse=False)
-            sortedlist = sorted(tmp, key=operator.itemgetter(self.sort_key), reverse=rev)
+    with open(path, "wb") as f:
+        for row in rows:
+            pickle.dump(row, f, protocol=pickle.HIGHEST_PROTOCOL)
 
+    return path
 
-        with open(filename, 'w') as f:
-            writer = csv.DictWriter(f, fieldnames=self.header_list)
-            writer.writeheader()
-            for row in sortedlist:
-                writer.writerow(row)
+def _read_run(path: str) -> Iterator[tuple]:
+    """
+    Reads back a sorted run written by :func:`_spill_run`, one row at a time.
+    """
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,48 @@
+"""
+Reads input files into buffers with as few copies as possible.
+
+Large files are memory-mapped, so their contents are shared with
+the OS page cache instead of being copied into each process.
+Small files are read normally, because mapping them costs more
+than it saves.
+"""
+import mmap
+import os
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+MMAP_THRESHOLD = 1 << 20 #: Files of at least this many bytes are memory-mapped.
+
+Buffer = Union[bytes, memoryview]
+
+@contextmanager
+def open_buffer(filepath: str) -> Iterator[Buffer]:
+    """
+    Opens a file as a read-only buffer.
+
+    The file (and its memory map, if any) is closed when the
+    ``with`` block exits, so the buffer must not be used,
+    or kept, after that.
+
+    ..  code-block:: python
+
+        with reader.open_buffer("large.json") as buf:
+            data = jsonbackend.loads(buf)
+
+    Yields:
+        ``bytes`` for files smaller than :data:`MMAP_THRESHOLD`,
+        otherwise a ``memoryview`` of a memory map of the file.
+    """
+    with open(filepath, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if size < MMAP_THRESHOLD: #: Also covers empty files, which can't be mapped.
+            yield f.read()
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield view
+            finally:
+                view.release() #: The map can't close while a view of it is alive.
@@ -0,0 +1,173 @@
+"""
+Reads batch input files: files with many JSON records,
+each of which is rendered to its own rST file.
+
+Two formats are supported, and both are parsed incrementally,
+one record at a time, so the whole file is never held in memory:
+
+- JSON Lines (``.jsonl``): one JSON object per line.
+  Each line is parsed from raw bytes with :mod:`jsonbackend`.
+- A ``.json`` file whose top-level value is an array of objects.
+"""
+import re
+from pathlib import Path
+from typing import Any, Iterator, Set, Tuple
+
+from . import jsonbackend
+
+READ_CHUNK_SIZE = 1 << 20 #: Characters read at a time when parsing JSON arrays.
+
+_WHITESPACE = " \t\n\r"
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.-]+")
+
+def is_batch_file(filepath: str) -> bool:
+    """
+    Returns:
+        ``True`` for ``.jsonl`` files, and for ``.json`` files
+        whose top-level value is an array.
+    """
+    if Path(filepath).suffix == ".jsonl":
+        return True
+
+    with open(filepath, "rb") as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return False
+            stripped = chunk.lstrip(b" \t\n\r\xef\xbb\xbf") #: Also skips a UTF-8 BOM.
+            if stripped:
+                return stripped.startswith(b"[")
+
+def iter_records(filepath: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields (raw JSON bytes, parsed record) for each record in a batch file.
+    """
+    if Path(filepath).suffix == ".jsonl":
+        return iter_jsonl(filepath)
+
+    return iter_json_array(filepath)
+
+def iter_jsonl(filepath: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields (raw JSON bytes, parsed record) for each non-blank line of a JSON Lines file.
+    """
+    with open(filepath, "rb") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if lineno == 1 and line.startswith(b"\xef\xbb\xbf"): #: UTF-8 BOM
+                line = line[3:]
+            if not line:
+                continue
+            try:
+                yield (line, jsonbackend.loads(line))
+            except ValueError as e:
+                raise ValueError("{}:{}: {}".format(filepath, lineno, e)) from None
+
+def iter_json_array(filepath: str) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields (raw JSON bytes, parsed element) for each element of a top-level JSON array.
+
+    The file is read in chunks of :data:`READ_CHUNK_SIZE`, and each element
+    is decoded with ``json.JSONDecoder.raw_decode`` as soon as it is complete.
+    While an element is incomplete, each read is as large as the part of it
+    read so far, so a large element is only re-decoded a few times,
+    and costs time linear in its size.
+    """
+    import json
+
+    decoder = json.JSONDecoder()
+
+    with open(filepath, encoding="utf-8-sig") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill(size: int = READ_CHUNK_SIZE) -> bool:
+            """Reads the next chunk into ``buf``. Returns ``False`` at EOF."""
+            nonlocal buf, pos, eof
+            chunk = f.read(size)
+            if not chunk:
+                eof = True
+                return False
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_whitespace() -> str:
+            """Skips whitespace. Returns the next character, or "" at EOF."""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _WHITESPACE:
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    return ""
+
+        if skip_whitespace() != "[":
+            raise ValueError("{}: expected a JSON array".format(filepath))
+        pos += 1
+
+        if skip_whitespace() == "]":
+            return
+
+        while True:
+            skip_whitespace()
+
+            while True:
+                try:
+                    obj, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    obj, end = None, None
+
+                #: A value that runs to the end of the buffer might be cut off
+                #: (e.g. a number), so only trust it once something follows it.
+                if end is not None and (end < len(buf) or eof):
+                    break
+
+                if not fill(max(READ_CHUNK_SIZE, len(buf) - pos)):
+                    if end is not None:
+                        break
+                    raise ValueError("{}: invalid or truncated JSON array element at offset {}".format(filepath, pos))
+
+            yield (buf[pos:end].encode("utf-8"), obj)
+            pos = end
+
+            sep = skip_whitespace()
+            if sep == ",":
+                pos += 1
+            elif sep == "]":
+                return
+            else:
+                raise ValueError("{}: expected ',' or ']' in JSON array, got {!r}".format(filepath, sep))
+
+def record_name(record: Any, name_key: str, default: str, used: Set[str] = None) -> str:
+    """
+    Picks the output file name (without extension) for a record.
+
+    Args:
+        record (Any): Parsed JSON record.
+        name_key (str): Key whose value names the file, e.g. ``ID``.
+        default (str): Name to use if the record doesn't have ``name_key``.
+        used (Set[str]): Names already taken. A taken name gets a numbered suffix.
+            The chosen name is added to ``used``.
+
+    Returns:
+        A file name, safe to use on any filesystem.
+    """
+    name = None
+    if name_key and isinstance(record, dict) and record.get(name_key) not in (None, ""):
+        name = _UNSAFE_FILENAME_CHARS.sub("_", str(record[name_key])).strip("._")
+
+    name = name if name else default
+
+    if used is not None:
+        candidate = name
+        n = 1
+        while candidate in used:
+            n += 1
+            candidate = "{}-{}".format(name, n)
+        name = candidate
+        used.add(name)
+
+    return name
@@ -0,0 +1,269 @@
+"""
+Sharded output, for very large corpora (``--shard-size`` and ``--shard-kb``).
+
+Instead of one rST file per record, records are packed into shards:
+rST files holding up to ``--shard-size`` records, or up to ``--shard-kb``
+kilobytes of rST, whichever comes first. Each record is a section with
+a label, so it can be linked to with ``:ref:``. An index page lists
+every shard in a ``toctree``:
+
+..  code-block::
+
+    _output/
+        export.rst                  <- index page, with a toctree of the shards
+        export.shard-00001.rst      <- first shard: records 1 to N
+        export.shard-00002.rst
+        ...
+        .json2rst-shards.json       <- the shards each index page had last time
+
+Sphinx pays a fixed cost per document, so a few hundred shards build
+much faster than 100,000 single-record pages.
+
+Each shard is rendered into memory, and written with one write call,
+through an :class:`utils.AtomicWriter`: a shard whose content didn't change
+keeps its mtime, so Sphinx doesn't re-read it.
+
+Shard names (``<name>.shard-NNNNN``) don't clash with the pages of a
+non-sharded build (``<name>-NNNNN``). Only shards recorded in
+:data:`SHARD_MANIFEST_NAME` by a previous build are ever removed.
+"""
+import io
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+from . import __version__
+from . import images
+from . import jsonbackend
+from . import manifest
+from . import records
+from . import stats
+from . import utils
+
+_LABEL_CHARS = re.compile(r"[^\w.-]+")
+
+SHARD_MANIFEST_NAME = manifest.SHARD_MANIFEST_NAME #: Index page name -> its shards, from the last build.
+
+class ShardItem(NamedTuple):
+    """A record to render into a shard."""
+    srcfile: str
+    title: str #: Record name. ``None`` for a JSON file, which is named once it's parsed.
+    data: Any #: Parsed record. ``None`` for a JSON file, which is parsed when it's rendered.
+
+class RenderTask(NamedTuple):
+    """What a worker process needs to render records."""
+    image_handler: images.ImageHandler
+    outfile: str #: A path in the output directory, for relative image paths.
+    name_key: str
+
+def iter_items(files: Iterable[Path], name_key: str, errors: List[str]) -> Iterator[ShardItem]:
+    """
+    Yields an item for each JSON file, and for each record
+    in each batch file (``.jsonl`` files and JSON arrays).
+    Batch files that fail to parse are added to ``errors``.
+    """
+    for thisfile in files:
+        srcfile = str(thisfile)
+
+        try:
+            is_batch = records.is_batch_file(srcfile)
+        except OSError as e:
+            errors.append("{}: {}".format(srcfile, e))
+            continue
+
+        if not is_batch:
+            yield ShardItem(srcfile, None, None)
+            continue
+
+        stem = Path(srcfile).stem
+        used_names = set()
+
+        try:
+            for index, (_, record) in enumerate(records.iter_records(srcfile)):
+                name = records.record_name(record, name_key, "{}-{:05d}".format(stem, index), used_names)
+                yield ShardItem(srcfile, name, record)
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+
+def render_item(task: RenderTask, item: ShardItem) -> Tuple[str, str, str]:
+    """
+    Renders a record as a section.
+
+    Returns:
+        (title, rST section, error message).
+        The error message is ``None`` if rendering succeeded.
+    """
+    srcfile, title, data = item
+
+    try:
+        if data is None:
+            data = jsonbackend.load_file(srcfile)
+            title = records.record_name(data, task.name_key, Path(srcfile).stem)
+
+        out = io.StringIO()
+        with stats.stage("render"):
+            utils.write_section(out, srcfile, data, title, task.image_handler, task.outfile)
+    except Exception as e:
+        return (title if title else srcfile, None, "{}: {}".format(type(e).__name__, e))
+
+    return (title, out.getvalue(), None)
+
+def render_chunk(task: RenderTask, items: List[ShardItem]) -> Tuple[List[Tuple[str, str, str]], dict]:
+    """
+    Renders a chunk of records. Runs inside a worker process.
+
+    Returns:
+        The results of :func:`render_item`, and the stats collected
+        (``None`` unless ``--stats`` is on), to merge in the parent process.
+    """
+    results = [render_item(task, item) for item in items]
+    return (results, stats.current.take() if stats.current is not None else None)
+
+class ShardWriter:
+    def __init__(self, outdir: Path, name: str, max_records: int = None, max_bytes: int = None) -> None:
+        """
+        Packs rendered sections into shards, and writes an index page.
+
+        Args:
+            outdir (Path): Output directory.
+            name (str): Name of the index page. Shards are named
+                ``<name>.shard-00001.rst``, ``<name>.shard-00002.rst``, etc.
+            max_records (int): Maximum records per shard.
+            max_bytes (int): Maximum size of a shard, in bytes of rST.
+                A record larger than this gets a shard to itself.
+        """
+        self.outdir = Path(outdir)
+        self.name = name
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.shards = list() # type: List[str]
+        self.written = 0 #: Number of shards that changed.
+        self._labels = set() # type: Set[str]
+        self._parts = list() # type: List[str]
+        self._titles = list() # type: List[str]
+        self._size = 0
+
+    @property
+    def index_path(self) -> Path:
+        return self.outdir.joinpath(self.name + ".rst")
+
+    def add(self, title: str, section: str) -> str:
+        """
+        Adds a rendered section to the current shard, starting
+        a new shard first if the current one is full.
+
+        Returns:
+            The section's label, for ``:ref:``.
+        """
+        label = self._label(title)
+        text = ".. _{}:\n\n{}".format(label, section)
+        size = len(text.encode("utf-8"))
+
+        if self._titles and (
+            (self.max_records and len(self._titles) >= self.max_records)
+            or (self.max_bytes and self._size + size > self.max_bytes)
+            ):
+            self._flush()
+
+        self._parts.append(text)
+        self._titles.append(title)
+        self._size += size
+        return label
+
+    def close(self) -> None:
+        """
+        Writes the last shard and the index page, and removes shards
+        that the previous build of this index wrote, but this one didn't.
+        """
+        if self._titles:
+            self._flush()
+
+        lines = [
+            self.name,
+            "*" * (len(self.name) + 2),
+            "",
+            "..  toctree::",
+            "    :maxdepth: 1",
+            "",
+        ]
+        lines.extend("    " + shard for shard in self.shards)
+        self._write(self.index_path, "\n".join(lines) + "\n")
+
+        previous = _load_shard_manifest(self.outdir)
+        current = set(self.shards)
+        for shard in previous.get(self.name, list()):
+            path = self.outdir.joinpath(shard + ".rst")
+            if shard not in current and path.is_file():
+                os.remove(str(path))
+
+        previous[self.name] = self.shards
+        _save_shard_manifest(self.outdir, previous)
+
+    def _flush(self) -> None:
+        shard = "{}.shard-{:05d}".format(self.name, len(self.shards) + 1)
+        first, last = self._titles[0], self._titles[-1]
+        title = first if len(self._titles) == 1 else "{} – {}".format(first, last)
+
+        self._parts.insert(0, "{}\n{}\n\n".format(title, "*" * (len(title) + 2)))
+        self._write(self.outdir.joinpath(shard + ".rst"), "".join(self._parts))
+
+        if stats.current is not None:
+            stats.current.count("shards.records", len(self._titles))
+
+        self.shards.append(shard)
+        self._parts = list()
+        self._titles = list()
+        self._size = 0
+
+    def _write(self, path: Path, text: str) -> None:
+        writer = utils.AtomicWriter(path)
+        with writer as f:
+            f.write(text)
+
+        if writer.changed:
+            self.written += 1
+
+    def _label(self, title: str) -> str:
+        """
+        Returns:
+            A unique label for a section. Sphinx labels are case-insensitive,
+            so labels are lowercased before they're compared.
+        """
+        label = _LABEL_CHARS.sub("-", title).strip("-").lower() or "record"
+        candidate = label
+        n = 1
+        while candidate in self._labels:
+            n += 1
+            candidate = "{}-{}".format(label, n)
+        self._labels.add(candidate)
+        return candidate
+
+def _load_shard_manifest(outdir: Path) -> Dict[str, List[str]]:
+    """
+    Returns:
+        Index page name -> names of its shards, as of the last build.
+        Empty if there's no shard manifest, or it's unreadable or outdated.
+    """
+    import json
+
+    try:
+        with open(str(outdir.joinpath(SHARD_MANIFEST_NAME))) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+    if not isinstance(data, dict) or data.get("version") != __version__:
+        return dict()
+    return data.get("indexes", dict())
+
+def _save_shard_manifest(outdir: Path, indexes: Dict[str, List[str]]) -> None:
+    import json
+
+    path = outdir.joinpath(SHARD_MANIFEST_NAME)
+    tmp = path.with_name(path.name + ".tmp")
+
+    with open(str(tmp), "w") as f:
+        json.dump({"version": __version__, "indexes": indexes}, f, indent=2, sort_keys=True)
+
+    os.replace(str(tmp), str(path))
@@ -0,0 +1,246 @@
+"""
+Timing and counters for ``--stats`` and ``--profile``.
+
+Collection is off by default. While it's off, :data:`current` is ``None``,
+and instrumented code pays for one attribute check per call site:
+
+..  code-block:: python
+
+    with stats.stage("parse"):
+        data = jsonbackend.loads(raw)
+
+    if stats.current is not None:
+        stats.current.count("bytes_read", len(raw))
+
+Stage times are exclusive: time spent in a nested stage
+(e.g. ``images`` inside ``render``) only counts towards the inner stage,
+so stage times add up to the time spent in instrumented code.
+CPU time is per thread, so it stays accurate with ``--pipeline``.
+
+Worker processes collect their own stats, which are merged
+into the parent's with :meth:`Stats.take` and :meth:`Stats.merge`.
+"""
+import collections
+import heapq
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+SLOWEST = 10 #: Number of slowest files to report.
+
+_thread_time = getattr(time, "thread_time", time.process_time) #: thread_time is Python 3.7+.
+
+class Stats:
+    def __init__(self, slowest: int = SLOWEST) -> None:
+        """
+        Args:
+            slowest (int): Number of slowest files to keep.
+        """
+        self.slowest_n = slowest
+        self.wall = collections.Counter() # type: Dict[str, float]
+        self.cpu = collections.Counter() # type: Dict[str, float]
+        self.calls = collections.Counter() # type: Dict[str, int]
+        self.counters = collections.Counter() # type: Dict[str, int]
+        #: Min-heap of (seconds, file) of the slowest files so far.
+        self.slowest = list() # type: List[Tuple[float, str]]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times the ``with`` block as part of stage ``name``."""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = list()
+
+        children = [0.0, 0.0] #: Wall and CPU time of nested stages.
+        stack.append(children)
+        wall = time.perf_counter()
+        cpu = _thread_time()
+
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = _thread_time() - cpu
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+
+            with self._lock:
+                self.wall[name] += wall - children[0]
+                self.cpu[name] += cpu - children[1]
+                self.calls[name] += 1
+
+    def timed_iter(self, name: str, iterable: Iterable) -> Iterator:
+        """Yields from ``iterable``, timing each step as part of stage ``name``."""
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(it, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def add_counts(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            self.counters.update(counts)
+
+    def file(self, key: str, seconds: float) -> None:
+        """Records how long one file (or record) took to convert."""
+        with self._lock:
+            if len(self.slowest) < self.slowest_n:
+                heapq.heappush(self.slowest, (seconds, key))
+            elif self.slowest and seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, key))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {
+                    name: {"wall": self.wall[name], "cpu": self.cpu[name], "calls": self.calls[name]}
+                    for name in sorted(self.wall, key=self.wall.get, reverse=True)
+                },
+                "counters": dict(sorted(self.counters.items())),
+                "slowest": [[key, seconds] for seconds, key in sorted(self.slowest, reverse=True)],
+            }
+
+    def take(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Stats collected so far, as with :meth:`to_dict`, and starts over.
+            Used by worker processes to send their stats to the parent.
+        """
+        data = self.to_dict()
+        with self._lock:
+            self.wall.clear()
+            self.cpu.clear()
+            self.calls.clear()
+            self.counters.clear()
+            self.slowest.clear()
+        return data
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """Adds stats from :meth:`to_dict` or :meth:`take`, e.g. from a worker process."""
+        with self._lock:
+            for name, stage in data["stages"].items():
+                self.wall[name] += stage["wall"]
+                self.cpu[name] += stage["cpu"]
+                self.calls[name] += stage["calls"]
+            self.counters.update(data["counters"])
+
+        for key, seconds in data["slowest"]:
+            self.file(key, seconds)
+
+    def summary(self, total: float = None) -> str:
+        """
+        Returns:
+            A plain-text table of stage times, counters, and the slowest files.
+        """
+        data = self.to_dict()
+        lines = ["{:<12} {:>10} {:>10} {:>10}".format("stage", "wall (s)", "cpu (s)", "calls")]
+
+        for name, stage in data["stages"].items():
+            lines.append("{:<12} {:>10.3f} {:>10.3f} {:>10}".format(name, stage["wall"], stage["cpu"], stage["calls"]))
+        if total is not None:
+            lines.append("{:<12} {:>10.3f}".format("total", total))
+
+        if data["counters"]:
+            lines.append("")
+            for name, value in data["counters"].items():
+                lines.append("{:<24} {:>12}".format(name, value))
+
+        if data["slowest"]:
+            lines.append("")
+            lines.append("Slowest files:")
+            for key, seconds in data["slowest"]:
+                lines.append("{:>10.3f} s  {}".format(seconds, key))
+
+        return "\n".join(lines)
+
+_DONE = object()
+
+current = None # type: Stats
+"""The active collector, or ``None`` while collection is off."""
+
+class _NullStage:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name: str):
+    """
+    Same as ``current.stage(name)``, or a no-op context manager
+    while collection is off.
+    """
+    if current is None:
+        return _NULL_STAGE
+    return current.stage(name)
+
+def enable(slowest: int = SLOWEST) -> Stats:
+    """Starts collecting stats in this process."""
+    global current
+    current = Stats(slowest)
+    return current
+
+def disable() -> None:
+    global current
+    current = None
+
+@contextmanager
+def collect(
+    show: bool = False,
+    json_file: str = None,
+    profile_file: str = None,
+    slowest: int = SLOWEST,
+    ) -> Iterator[None]:
+    """
+    Collects stats for the ``with`` block, and reports them
+    when the block exits, even if it exits with an error or ``sys.exit()``.
+    Does nothing if all options are off.
+
+    Args:
+        show (bool): Print a summary to stderr.
+        json_file (str): Write the stats to this JSON file.
+        profile_file (str): Run the block under cProfile, and dump
+            the profile to this file. Read it with ``python -m pstats``.
+        slowest (int): Number of slowest files to report.
+    """
+    if not (show or json_file or profile_file):
+        yield
+        return
+
+    import cProfile
+    import json
+
+    collector = enable(slowest) if show or json_file else None
+    profiler = cProfile.Profile() if profile_file else None
+    start = time.perf_counter()
+
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+        total = time.perf_counter() - start
+        disable()
+
+        if collector and show:
+            print(collector.summary(total), file=sys.stderr)
+        if collector and json_file:
+            with open(json_file, "w") as f:
+                json.dump(dict(collector.to_dict(), total=total), f, indent=2)
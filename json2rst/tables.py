@@ -0,0 +1,329 @@
+"""
+Column batches and table writers for pivot output.
+
+A pivot is written as a stream of :class:`ColumnBatch` es: rows,
+stored column by column. Each output format has a writer,
+registered in :data:`TABLE_WRITERS`:
+
+- ``csv``: a CSV file.
+- ``csv-table``: an rST ``csv-table`` directive.
+- ``list-table``: an rST ``list-table`` directive.
+- ``parquet``: an Apache Parquet file, zstd-compressed. Needs ``pyarrow``.
+- ``arrow``: an Arrow IPC file, zstd-compressed. Needs ``pyarrow``.
+
+Parquet and Arrow columns are typed from every value in the column:
+``bool``, ``int64``, ``double`` (ints and floats), or ``string``
+(anything else, or a mix of types that don't widen to a number).
+
+Like parsers in :mod:`jsonbackend`, optional libraries (and modules only
+some writers need, like ``pickle``) are only imported when a writer
+is opened, so importing json2rst stays cheap.
+"""
+import io
+from typing import Any, Dict, Iterator, List, Sequence, Type
+
+from . import nodes
+from . import utils
+
+class ColumnBatch:
+    """
+    Rows of a table, stored column by column.
+    Missing values are ``None``.
+    """
+    __slots__ = ("headers", "columns")
+
+    def __init__(self, headers: List[str], columns: List[list]) -> None:
+        self.headers = headers
+        self.columns = columns
+
+    @classmethod
+    def from_rows(cls, headers: List[str], rows: List[Sequence[Any]]) -> "ColumnBatch":
+        """
+        Args:
+            rows (List[Sequence[Any]]): One value per header in each row.
+        """
+        columns = [list(column) for column in zip(*rows)] if rows else [list() for _ in headers]
+        return cls(headers, columns)
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self.columns)
+
+class TableWriter:
+    """
+    Writes column batches to a file. Use as a context manager:
+
+    ..  code-block:: python
+
+        with TABLE_WRITERS["csv"]("pivot.csv", headers) as writer:
+            for batch in batches:
+                writer.write(batch)
+    """
+    suffix = "" #: Default file name suffix.
+
+    def __init__(self, path: str, headers: List[str]) -> None:
+        self.path = path
+        self.headers = headers
+
+    def write(self, batch: ColumnBatch) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.close()
+        return False
+
+TABLE_WRITERS = dict() # type: Dict[str, Type[TableWriter]]
+"""Registry of pivot output formats and their writers.
+Use :func:`register_writer` to add formats."""
+
+def register_writer(fmt: str, writer: Type[TableWriter] = None):
+    """
+    Registers a :class:`TableWriter` for an output format (``--format``),
+    replacing any existing one. Can be used as a class decorator.
+    """
+    if writer is None:
+        return lambda cls: register_writer(fmt, cls)
+
+    TABLE_WRITERS[fmt] = writer
+    return writer
+
+FORMATS = ["csv", "csv-table", "list-table", "parquet", "arrow"] #: Built-in formats, for ``--format``.
+
+def _text(val: Any) -> str:
+    return "" if val is None else str(val)
+
+@register_writer("csv")
+class CsvWriter(TableWriter):
+    suffix = ".csv"
+
+    def __init__(self, path: str, headers: List[str]) -> None:
+        import csv
+
+        super().__init__(path, headers)
+        self.f = open(path, "w", newline="")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(headers)
+
+    def write(self, batch: ColumnBatch) -> None:
+        self.writer.writerows(batch.rows()) #: csv writes None as an empty field.
+
+    def close(self) -> None:
+        self.f.close()
+
+@register_writer("csv-table")
+class CsvTableWriter(TableWriter):
+    """
+    Writes an rST ``csv-table``. Rows are written as indented CSV,
+    so values with commas, quotes, or newlines survive.
+    """
+    suffix = ".rst"
+
+    def __init__(self, path: str, headers: List[str]) -> None:
+        import csv
+
+        super().__init__(path, headers)
+        self.f = open(path, "w", encoding="utf-8")
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator="\n")
+        self.f.write("..  csv-table::\n" + nodes.Nodes.ATTR_HEADERROWS.value + "\n")
+        self._write_rows([headers])
+
+    def write(self, batch: ColumnBatch) -> None:
+        self._write_rows(batch.rows())
+
+    def _write_rows(self, rows) -> None:
+        self.writer.writerows(rows)
+        for line in self.buf.getvalue().splitlines(True):
+            self.f.write("    " + line if line.strip() else line)
+        self.buf.seek(0)
+        self.buf.truncate()
+
+    def close(self) -> None:
+        self.f.close()
+
+@register_writer("list-table")
+class ListTableWriter(TableWriter):
+    """Writes an rST ``list-table``, laid out like the tables on converted pages."""
+    suffix = ".rst"
+
+    def __init__(self, path: str, headers: List[str]) -> None:
+        super().__init__(path, headers)
+        self.f = open(path, "w", encoding="utf-8")
+        self.f.write(nodes.Nodes.TABLE_INIT.value + nodes.Nodes.ATTR_HEADERROWS.value + "\n")
+        self._write_row(headers)
+
+    def write(self, batch: ColumnBatch) -> None:
+        for row in batch.rows():
+            self._write_row(row)
+
+    def _write_row(self, row: Sequence[Any]) -> None:
+        out = list()
+        for index, val in enumerate(row):
+            prefix = nodes.Nodes.STUB_ITEM.value if index == 0 else nodes.Nodes.ITEM.value
+            text = utils.handle_newlines(_text(val))
+            out.append((prefix + text if text else prefix.rstrip()) + "\n")
+        out.append("\n")
+        self.f.write("".join(out))
+
+    def close(self) -> None:
+        self.f.close()
+
+def _import_pyarrow(fmt: str):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("--format {} needs pyarrow. Install it with: pip install pyarrow".format(fmt)) from None
+    return pyarrow
+
+_INT64_MIN = -(1 << 63)
+_INT64_MAX = (1 << 63) - 1
+
+def _kind(val: Any) -> str:
+    """
+    Returns:
+        The Arrow column kind a value needs: ``None`` (no value),
+        ``"bool"``, ``"int"``, ``"float"``, or ``"string"``.
+    """
+    if val is None:
+        return None
+    if isinstance(val, bool):
+        return "bool"
+    if isinstance(val, int):
+        return "int" if _INT64_MIN <= val <= _INT64_MAX else "string"
+    if isinstance(val, float):
+        return "float"
+    return "string"
+
+def _widen(a: str, b: str) -> str:
+    """Returns the narrowest kind that holds values of kind ``a`` and kind ``b``."""
+    if a is None or a == b:
+        return b
+    if b is None:
+        return a
+    if {a, b} == {"int", "float"}:
+        return "float"
+    return "string"
+
+class _ArrowWriter(TableWriter):
+    """
+    Base class for writers that convert column batches to Arrow record batches.
+
+    A file's schema can't change once it's opened, and a column's type
+    depends on all of its values. So batches are spilled to a temp file
+    as they arrive, while each column's type is widened to fit them
+    (``int`` to ``double`` to ``string``). The file is written on :meth:`close`.
+    """
+    fmt = None
+
+    def __init__(self, path: str, headers: List[str]) -> None:
+        import pickle
+        import tempfile
+
+        super().__init__(path, headers)
+        self.pa = _import_pyarrow(self.fmt)
+        self.pickle = pickle
+        self.kinds = [None] * len(headers) #: Widened kind of each column so far.
+        self.spill = tempfile.TemporaryFile(prefix="json2rst-arrow-")
+        self.sink = None
+        self.file = None #: File the sink writes to, if the writer opened one itself.
+
+    def write(self, batch: ColumnBatch) -> None:
+        for index, column in enumerate(batch.columns):
+            kind = self.kinds[index]
+            if kind == "string":
+                continue
+            for val in column:
+                kind = _widen(kind, _kind(val))
+            self.kinds[index] = kind
+
+        self.pickle.dump(batch.columns, self.spill, protocol=self.pickle.HIGHEST_PROTOCOL)
+
+    def _types(self) -> list:
+        pa = self.pa
+        types = {"bool": pa.bool_(), "int": pa.int64(), "float": pa.float64()}
+        return [types.get(kind, pa.string()) for kind in self.kinds] #: Columns with no values are strings.
+
+    def _array(self, values: list, typ: Any):
+        pa = self.pa
+        if pa.types.is_floating(typ):
+            values = [None if val is None else float(val) for val in values]
+        elif pa.types.is_string(typ):
+            values = [None if val is None else str(val) for val in values]
+        return pa.array(values, type=typ)
+
+    def close(self) -> None:
+        pa = self.pa
+        types = self._types()
+        schema = pa.schema([pa.field(name, typ) for name, typ in zip(self.headers, types)])
+
+        try:
+            self.sink = self._open(schema)
+            self.spill.seek(0)
+            written = False
+            while True:
+                try:
+                    columns = self.pickle.load(self.spill)
+                except EOFError:
+                    break
+                arrays = [self._array(column, typ) for column, typ in zip(columns, types)]
+                self._write(pa.RecordBatch.from_arrays(arrays, schema=schema))
+                written = True
+
+            if not written: #: No rows. Still write a valid, empty file.
+                arrays = [self._array(list(), typ) for typ in types]
+                self._write(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        finally:
+            self._release()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        if exc_type is None:
+            self.close()
+        else:
+            self._release() #: Don't write a file from a failed pivot.
+        return False
+
+    def _release(self) -> None:
+        """Closes the sink and its file, and deletes the spill file."""
+        try:
+            self.spill.close()
+            if self.sink is not None:
+                self.sink.close()
+        finally:
+            if self.file is not None:
+                self.file.close()
+
+@register_writer("parquet")
+class ParquetWriter(_ArrowWriter):
+    suffix = ".parquet"
+    fmt = "parquet"
+
+    def _open(self, schema):
+        import pyarrow.parquet
+
+        return pyarrow.parquet.ParquetWriter(self.path, schema, compression="zstd")
+
+    def _write(self, record_batch) -> None:
+        self.sink.write_table(self.pa.Table.from_batches([record_batch]))
+
+@register_writer("arrow")
+class ArrowWriter(_ArrowWriter):
+    suffix = ".arrow"
+    fmt = "arrow"
+
+    def _open(self, schema):
+        import pyarrow.ipc
+
+        options = pyarrow.ipc.IpcWriteOptions(compression="zstd")
+        self.file = self.pa.OSFile(self.path, "wb")
+        return pyarrow.ipc.new_file(self.file, schema, options=options)
+
+    def _write(self, record_batch) -> None:
+        self.sink.write_batch(record_batch)
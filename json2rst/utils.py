@@ -1,8 +1,19 @@
-import json
+import collections
+import filecmp
+import fnmatch
+import io
+import os
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import Any, Iterator, List, Dict, Set, TextIO, Tuple
 
+from . import images
+from . import jsonbackend
+from . import manifest
 from . import nodes
+from . import reader
+from . import records
+from . import stats
+from .errors import InvalidDocumentError, InvalidNodeError
 
 def handle_rich_content(srcfile: str, rich_content: List[Dict[str, str]]) -> str:
     """
@@ -10,42 +21,85 @@ def handle_rich_content(srcfile: str, rich_content: List[Dict[str, str]]) -> str
         rich_content (List[Dict[str, str]]): Expects a string like "[{"key":"value"}]
         srcfile (str): Name of file where the data comes from, for naming an offending file when data validation fails.
     """
+    out = io.StringIO()
+    write_rich_content(out, srcfile, rich_content)
+    return out.getvalue()
+
+def write_rich_content(
+    out: TextIO,
+    srcfile: str,
+    rich_content: List[Dict[str, str]],
+    image_handler: images.ImageHandler = None,
+    outfile: str = None,
+    ) -> None:
+    """
+    Same as :func:`handle_rich_content`, but writes the output to ``out``
+    one node at a time, instead of building up a string.
+
+    Args:
+        out (TextIO): Writable text stream, e.g. an open file or ``io.StringIO``.
+        image_handler (images.ImageHandler): Decides how ``image`` nodes are written.
+        outfile (str): rST file that ``out`` is written to, if any.
+    """
     if not isinstance(rich_content, list):
-        # TODO: handle exception
-        exit(1)
+        raise InvalidNodeError("{}: rich content must be a list of nodes.".format(srcfile))
 
-    output = ""
     prev_key = ""
-    next_key = ""
-
-    for i in range(len(rich_content)):
-        first = (i == 0) # type: bool
-        line = rich_content[i]
-        assert(isinstance(line, dict))
-
-        keys = line.keys()
-        assert(len(keys) == 1) #: Given the data structure, we expect only one key
+    lines = iter(rich_content)
+    line = next(lines, None)
+    key = _rich_node_key(srcfile, line) if line is not None else ""
+    first = True
+    counts = collections.Counter() if stats.current is not None else None
 
-        key = list(keys)[0] #: We have to cast type of keys from dict_keys to list
-        assert(isinstance(key, str))
+    while line is not None:
+        next_line = next(lines, None)
+        next_key = _rich_node_key(srcfile, next_line) if next_line is not None else ""
 
-        if i < len(rich_content)-1:
-            next_key = list(rich_content[i+1].keys())[0]
+        if counts is not None:
+            counts["nodes." + key] += 1
 
-        output = output + nodes.RichNode(
+        out.write(nodes.RichNode(
             srcfile,
             key,
             line.get(key),
             first,
             prev_key,
             next_key,
-            ).parse()
+            image_handler,
+            outfile,
+            ).parse())
 
-        prev_key = key
+        prev_key, key, line = key, next_key, next_line
+        first = False
+
+    if counts is not None:
+        stats.current.add_counts(counts)
+
+def is_rich_content(val: Any) -> bool:
+    """
+    Returns:
+        ``True`` if ``val`` is a non-empty list of rich content nodes: JSON objects
+        with exactly one key, which is a node type in ``nodes.NODE_RENDERERS``.
+        Other lists (e.g. ``["a", "b"]``) are plain values.
+    """
+    return isinstance(val, list) and bool(val) and all(
+        isinstance(line, dict) and len(line) == 1 and next(iter(line)) in nodes.NODE_RENDERERS
+        for line in val
+    )
 
+def _rich_node_key(srcfile: str, line: Dict[str, str]) -> str:
+    """
+    Returns:
+        The only key in a rich content line, e.g. ``"ul"`` for ``{"ul": "item"}``.
 
-    return output
+    Raises:
+        InvalidNodeError: If ``line`` isn't a JSON object with exactly one key.
+    """
+    if not isinstance(line, dict) or len(line) != 1: #: Given the data structure, we expect only one key
+        raise InvalidNodeError('{}: rich content nodes must look like {{"type": "content"}}, not {!r}'.format(srcfile, line))
 
+    for key in line:
+        return key
 
 def render_page(srcfile: str, json_data: str) -> str:
     """
@@ -57,59 +111,145 @@ def render_page(srcfile: str, json_data: str) -> str:
         json_data (str): Expects a JSON string.
     """
 
+    return render_data(srcfile, jsonbackend.loads(json_data))
+
+def render_data(srcfile: str, data: Any) -> str:
+    """
+    Same as :func:`render_page`, but takes an already-parsed JSON document.
+
+    Args:
+        srcfile (str): Path to the JSON file the data came from.
+        data (Any): The parsed JSON document.
+    """
+    out = io.StringIO()
+    write_page(out, srcfile, data)
+    return out.getvalue()
+
+def write_page(
+    out: TextIO,
+    srcfile: str,
+    data: Any,
+    image_handler: images.ImageHandler = None,
+    outfile: str = None,
+    title: str = None,
+    ) -> None:
+    """
+    Renders a parsed JSON document as an rST page, and writes it to ``out``
+    piece by piece. When ``out`` is an open file, the page is streamed
+    to disk without ever holding the whole page in memory.
+
+    Args:
+        out (TextIO): Writable text stream.
+        srcfile (str): Path to the JSON file the data came from.
+        data (Any): The parsed JSON document. A JSON object is written as one
+            table. A list of JSON objects is written as one table per object.
+        image_handler (images.ImageHandler): Decides how ``image`` nodes are written.
+            Defaults to embedding images as base64.
+        outfile (str): rST file that ``out`` is written to, if any.
+            Used to build relative image paths.
+        title (str): Page title. Defaults to the name of ``srcfile``.
+    """
+    title = title if title else Path(srcfile).stem #: TODO: Use filename as page title for now. To implement something a bit more sophisticated later.
+
     page_title = "{}\n{}\n\n".format(
-        Path(srcfile).stem, #: TODO: Use filename as page title for now. To implement something a bit more sophisticated later.
-        "*" * (len(Path(srcfile).stem) + 2), #: Makes sure that rST heading marker is always longer than page title.
+        title,
+        "*" * (len(title) + 2), #: Makes sure that rST heading marker is always longer than page title.
     )
 
-
+    out.write(page_title)
+    _write_tables(out, srcfile, data, image_handler, outfile)
+
+def write_section(
+    out: TextIO,
+    srcfile: str,
+    data: Any,
+    title: str,
+    image_handler: images.ImageHandler = None,
+    outfile: str = None,
+    ) -> None:
+    """
+    Same as :func:`write_page`, but writes the document as a section
+    (with a ``=`` underline), to go below a page title. Used for
+    records packed into shards (see :mod:`shards`).
+    """
+    out.write("{}\n{}\n\n".format(title, "=" * (len(title) + 2)))
+    _write_tables(out, srcfile, data, image_handler, outfile)
+
+def _write_tables(
+    out: TextIO,
+    srcfile: str,
+    data: Any,
+    image_handler: images.ImageHandler = None,
+    outfile: str = None,
+    ) -> None:
+    for obj in (data if isinstance(data, list) else [data]):
+        if not isinstance(obj, dict):
+            raise InvalidDocumentError("{}: expected a JSON object, or a list of JSON objects".format(srcfile))
+        write_table(out, srcfile, obj, image_handler, outfile)
+
+def write_table(
+    out: TextIO,
+    srcfile: str,
+    data: Dict[str, Any],
+    image_handler: images.ImageHandler = None,
+    outfile: str = None,
+    ) -> None:
+    """
+    Writes a JSON object to ``out`` as an rST ``list-table``.
+    See :func:`write_page` for arguments.
+    """
     table_head = f"{nodes.Nodes.TABLE_INIT.value}" \
         f"{nodes.Nodes.ATTR_STUBCOLS.value}" \
         "\n"
 
-    output = page_title + table_head
+    out.write(table_head)
 
-    data = json.loads(json_data)
-
-    if isinstance(data, list):
-        # TODO: to handle JSON strings wrapped in a list. e.g. ``[{"key": "value"}]``
-        pass
-
-    if isinstance(data, dict):
-        keys = data.keys()
+    for k in data:
+        out.write("{}{}\n".format(nodes.Nodes.STUB_ITEM.value,k))
+        out.write(nodes.Nodes.ITEM.value)
 
+        val = data.get(k)
 
-    for k in keys:
-        title = "{}{}\n".format(nodes.Nodes.STUB_ITEM.value,k)
-        val = str(data.get(k)) #: Coerce to str, because we should not need to handle any other data type.
-
-        if isinstance(val, list):
-            parsed_val = handle_rich_content(srcfile, val)
+        if is_rich_content(val):
+            write_rich_content(out, srcfile, val, image_handler, outfile)
         else:
-            parsed_val = handle_newlines(val)
+            out.write(handle_newlines(str(val))) #: Coerce to str, because we should not need to handle any other data type.
+
+        out.write("\n\n")
 
-        item = f"{nodes.Nodes.ITEM.value}{parsed_val}\n\n"
-        output = output + title + item
+def handle_newlines(data: str, pad: str = None) -> str:
+    """
+    Indents every line after the first with ``pad``, so a multiline value
+    lines up inside its table cell. If ``data`` has more than one line,
+    every line ends with a newline.
 
-    return output
+    Args:
+        data (str): Value to indent.
+        pad (str): Indentation for the second line onwards.
+            Defaults to ``Nodes.LEFTPAD``, which matches a table at col 0.
+            Pass a deeper pad for tables nested in other blocks.
 
-def handle_newlines(data: str) -> str:
-    assert(isinstance(data, str)), "{} must be str".format(data)
+    Raises:
+        errors.InvalidNodeError: If ``data`` isn't a str.
+    """
+    if not isinstance(data, str):
+        raise InvalidNodeError("{!r} must be str".format(data))
     if ("\n" not in data):
         return data
 
-    output = ""
-    strlist = data.split("\n")
+    if pad is None:
+        pad = nodes.Nodes.LEFTPAD.value
 
-    for line in strlist:
-        if strlist.index(line) == 0:
-            output = line + "\n"
-        else:
-            output = output + nodes.Nodes.LEFTPAD.value + line + "\n"
+    return data.replace("\n", "\n" + pad) + "\n"
 
-    return output
+JSON_SUFFIXES = [".json", ".jsonl"] #: Files with these suffixes are picked up from input directories.
 
-def smart_filepaths(filepath: str) -> List[str]:
+def smart_filepaths(
+    filepath: str,
+    recursive: bool = False,
+    include: List[str] = None,
+    exclude: List[str] = None,
+    ) -> List[Path]:
     """
     Parses a filepath.
     - If it's a directory, return a list of filenames
@@ -119,37 +259,431 @@ def smart_filepaths(filepath: str) -> List[str]:
         filepath (str): Takes a filepath and:
             - Decides if it's a directory or file.
 
-                - If it's a directory, returns the list of JSON files
-                  in the directory as a string.
+                - If it's a directory, returns the list of JSON
+                  (``.json`` and ``.jsonl``) files in the directory.
                 - If it's a single file, returns the name of that
                   file in a list.
-    """
-    def is_json(filename: str) -> bool:
-        return Path(filename).suffix == ".json"
 
+        recursive, include, exclude: See :func:`iter_filepaths`.
+    """
+    return list(iter_filepaths(filepath, recursive, include, exclude))
+
+def iter_filepaths(
+    filepath: str,
+    recursive: bool = False,
+    include: List[str] = None,
+    exclude: List[str] = None,
+    ) -> Iterator[Path]:
+    """
+    Same as :func:`smart_filepaths`, but yields files as they are found,
+    so callers can start on the first files before the walk finishes.
 
+    Directories are walked with ``os.scandir``, in name order,
+    so the order of files is deterministic.
 
+    Args:
+        filepath (str): A JSON file, or a directory.
+        recursive (bool): Also walk subdirectories. Symlinked directories
+            are followed, but each directory is only visited once,
+            so symlink loops are harmless.
+        include (List[str]): Glob patterns, e.g. ``2021/*.json``. If set, only
+            files whose path (relative to ``filepath``) or name matches
+            one of the patterns are yielded.
+        exclude (List[str]): Glob patterns. Files and directories whose
+            relative path or name matches one of the patterns are skipped.
+
+    Raises:
+        FileNotFoundError: If ``filepath`` doesn't exist.
+    """
     thispath = Path(filepath).absolute()
 
-    if Path(thispath).is_dir():
-        filelist = Path(thispath).iterdir()
+    if thispath.is_file():
+        assert(thispath.suffix in JSON_SUFFIXES), f"{thispath} is not a JSON file."
+        yield thispath
+        return
+
+    if not thispath.is_dir():
+        raise FileNotFoundError(f"{thispath} does not exist.")
+
+    include = include if include else list()
+    exclude = exclude if exclude else list()
 
-        out_filelist = list()
+    visited = set() # type: Set[Tuple[int, int]]
 
-        for f in filelist:
-            if is_json(f):
-                out_filelist.append(f)
+    def walk(dirpath: str, reldir: str) -> Iterator[Path]:
+        st = os.stat(dirpath)
+        if (st.st_dev, st.st_ino) in visited:
+            return
+        visited.add((st.st_dev, st.st_ino))
 
-        return out_filelist
+        with os.scandir(dirpath) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
 
-    if Path(thispath).is_file():
-        assert(is_json(thispath)), f"{thispath} is not a JSON file."
+        subdirs = list()
 
-        outfile = list()
-        outfile.append(Path(thispath))
+        for entry in entries:
+            relpath = reldir + entry.name
+
+            if exclude and _matches_globs(relpath, entry.name, exclude):
+                continue
+
+            if entry.is_dir():
+                if recursive:
+                    subdirs.append((entry.path, relpath + "/"))
+                continue
+
+            if not entry.is_file() or os.path.splitext(entry.name)[1] not in JSON_SUFFIXES:
+                continue
+
+            if entry.name in manifest.OUTPUT_FILES:
+                continue
+
+            if include and not _matches_globs(relpath, entry.name, include):
+                continue
+
+            yield Path(entry.path)
+
+        for subdir, relsubdir in subdirs:
+            yield from walk(subdir, relsubdir)
+
+    yield from walk(str(thispath), "")
+
+def _matches_globs(relpath: str, name: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(relpath, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+def is_input_file(
+    path: str,
+    filepath: str,
+    recursive: bool = False,
+    include: List[str] = None,
+    exclude: List[str] = None,
+    ) -> bool:
+    """
+    Checks whether ``iter_filepaths(filepath, recursive, include, exclude)``
+    would yield ``path``, without walking ``filepath``.
+    ``path`` doesn't need to exist, e.g. it may have just been deleted.
+    """
+    thispath = Path(path).absolute()
+    root = Path(filepath).absolute()
+
+    if not root.is_dir():
+        return thispath == root
+
+    try:
+        parts = thispath.relative_to(root).parts
+    except ValueError:
+        return False
+
+    if not parts or (len(parts) > 1 and not recursive):
+        return False
+
+    if thispath.suffix not in JSON_SUFFIXES or thispath.name in manifest.OUTPUT_FILES:
+        return False
+
+    if exclude:
+        for depth in range(1, len(parts) + 1):
+            if _matches_globs("/".join(parts[:depth]), parts[depth - 1], exclude):
+                return False
+
+    return not include or _matches_globs("/".join(parts), thispath.name, include)
+
+def convert_file(
+    srcfile: str,
+    outfile: str,
+    entry: Dict[str, Any] = None,
+    image_handler: images.ImageHandler = None,
+    name_key: str = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+    """
+    Reads a JSON file, renders it, and writes the rST page to ``outfile``.
+
+    Args:
+        srcfile (str): Path to input JSON file.
+        outfile (str): Path to output rST file.
+        entry (Dict[str, Any]): Build manifest entry for ``srcfile`` from
+            the last build, if any. If the entry is still fresh,
+            the file is not rendered at all.
+        image_handler (images.ImageHandler): Decides how ``image`` nodes are written.
+        name_key (str): If set, the output file and page title are named after
+            the value of this key in the JSON object, instead of after ``srcfile``.
+
+    Returns:
+        A tuple of (status, manifest entry). Status is one of:
+
+        - ``"skipped"``: the input and its images are unchanged since the last build.
+        - ``"unchanged"``: the page was rendered, but the output file already had the same content.
+        - ``"written"``: the output file was written.
+
+        The manifest entry records the output file under ``"output"``.
+    """
+    return PageJob.for_file(srcfile, outfile, entry, image_handler, name_key).run()
+
+def convert_record(
+    srcfile: str,
+    name: str,
+    src_hash: str,
+    data: Any,
+    outfile: str,
+    entry: Dict[str, Any] = None,
+    image_handler: images.ImageHandler = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+    """
+    Renders one record from a batch input file (see :mod:`records`),
+    and writes it to ``outfile``.
+
+    Args:
+        srcfile (str): Path to the batch file the record came from.
+        name (str): Name of the record. Used as the page title.
+        src_hash (str): Content hash of the record's JSON text.
+        data (Any): The parsed record.
+        outfile (str): Path to output rST file.
+        entry (Dict[str, Any]): Build manifest entry for the record from the last build, if any.
+        image_handler (images.ImageHandler): Decides how ``image`` nodes are written.
+
+    Returns:
+        Same as :func:`convert_file`.
+    """
+    return PageJob.for_record(srcfile, name, src_hash, data, outfile, entry, image_handler).run()
+
+class PageJob:
+    """
+    One page to convert: a JSON file, or one record from a batch file.
+
+    :meth:`run` converts the page in one go, streaming it straight
+    to disk. The conversion can also run as three separate steps,
+    so that each step can run in its own pipeline stage (see :mod:`pipeline`):
+
+    #.  :meth:`read`: reads the input, and checks it against
+        the build manifest. Mostly I/O.
+    #.  :meth:`render`: parses the input, and renders the page
+        to a string. Mostly CPU.
+    #.  :meth:`write`: writes the page. Mostly I/O.
+
+    Afterwards, :meth:`result` returns the same (status, manifest entry)
+    tuple as :func:`convert_file`.
+    """
+    def __init__(self,
+        srcfile: str,
+        outfile: str,
+        entry: Dict[str, Any] = None,
+        image_handler: images.ImageHandler = None,
+        name_key: str = None,
+        ) -> None:
+        self.srcfile = srcfile
+        self.outfile = outfile
+        self.entry = entry
+        self.image_handler = image_handler if image_handler else images.ImageHandler(outdir=Path(outfile).parent)
+        self.name_key = name_key
+        self.title = None
+        self.src_hash = None
+        self.raw = None
+        self.data = None
+        self.loaded = False #: Whether ``data`` holds the parsed input.
+        self.page = None
+        self.status = None
+
+    @classmethod
+    def for_file(cls,
+        srcfile: str,
+        outfile: str,
+        entry: Dict[str, Any] = None,
+        image_handler: images.ImageHandler = None,
+        name_key: str = None,
+        ) -> "PageJob":
+        """A job for a JSON file. See :func:`convert_file` for arguments."""
+        return cls(srcfile, outfile, entry, image_handler, name_key)
+
+    @classmethod
+    def for_record(cls,
+        srcfile: str,
+        name: str,
+        src_hash: str,
+        data: Any,
+        outfile: str,
+        entry: Dict[str, Any] = None,
+        image_handler: images.ImageHandler = None,
+        ) -> "PageJob":
+        """A job for a record of a batch file. See :func:`convert_record` for arguments."""
+        job = cls(srcfile, outfile, entry, image_handler)
+        job.title = name
+        job.src_hash = src_hash
+        job.data = data
+        job.loaded = True
+        return job
+
+    def run(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        Converts the page in one go. Large input files are memory-mapped,
+        and the page is streamed into the output file.
+        """
+        if self.loaded:
+            if not self._check_fresh():
+                self._stream()
+            return self.result()
+
+        with reader.open_buffer(self.srcfile) as raw:
+            with stats.stage("read"):
+                self._hash(raw)
+            if self._check_fresh():
+                return self.result()
+            with stats.stage("parse"):
+                self.data = jsonbackend.loads(raw)
+
+        self._loaded()
+        self._stream()
+        return self.result()
+
+    def read(self) -> bool:
+        """
+        Reads the input into memory, and checks it against the build manifest.
+
+        Returns:
+            ``False`` if the page is up-to-date, and needs no further steps.
+        """
+        if not self.loaded:
+            with stats.stage("read"):
+                with open(self.srcfile, "rb") as f:
+                    self.raw = f.read()
+                self._hash(self.raw)
+
+        return not self._check_fresh()
+
+    def render(self) -> None:
+        """
+        Parses the input, and renders the page into ``self.page``.
+        """
+        if not self.loaded:
+            with stats.stage("parse"):
+                self.data = jsonbackend.loads(self.raw)
+            self.raw = None
+            self._loaded()
+
+        with stats.stage("render"):
+            out = io.StringIO()
+            write_page(out, self.srcfile, self.data, self.image_handler, self.outfile, self.title)
+            self.page = out.getvalue()
+
+    def write(self) -> None:
+        """
+        Writes the rendered page to the output file,
+        unless the file already has the same content.
+        """
+        writer = AtomicWriter(self.outfile)
+        with stats.stage("write"):
+            with writer as out:
+                out.write(self.page)
+
+        self.page = None
+        self._written(writer.changed)
+
+    def result(self) -> Tuple[str, Dict[str, Any]]:
+        return (self.status, self.entry)
+
+    def _hash(self, raw: bytes) -> None:
+        self.src_hash = manifest.hash_bytes(raw)
+
+        if stats.current is not None:
+            stats.current.count("bytes_read", len(raw))
+
+        if self.name_key and self.entry and self.entry.get("options") == self._options():
+            self.outfile = self.entry.get("output", self.outfile) #: Same content and options, so same name as last time.
+
+    def _options(self) -> Dict[str, Any]:
+        """Options that change the page, or its file name, for the build manifest."""
+        return {"images": self.image_handler.mode, "name_key": self.name_key}
+
+    def _check_fresh(self) -> bool:
+        fresh = manifest.is_fresh(self.entry, self.outfile, self.src_hash, self._options()) \
+            and self.image_handler.has_assets(self.entry["images"])
+
+        if fresh:
+            self.status = "skipped"
+        return fresh
+
+    def _loaded(self) -> None:
+        """Names the page after ``name_key``, now that the input is parsed."""
+        self.loaded = True
+
+        if self.name_key:
+            self.title = records.record_name(self.data, self.name_key, Path(self.srcfile).stem)
+            self.outfile = str(Path(self.outfile).with_name(self.title + ".rst"))
+
+    def _stream(self) -> None:
+        writer = AtomicWriter(self.outfile)
+        with stats.stage("render"): #: Includes buffered writes. Replacing the output counts as "write".
+            with writer as out:
+                write_page(out, self.srcfile, self.data, self.image_handler, self.outfile, self.title)
+
+        self._written(writer.changed)
+
+    def _written(self, changed: bool) -> None:
+        self.status = "written" if changed else "unchanged"
+        self.entry = manifest.make_entry(self.srcfile, self.outfile, self.src_hash, self.data, self._options())
+        self.data = None
+
+class AtomicWriter:
+    """
+    Context manager that opens a temp file beside ``filepath`` for writing.
+
+    On a clean exit, the temp file replaces ``filepath`` only if
+    their contents differ, so unchanged files keep their mtimes.
+    ``changed`` is set to whether ``filepath`` was replaced.
+    On an exception, the temp file is removed and ``filepath`` is left alone.
+
+    ..  code-block:: python
+
+        writer = AtomicWriter("out.rst")
+        with writer as f:
+            f.write("...")
+        writer.changed
+    """
+    def __init__(self, filepath: str) -> None:
+        self.filepath = str(filepath)
+        self.tmp = "{}.{}.tmp".format(self.filepath, os.urandom(4).hex())
+        self.changed = False
+
+    def __enter__(self) -> TextIO:
+        self.f = open(self.tmp, "x", encoding="utf-8")
+        return self.f
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self.f.close()
+
+        if exc_type is not None:
+            os.remove(self.tmp)
+            return False
+
+        with stats.stage("write"):
+            if os.path.isfile(self.filepath) and filecmp.cmp(self.tmp, self.filepath, shallow=False):
+                os.remove(self.tmp)
+                self.changed = False
+            else:
+                if stats.current is not None:
+                    stats.current.count("bytes_written", os.path.getsize(self.tmp))
+                os.replace(self.tmp, self.filepath)
+                self.changed = True
+
+        return False
+
+def write_file(filepath: str, data: str) -> bool:
+    """
+    Writes ``data`` to ``filepath``, unless the file already contains
+    exactly ``data``. Leaving unchanged files alone keeps their mtimes stable,
+    so incremental Sphinx builds don't re-read them.
+
+    Returns:
+        ``True`` if the file was written.
+    """
+    encoded = data.encode("utf-8")
+
+    try:
+        with open(filepath, "rb") as f:
+            if f.read() == encoded:
+                return False
+    except OSError:
+        pass
 
-        return outfile
+    with open(filepath, "wb") as f:
+        f.write(encoded)
 
-def write_file(filepath: str, data: str) -> None:
-    with open(filepath,"w") as f:
-        f.write(data)
+    return True
@@ -0,0 +1,218 @@
+"""
+File watchers for ``json2rst --watch``.
+
+Both watchers have the same interface: :meth:`poll` blocks
+until something changes (or a timeout passes), and returns
+the paths that changed.
+
+- :class:`InotifyWatcher` uses Linux inotify (through ctypes, so there's
+  nothing to install). Changes are reported within milliseconds.
+- :class:`PollingWatcher` stats every watched file at an interval.
+  It works everywhere, but is slower to notice changes.
+
+:func:`make_watcher` picks inotify when it is available.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from typing import Callable, Dict, Iterable, Set, Tuple
+
+Snapshot = Dict[str, Tuple[int, int]] #: Path -> (mtime, size) of every watched file.
+
+class PollingWatcher:
+    def __init__(self, snapshot: Callable[[], Snapshot], interval: float = 0.5) -> None:
+        """
+        Args:
+            snapshot (Callable[[], Snapshot]): Stats every file to watch.
+                Called once per ``interval``, so new files are picked up.
+            interval (float): Seconds between snapshots.
+        """
+        self.snapshot = snapshot
+        self.interval = interval
+        self.last = snapshot()
+        self.overflowed = False #: Polling never loses track of changes.
+
+    def add_dir(self, dirpath: str) -> None:
+        """Polling watches whatever ``snapshot`` returns, so there's nothing to add."""
+
+    def poll(self, timeout: float = None) -> Set[str]:
+        """
+        Returns:
+            Paths that were created, changed, or deleted since the last poll.
+            Empty if nothing changed within ``timeout`` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            wait = self.interval
+            if deadline is not None:
+                wait = max(0, min(wait, deadline - time.monotonic()))
+            time.sleep(wait)
+
+            current = self.snapshot()
+            changed = {path for path in current.keys() | self.last.keys()
+                       if current.get(path) != self.last.get(path)}
+            self.last = current
+
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+
+    def close(self) -> None:
+        pass
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM \
+    | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct("iIII") #: struct inotify_event: wd, mask, cookie, len
+
+class InotifyWatcher:
+    def __init__(self, dirs: Iterable[str], recursive: bool = False) -> None:
+        """
+        Args:
+            dirs (Iterable[str]): Directories to watch.
+            recursive (bool): Also watch subdirectories, including ones created later.
+
+        Raises:
+            OSError: If inotify isn't available.
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux.")
+
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.recursive = recursive
+        self.wds = dict() # type: Dict[int, str]
+        self.dirs = set() # type: Set[str]
+        self.overflowed = False #: Set when the kernel dropped events. Callers should rescan.
+
+        for dirpath in dirs:
+            self.add_dir(dirpath)
+
+    def add_dir(self, dirpath: str) -> None:
+        """
+        Starts watching a directory (and, if recursive, its subdirectories).
+        Watching an already-watched directory does nothing.
+        """
+        dirpath = os.path.abspath(dirpath)
+        if dirpath in self.dirs or not os.path.isdir(dirpath):
+            return
+
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), _WATCH_MASK)
+        if wd < 0:
+            logging.warning("Can't watch {}: {}".format(dirpath, os.strerror(ctypes.get_errno())))
+            return
+
+        self.wds[wd] = dirpath
+        self.dirs.add(dirpath)
+
+        if self.recursive:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.add_dir(entry.path)
+
+    def poll(self, timeout: float = None) -> Set[str]:
+        """
+        Returns:
+            Paths that were created, changed, or deleted.
+            Empty if nothing changed within ``timeout`` seconds.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & _IN_Q_OVERFLOW:
+                    self.overflowed = True
+                    continue
+
+                dirpath = self.wds.get(wd)
+                if dirpath is None:
+                    continue
+
+                if mask & _IN_IGNORED: #: The directory itself is gone.
+                    del self.wds[wd]
+                    self.dirs.discard(dirpath)
+                    continue
+
+                path = os.path.join(dirpath, os.fsdecode(name)) if name else dirpath
+                changed.add(path)
+
+                if self.recursive and mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self.add_dir(path)
+
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+def make_watcher(
+    dirs: Iterable[str],
+    recursive: bool,
+    snapshot: Callable[[], Snapshot],
+    interval: float = 0.5,
+    ):
+    """
+    Returns:
+        An :class:`InotifyWatcher` if inotify is available,
+        otherwise a :class:`PollingWatcher`.
+    """
+    try:
+        return InotifyWatcher(dirs, recursive)
+    except (OSError, AttributeError) as e: #: AttributeError: libc has no inotify functions.
+        logging.info("inotify unavailable ({}), polling every {}s instead.".format(e, interval))
+        return PollingWatcher(snapshot, interval)
+
+def debounce(watcher, first: Set[str], quiet: float) -> Set[str]:
+    """
+    Keeps collecting changes until nothing has changed for ``quiet`` seconds,
+    so that a burst of changes (e.g. an editor's save, or a ``git checkout``)
+    is handled as one batch.
+
+    Args:
+        first (Set[str]): Changes already seen.
+
+    Returns:
+        All changed paths in the burst.
+    """
+    changed = set(first)
+
+    while True:
+        more = watcher.poll(quiet)
+        if not more:
+            return changed
+        changed |= more
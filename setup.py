@@ -23,4 +23,12 @@ setup(
     package_dir={"": "."},
     packages=find_namespace_packages(),
     python_requires=">=3.6",
+    extras_require={
+        "arrow": ["pyarrow"], #: For pivot --format parquet and arrow.
+    },
+    entry_points={
+        "console_scripts": [
+            "json2rst=json2rst.cmd:cmd",
+        ],
+    },
 )
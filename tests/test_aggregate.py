@@ -0,0 +1,33 @@
+import pytest
+
+from json2rst import aggregate
+from json2rst.errors import InvalidOptionError
+
+def _aggregate(values, aggs):
+    aggregator = aggregate.Aggregator(["g"], aggregate.parse_agg_spec(aggs))
+    for val in values:
+        aggregator.add(("x", val))
+    return list(aggregator.rows())
+
+def test_numeric_strings_are_numbers_for_sum_min_and_max():
+    assert _aggregate([10, "3", "20", None], "v:sum,v:min,v:max,v:count") == [("x", 33.0, 3.0, 20.0, 3)]
+
+def test_strings_sort_after_numbers():
+    assert _aggregate(["b", 1, "a"], "v:min,v:max") == [("x", 1, "b")]
+
+def test_merge_matches_add():
+    values = [0.1, 0.2, "0.3", 1e16, -1e16, 7, "x"]
+    whole = aggregate.Aggregator(["g"], aggregate.parse_agg_spec("*:count,v:sum,v:min,v:max"))
+    parts = [whole.empty(), whole.empty()]
+    for index, val in enumerate(values):
+        whole.add(("x", val))
+        parts[index % 2].add(("x", val))
+    merged = whole.empty()
+    for part in parts:
+        merged.merge(part)
+    assert list(merged.rows()) == list(whole.rows())
+
+@pytest.mark.parametrize("spec", ["v", "v:avg", ":sum", "*:max"])
+def test_bad_agg_spec(spec):
+    with pytest.raises(InvalidOptionError):
+        aggregate.parse_agg_spec(spec)
@@ -0,0 +1,38 @@
+import pytest
+
+import json2rst
+
+OBJECTS = [
+    {"ID": "EIQ-10", "Status": "Open"},
+    {"ID": "EIQ-2", "Status": "Closed"},
+]
+
+def test_pivot_rows_can_be_called_twice():
+    for _ in range(2):
+        rows = json2rst.pivot_rows(OBJECTS, ["ID", "Status"], sort_by="ID:natural")
+        assert rows == [
+            {"ID": "EIQ-2", "Status": "Closed"},
+            {"ID": "EIQ-10", "Status": "Open"},
+        ]
+
+def test_pivot_rows_strict_raises_pivot_key_error():
+    with pytest.raises(json2rst.PivotKeyError):
+        json2rst.pivot_rows(OBJECTS + [{"ID": "EIQ-3"}], ["ID", "Status"], strict=True)
+
+def test_render_returns_page():
+    rst = json2rst.render({"ID": "EIQ-1", "Status": "Open"}, "EIQ-1")
+    assert rst.startswith("EIQ-1\n")
+
+@pytest.mark.parametrize("kwargs", [
+    {"sort_by": "ID:bogus"},
+    {"sort_by": "ID", "sort_order": "down"},
+    {"group_by": ["Status"], "aggs": "ID:avg"},
+    {"group_by": ["Status"], "aggs": "*:sum"},
+])
+def test_pivot_rows_bad_options_raise_invalid_option_error(kwargs):
+    with pytest.raises(json2rst.InvalidOptionError):
+        json2rst.pivot_rows(OBJECTS, ["ID", "Status"], **kwargs)
+
+def test_renderer_bad_image_mode_raises_invalid_option_error():
+    with pytest.raises(json2rst.InvalidOptionError):
+        json2rst.Renderer(images="bogus")
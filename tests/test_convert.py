@@ -0,0 +1,62 @@
+import json
+import logging
+import os
+
+import pytest
+
+from json2rst import cmd
+
+@pytest.fixture
+def indir(tmp_path):
+    path = tmp_path.joinpath("in")
+    path.mkdir()
+    path.joinpath("a.json").write_text(json.dumps({"ID": "EIQ-1", "Status": "Open"}))
+    path.joinpath("b.json").write_text(json.dumps({"ID": "EIQ-2", "Status": "Closed"}))
+    return path
+
+def _convert(indir, outdir, **kwargs):
+    assert cmd._convert_json_to_rst(str(indir), str(outdir), jobs=1, **kwargs) == 0
+    return sorted(os.listdir(str(outdir)))
+
+@pytest.mark.parametrize("force", [False, True])
+def test_adding_name_key_renames_outputs(indir, tmp_path, force):
+    outdir = tmp_path.joinpath("out")
+    assert _convert(indir, outdir) == [".json2rst-manifest.json", "a.rst", "b.rst"]
+    assert _convert(indir, outdir, name_key="ID", force=force) == [".json2rst-manifest.json", "EIQ-1.rst", "EIQ-2.rst"]
+    assert _convert(indir, outdir) == [".json2rst-manifest.json", "a.rst", "b.rst"]
+
+def _many_inputs(path):
+    """Single-record files, and a batch file whose clashing record names are numbered in input order."""
+    path.mkdir()
+    for n in range(40):
+        path.joinpath("page-{:02d}.json".format(n)).write_text(json.dumps({"ID": "PAGE-{}".format(n), "N": n}))
+    with open(str(path.joinpath("batch.jsonl")), "w") as f:
+        for n in range(50):
+            f.write(json.dumps({"ID": "EIQ-{}".format(n % 9), "N": n}) + "\n")
+    return path
+
+def _written(indir, outdir, caplog, **kwargs):
+    """Converts ``indir``, and returns the outputs in the order they were reported, and their content."""
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        assert cmd._convert_json_to_rst(str(indir), str(outdir), name_key="ID", **kwargs) == 0
+
+    order = [r.getMessage().split(" ", 1)[1] for r in caplog.records if r.getMessage().startswith("Written ")]
+    order = [os.path.relpath(path, str(outdir)) for path in order]
+    return order, {name: outdir.joinpath(name).read_text() for name in order}
+
+@pytest.mark.parametrize("jobs", [2, 3])
+def test_jobs_match_one_job(tmp_path, caplog, jobs):
+    indir = _many_inputs(tmp_path.joinpath("in"))
+    expected = _written(indir, tmp_path.joinpath("one"), caplog, jobs=1)
+    assert len(expected[0]) == 90
+
+    assert _written(indir, tmp_path.joinpath("many"), caplog, jobs=jobs) == expected
+
+@pytest.mark.parametrize("workers", [(1, 1, 1), (4, 2, 4)])
+def test_pipeline_matches_sequential(tmp_path, caplog, workers):
+    indir = _many_inputs(tmp_path.joinpath("in"))
+    expected = _written(indir, tmp_path.joinpath("sequential"), caplog, jobs=1)
+
+    actual = _written(indir, tmp_path.joinpath("pipelined"), caplog, pipelined=True, pipeline_workers=workers, queue_size=4)
+    assert actual == expected
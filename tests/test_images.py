@@ -0,0 +1,68 @@
+import json
+import os
+
+import pytest
+
+from json2rst import cmd
+from json2rst.images import ASSETS_DIR
+
+@pytest.fixture
+def indir(tmp_path):
+    path = tmp_path.joinpath("in")
+    path.mkdir()
+    path.joinpath("pic.png").write_bytes(b"\x89PNG not really")
+    path.joinpath("same.png").write_bytes(b"\x89PNG not really") #: Same content, another name.
+    for name, img in [("a", "pic.png"), ("b", "same.png")]:
+        page = {"ID": name, "Pic": [{"image": str(path.joinpath(img))}]}
+        path.joinpath(name + ".json").write_text(json.dumps(page))
+    return path
+
+def _convert(indir, outdir, images):
+    assert cmd._convert_json_to_rst(str(indir), str(outdir), jobs=1, images=images) == 0
+
+def _target(outdir, name):
+    """Returns the target of the page's image directive."""
+    for line in outdir.joinpath(name + ".rst").read_text().splitlines():
+        if "image::" in line:
+            return line.split("image::", 1)[1].strip()
+    raise AssertionError("No image in " + name)
+
+def test_embed(indir, tmp_path):
+    outdir = tmp_path.joinpath("out")
+    _convert(indir, outdir, "embed")
+
+    assert _target(outdir, "a").startswith("data:image/png;base64,")
+    assert not outdir.joinpath(ASSETS_DIR).exists()
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink"])
+def test_copy_and_hardlink_store_each_image_once(indir, tmp_path, mode):
+    outdir = tmp_path.joinpath("out")
+    _convert(indir, outdir, mode)
+
+    assets = os.listdir(str(outdir.joinpath(ASSETS_DIR)))
+    assert len(assets) == 1 and assets[0].endswith(".png")
+    asset = outdir.joinpath(ASSETS_DIR, assets[0])
+    assert asset.read_bytes() == indir.joinpath("pic.png").read_bytes()
+    assert _target(outdir, "a") == _target(outdir, "b") == ASSETS_DIR + "/" + assets[0]
+
+    linked = os.path.samefile(str(asset), str(indir.joinpath("pic.png"))) \
+        or os.path.samefile(str(asset), str(indir.joinpath("same.png")))
+    assert linked == (mode == "hardlink")
+
+@pytest.mark.parametrize("mode", ["copy", "hardlink"])
+def test_missing_asset_is_restored(indir, tmp_path, mode):
+    outdir = tmp_path.joinpath("out")
+    _convert(indir, outdir, mode)
+    for asset in outdir.joinpath(ASSETS_DIR).iterdir():
+        asset.unlink()
+
+    _convert(indir, outdir, mode)
+    assert len(os.listdir(str(outdir.joinpath(ASSETS_DIR)))) == 1
+
+def test_reference(indir, tmp_path):
+    outdir = tmp_path.joinpath("out")
+    _convert(indir, outdir, "reference")
+
+    assert _target(outdir, "a") == "../in/pic.png"
+    assert _target(outdir, "b") == "../in/same.png"
+    assert not outdir.joinpath(ASSETS_DIR).exists()
@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def _check_import_time():
+    """Loads benchmarks/check_import_time.py, which isn't a package, for its LAZY_MODULES."""
+    path = os.path.join(ROOT, "benchmarks", "check_import_time.py")
+    spec = importlib.util.spec_from_file_location("check_import_time", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_cli_import_doesnt_import_lazy_modules():
+    lazy = _check_import_time().LAZY_MODULES
+    code = "import sys, json2rst.cmd; print('\\n'.join(sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True).stdout
+
+    assert sorted(set(out.split()) & set(lazy)) == []
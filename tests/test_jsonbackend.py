@@ -0,0 +1,30 @@
+import math
+
+import pytest
+
+from json2rst import jsonbackend
+
+LENIENT = b'{"big": 123456789012345678901234, "n": NaN, "inf": -Infinity}'
+
+@pytest.fixture
+def backend():
+    yield jsonbackend
+    jsonbackend.use("auto")
+
+def test_auto_accepts_what_json_accepts(backend):
+    backend.use("auto")
+    data = backend.loads(LENIENT)
+    assert data["big"] == 123456789012345678901234
+    assert math.isnan(data["n"])
+    assert data["inf"] == -math.inf
+
+def test_auto_still_rejects_invalid_json(backend):
+    backend.use("auto")
+    with pytest.raises(ValueError):
+        backend.loads(b'{"a": ')
+
+def test_explicit_backend_has_no_fallback(backend):
+    pytest.importorskip("orjson")
+    backend.use("orjson")
+    with pytest.raises(ValueError):
+        backend.loads(LENIENT)
@@ -0,0 +1,95 @@
+import json
+import logging
+import shutil
+
+import pytest
+
+from json2rst import cmd
+from json2rst.manifest import MANIFEST_NAME, Manifest
+
+@pytest.fixture
+def indir(tmp_path):
+    path = tmp_path.joinpath("in")
+    path.mkdir()
+    path.joinpath("a.json").write_text(json.dumps({"ID": "EIQ-1", "Status": "Open"}))
+    path.joinpath("b.json").write_text(json.dumps({"ID": "EIQ-2", "Status": "Closed"}))
+    return path
+
+def _statuses(indir, outdir, caplog, **kwargs):
+    """Converts ``indir``, and returns {output file name: status}."""
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        assert cmd._convert_json_to_rst(str(indir), str(outdir), jobs=1, **kwargs) == 0
+
+    out = dict()
+    for record in caplog.records:
+        status, _, path = record.getMessage().partition(" ")
+        if status in ("Skipped", "Written", "Unchanged"):
+            out[path.rsplit("/", 1)[-1]] = status
+    return out
+
+def test_outputs_are_relative_to_output_directory(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+
+    saved = json.loads(outdir.joinpath(MANIFEST_NAME).read_text())
+    assert sorted(entry["output"] for entry in saved["files"].values()) == ["a.rst", "b.rst"]
+    assert Manifest(str(outdir)).get(str(indir.joinpath("a.json")))["output"] == str(outdir.joinpath("a.rst"))
+
+    moved = tmp_path.joinpath("moved")
+    shutil.move(str(outdir), str(moved))
+    assert _statuses(indir, moved, caplog) == {"a.rst": "Skipped", "b.rst": "Skipped"}
+
+def test_other_renderer_version_rebuilds(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+
+    path = outdir.joinpath(MANIFEST_NAME)
+    saved = json.loads(path.read_text())
+    saved["files"][str(indir.joinpath("a.json"))]["renderer"] = "0.0.0"
+    path.write_text(json.dumps(saved))
+
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Unchanged", "b.rst": "Skipped"}
+
+def test_unchanged_inputs_are_skipped(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Written", "b.rst": "Written"}
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Skipped", "b.rst": "Skipped"}
+
+def test_changed_input_is_rebuilt(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+
+    indir.joinpath("a.json").write_text(json.dumps({"ID": "EIQ-1", "Status": "Closed"}))
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Written", "b.rst": "Skipped"}
+    assert "Closed" in outdir.joinpath("a.rst").read_text()
+
+def test_same_content_new_bytes_is_rendered_but_not_rewritten(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+
+    indir.joinpath("a.json").write_text(json.dumps({"ID": "EIQ-1", "Status": "Open"}, indent=2))
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Unchanged", "b.rst": "Skipped"}
+
+def test_changed_image_is_rebuilt(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    pic = indir.joinpath("pic.png")
+    pic.write_bytes(b"one")
+    indir.joinpath("a.json").write_text(json.dumps({"ID": "EIQ-1", "Pic": [{"image": str(pic)}]}))
+    _statuses(indir, outdir, caplog)
+    assert _statuses(indir, outdir, caplog)["a.rst"] == "Skipped"
+
+    pic.write_bytes(b"two")
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Written", "b.rst": "Skipped"}
+
+def test_missing_output_is_rebuilt(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+
+    outdir.joinpath("b.rst").unlink()
+    assert _statuses(indir, outdir, caplog) == {"a.rst": "Skipped", "b.rst": "Written"}
+
+def test_force_renders_everything(indir, tmp_path, caplog):
+    outdir = tmp_path.joinpath("out")
+    _statuses(indir, outdir, caplog)
+    assert _statuses(indir, outdir, caplog, force=True) == {"a.rst": "Unchanged", "b.rst": "Unchanged"}
@@ -0,0 +1,28 @@
+import pytest
+
+import json2rst
+
+@pytest.mark.parametrize("node, expected", [
+    ({"ul": 3}, "- 3"),
+    ({"ol": 3}, "#.  3"),
+    ({"heading": 5}, "**5**"),
+    ({"code": True}, "``True``"),
+    ({"p": 1.5}, "1.5"),
+])
+def test_non_str_content_is_rendered_as_str(node, expected):
+    rst = json2rst.render({"ID": "x", "Notes": [node]}, "x")
+    assert "      * " + expected + "\n" in rst
+
+@pytest.mark.parametrize("val", [
+    ["a", "b"],
+    [{"ul": "x"}, "y"],
+    [{"ul": "x"}, {"not-a-node": "y"}],
+    [{"ul": "x", "ol": "y"}],
+])
+def test_lists_that_arent_rich_content_are_rendered_as_str(val):
+    rst = json2rst.render({"ID": "x", "Tags": val}, "x")
+    assert "      * " + str(val) + "\n" in rst
+
+def test_rich_content_list_is_rendered_as_nodes():
+    rst = json2rst.render({"ID": "x", "Notes": [{"ul": "a"}, {"ul": "b"}]}, "x")
+    assert "      * - a\n\n        - b\n" in rst
@@ -0,0 +1,46 @@
+import pytest
+
+from json2rst import paths
+from json2rst.errors import InvalidPathError
+
+OBJ = {
+    "ID": "EIQ-1",
+    "v1.2": "literal",
+    "v1": {"2": "nested"},
+    "meta": {"owner": {"team": "docs"}, "a.b": 1},
+    "metrics": [{"name": "x", "value": 1}, {"name": "y", "value": 2}],
+    "Owner's team": "docs",
+    "Time [s]": 3.5,
+    'Say "hi"': "hi",
+}
+
+@pytest.mark.parametrize("header, expected", [
+    ("ID", "EIQ-1"),
+    ("v1.2", "literal"),
+    ("meta.owner.team", "docs"),
+    ('meta["a.b"]', 1),
+    ("$.metrics[-1].name", "y"),
+    ("metrics[*].value", [1, 2]),
+    ("Owner's team", "docs"),
+    ("Time [s]", 3.5),
+    ('Say "hi"', "hi"),
+    ("metrics[0", paths.MISSING),
+    ("nope.nope", paths.MISSING),
+])
+def test_compile_path(header, expected):
+    assert paths.compile_path(header)(OBJ) == expected
+
+def test_invalid_headers_are_plain_keys():
+    projection = paths.Projection(["ID", "Owner's team", "Time [s]"])
+    assert projection.plain
+    assert projection(OBJ) == (("EIQ-1", "docs", 3.5), [])
+
+def test_parse_path_still_rejects_invalid_paths():
+    with pytest.raises(InvalidPathError):
+        paths.parse_path("Time [s]")
+
+def test_explode_shares_rows_within_an_array():
+    projection = paths.Projection(["ID", "metrics[*].name", "metrics[*].value"])
+    values, missing = projection(OBJ)
+    assert missing == []
+    assert list(projection.explode(values)) == [("EIQ-1", "x", 1), ("EIQ-1", "y", 2)]
@@ -0,0 +1,30 @@
+import threading
+import time
+
+from json2rst import pipeline
+
+def test_slow_item_bounds_items_in_flight():
+    release = threading.Event()
+    pulled = list()
+    out = list()
+
+    def items():
+        for n in range(1000):
+            pulled.append(n)
+            yield n
+
+    def stage(n):
+        if n == 0:
+            release.wait(5) #: Hold up the first result; later ones finish first.
+        return n
+
+    results = pipeline.run(items(), [pipeline.Stage("slow", stage, workers=4)], queue_size=4)
+    consumer = threading.Thread(target=lambda: out.extend(results))
+    consumer.start()
+    time.sleep(0.3)
+    in_flight = len(pulled)
+    release.set()
+    consumer.join(5)
+
+    assert in_flight <= 2 * 4 + 1 #: The feeder may pull one item before it waits.
+    assert out == list(range(1000))
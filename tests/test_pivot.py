@@ -0,0 +1,160 @@
+import json
+import random
+import re
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from json2rst.errors import InvalidOptionError
+from json2rst.pivot import Pivot
+
+OBJECTS = [
+    ("a", {"ID": "a", "Due": "2021-03-25T10:00:00+08:00", "Score": 3}),
+    ("b", {"ID": "b", "Due": "2021-03-25T01:00:00", "Score": 10}),
+    ("c", {"ID": "c", "Due": "2021-03-25"}),
+    ("d", {"ID": "d", "Score": 2}),
+]
+
+def _ids(sort_key, sort_order=None, **kwargs):
+    table = Pivot(list(), ["ID", "Due", "Score"], False, None, sort_key, sort_order, objects=OBJECTS, **kwargs)
+    return [row["ID"] for row in table.rows()]
+
+@pytest.mark.parametrize("kwargs", [{}, {"limit": 4}, {"sort_memory": 1}])
+def test_missing_sort_keys_go_last(kwargs):
+    assert _ids("Score:numeric", "ascending", **kwargs) == ["d", "a", "b", "c"]
+    assert _ids("Score:numeric", "descending", **kwargs) == ["b", "a", "d", "c"]
+
+def test_dates_with_and_without_offsets_sort_together():
+    assert _ids("Due:date") == ["c", "b", "a", "d"]
+    assert _ids("Due:date", "descending") == ["a", "b", "c", "d"]
+
+def test_unknown_sort_key_raises():
+    with pytest.raises(InvalidOptionError, match="Scroe"):
+        Pivot(list(), ["ID", "Score"], False, None, "Scroe", None, objects=OBJECTS)
+
+# Property tests: typed sorts match a reference ordering, written independently
+# of json2rst, over values from a seeded generator.
+
+MISSING = object() #: The object has no "V" key at all.
+
+def _random_value(rng, sort_type):
+    roll = rng.random()
+    if roll < 0.1:
+        return MISSING
+    if roll < 0.2:
+        return None
+    if sort_type == "date" and roll < 0.8:
+        when = datetime(2021, 1, 1) + timedelta(minutes=rng.randint(0, 60 * 24 * 60))
+        if rng.random() < 0.5:
+            return when.isoformat() #: Naive, so UTC.
+        offset = timezone(timedelta(hours=rng.randint(-12, 12)))
+        return when.replace(tzinfo=offset).isoformat()
+    if sort_type == "date" and roll < 0.85:
+        return "2021-{:02d}-{:02d}".format(rng.randint(1, 2), rng.randint(1, 28)) #: A date, no time.
+    if sort_type == "natural" and roll < 0.8:
+        return rng.choice(["ID-", "ID-", "Doc ", "id-"]) + str(rng.randint(0, 120))
+    return rng.choice([
+        lambda: rng.randint(-50, 50),
+        lambda: rng.uniform(-50, 50),
+        lambda: str(rng.randint(-50, 50)), #: A numeric string.
+        lambda: "{:.2f}".format(rng.uniform(-50, 50)),
+        lambda: rng.choice(["alpha", "Beta", "gamma", "", "10 apples"]),
+    ])()
+
+def _number(val):
+    try:
+        return float(val)
+    except ValueError:
+        return None
+
+def _reference_key(sort_type, val):
+    """Rank 0 values compare among themselves; rank 1 values (that can't be typed) sort after them."""
+    if sort_type == "numeric":
+        num = _number(val)
+        return (0, num) if num is not None else (1, str(val))
+    if sort_type == "date":
+        try:
+            when = datetime.fromisoformat(str(val))
+        except ValueError:
+            return (1, str(val))
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return (0, when.timestamp())
+    if sort_type == "natural":
+        runs = re.findall(r"\d+|\D+", str(val))
+        if not runs or runs[0].isdigit():
+            runs.insert(0, "") #: Text runs and number runs alternate, starting with text.
+        return (0, [int(run) if run.isdigit() else run for run in runs])
+    return (0, str(val))
+
+def _reference_order(objects, sort_type, descending):
+    present = [(name, obj["V"]) for name, obj in objects if obj.get("V") is not None]
+    absent = [name for name, obj in objects if obj.get("V") is None]
+    present.sort(key=lambda item: _reference_key(sort_type, item[1]), reverse=descending)
+    return [name for name, _ in present] + absent
+
+def _random_objects(seed, sort_type, count=300):
+    rng = random.Random(seed)
+    objects = list()
+    for n in range(count):
+        obj = {"ID": str(n)}
+        val = _random_value(rng, sort_type)
+        if val is not MISSING:
+            obj["V"] = val
+        objects.append((str(n), obj))
+    return objects
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("sort_type", ["str", "numeric", "date", "natural"])
+@pytest.mark.parametrize("sort_order", ["ascending", "descending"])
+@pytest.mark.parametrize("kwargs", [{}, {"sort_memory": 2000}, {"limit": 50}])
+def test_typed_sorts_match_reference_order(seed, sort_type, sort_order, kwargs):
+    objects = _random_objects(seed, sort_type)
+    expected = _reference_order(objects, sort_type, sort_order == "descending")
+    if "limit" in kwargs:
+        expected = expected[:kwargs["limit"]]
+
+    table = Pivot(list(), ["ID", "V"], False, None, "V:" + sort_type, sort_order, objects=objects, **kwargs)
+    assert [row["ID"] for row in table.rows()] == expected
+
+# With jobs, files are read and projected (or aggregated) in worker processes.
+# Output must be the same as with one process.
+
+@pytest.fixture(scope="module")
+def many_files(tmp_path_factory):
+    path = tmp_path_factory.mktemp("pivot")
+    rng = random.Random(7)
+    files = list()
+    for n in range(Pivot.JOB_CHUNK_SIZE * 3 + 5): #: Several chunks, and a short last one.
+        obj = {"ID": "EIQ-{}".format(n), "Team": rng.choice(["docs", "web", "api"])}
+        if rng.random() < 0.8: #: Missing keys too.
+            obj["Score"] = rng.choice([rng.randint(0, 9), str(rng.randint(0, 9)), rng.uniform(0, 9)])
+        obj["Tags"] = [{"name": rng.choice("xyz")} for _ in range(rng.randint(0, 3))]
+        filepath = path.joinpath("{:04d}.json".format(n))
+        filepath.write_text(json.dumps(obj))
+        files.append(str(filepath))
+    return files
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"sort_key": "Score:numeric,ID:natural", "sort_order": "descending"},
+    {"sort_key": "Team", "limit": 20},
+    {"explode": True},
+    {"group_by": ["Team"], "aggs": "*:count,Score:sum,Score:min,Score:max"},
+    {"group_by": ["Team", "Tags[*].name"], "explode": True},
+])
+def test_jobs_match_one_job(many_files, tmp_path, kwargs):
+    headers = ["ID", "Team", "Score", "Tags[*].name"]
+    sort_key = kwargs.pop("sort_key", None)
+    sort_order = kwargs.pop("sort_order", None)
+    out = dict()
+    for jobs in [1, 3]:
+        csv_out = str(tmp_path.joinpath("{}.csv".format(jobs)))
+        table = Pivot(many_files, headers, False, csv_out, sort_key, sort_order, jobs=jobs, **kwargs)
+        assert table._parallel() == (jobs > 1)
+        rows = list(table.rows())
+        table.pivot()
+        with open(csv_out) as f:
+            out[jobs] = (rows, [(r.file, r.missing) for r in table.report], f.read())
+
+    assert out[3] == out[1]
@@ -0,0 +1,32 @@
+import json
+
+import pytest
+
+from json2rst import records
+
+ELEMENTS = [
+    {"ID": "EIQ-1", "Notes": ["a", "b, c", {"p": "]}"}]},
+    12345678901234567890,
+    'a string with "escaped" quotes \\ and a backslash',
+    [1.5, -2e10, True, None],
+    {"ID": "big", "rows": [{"k": i, "v": "x" * 30} for i in range(2000)]},
+]
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1 << 20])
+def test_iter_json_array_matches_json_load(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(records, "READ_CHUNK_SIZE", chunk_size)
+    path = tmp_path.joinpath("batch.json")
+    path.write_text(json.dumps(ELEMENTS, indent=1))
+
+    parsed = list(records.iter_json_array(str(path)))
+
+    assert [obj for _, obj in parsed] == ELEMENTS
+    assert [json.loads(raw) for raw, _ in parsed] == ELEMENTS
+
+def test_iter_json_array_rejects_truncated_array(tmp_path, monkeypatch):
+    monkeypatch.setattr(records, "READ_CHUNK_SIZE", 7)
+    path = tmp_path.joinpath("batch.json")
+    path.write_text(json.dumps(ELEMENTS)[:-20])
+
+    with pytest.raises(ValueError):
+        list(records.iter_json_array(str(path)))
@@ -0,0 +1,51 @@
+import os
+
+from json2rst import shards
+
+def _build(outdir, records, max_records):
+    writer = shards.ShardWriter(outdir, "export", max_records=max_records)
+    for n in range(records):
+        writer.add("EIQ-{}".format(n), "EIQ-{0}\n=====\n\nRecord {0}.\n\n".format(n))
+    writer.close()
+    return writer
+
+def _rst_files(outdir):
+    return sorted(name for name in os.listdir(str(outdir)) if name.endswith(".rst"))
+
+def test_fewer_shards_removes_only_recorded_shards(tmp_path):
+    tmp_path.joinpath("export-2021.rst").write_text("Hand-written.\n")
+    tmp_path.joinpath("export-00042.rst").write_text("A page from a non-sharded build.\n")
+
+    writer = _build(tmp_path, 10, 2)
+    assert writer.shards == ["export.shard-{:05d}".format(n) for n in range(1, 6)]
+
+    _build(tmp_path, 10, 5)
+    assert _rst_files(tmp_path) == [
+        "export-00042.rst",
+        "export-2021.rst",
+        "export.rst",
+        "export.shard-00001.rst",
+        "export.shard-00002.rst",
+    ]
+
+def test_unchanged_shards_are_not_rewritten(tmp_path):
+    _build(tmp_path, 6, 3)
+    assert _build(tmp_path, 6, 3).written == 0
+
+def test_labels_are_unique_and_lowercase(tmp_path):
+    writer = shards.ShardWriter(tmp_path, "export", max_records=10)
+    assert writer.add("EIQ 1", "x\n") == "eiq-1"
+    assert writer.add("eiq-1", "x\n") == "eiq-1-2"
+
+def test_sharding_twice_in_place_doesnt_read_shard_manifest(tmp_path):
+    from json2rst import cmd
+
+    for n in range(3):
+        tmp_path.joinpath("r{}.json".format(n)).write_text('{{"ID": "EIQ-{}"}}'.format(n))
+
+    for _ in range(2):
+        assert cmd._shard_json_to_rst(str(tmp_path), str(tmp_path), 10, jobs=1) == 0
+
+    shard = tmp_path.joinpath(tmp_path.name + ".shard-00001.rst").read_text()
+    assert shard.count("* ID") == 3
+    assert "indexes" not in shard
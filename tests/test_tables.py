@@ -0,0 +1,75 @@
+import pytest
+
+from json2rst import tables
+
+def _write(fmt, path, batches):
+    headers = ["ID", "Score"]
+    with tables.TABLE_WRITERS[fmt](str(path), headers) as writer:
+        for rows in batches:
+            writer.write(tables.ColumnBatch.from_rows(headers, rows))
+
+def test_csv_writer(tmp_path):
+    path = tmp_path.joinpath("pivot.csv")
+    _write("csv", path, [[("a", 1), ("b", None)], [("c, d", 2.5)]])
+    assert path.read_text() == 'ID,Score\na,1\nb,\n"c, d",2.5\n'
+
+@pytest.mark.parametrize("kinds, expected", [
+    ([None, "int"], "int"),
+    (["int", "float"], "float"),
+    (["float", "int"], "float"),
+    (["int", "string"], "string"),
+    (["bool", "int"], "string"),
+])
+def test_kinds_widen(kinds, expected):
+    assert tables._widen(*kinds) == expected
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_types_widen_across_batches(tmp_path, fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    path = tmp_path.joinpath("pivot." + fmt)
+    _write(fmt, path, [[("a", 1)], [("b", 2.5)], [(3, None)]])
+
+    if fmt == "parquet":
+        table = pyarrow.parquet.read_table(str(path))
+    else:
+        table = pyarrow.ipc.open_file(pa.OSFile(str(path))).read_all()
+
+    assert table.schema.field("ID").type == pa.string()
+    assert table.schema.field("Score").type == pa.float64()
+    assert table.to_pydict() == {"ID": ["a", "b", "3"], "Score": [1.0, 2.5, None]}
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_writer_releases_files_when_writing_fails(tmp_path, monkeypatch, fmt):
+    pytest.importorskip("pyarrow")
+    writer_class = tables.TABLE_WRITERS[fmt]
+
+    def fail(self, record_batch):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(writer_class, "_write", fail)
+    writer = writer_class(str(tmp_path.joinpath("pivot." + fmt)), ["ID", "Score"])
+
+    with pytest.raises(OSError):
+        with writer:
+            writer.write(tables.ColumnBatch.from_rows(["ID", "Score"], [("a", 1)]))
+
+    assert writer.spill.closed
+    if writer.file is not None:
+        assert writer.file.closed
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_writer_discards_spill_when_pivot_fails(tmp_path, fmt):
+    pytest.importorskip("pyarrow")
+    path = tmp_path.joinpath("pivot." + fmt)
+    writer = tables.TABLE_WRITERS[fmt](str(path), ["ID"])
+
+    with pytest.raises(ValueError):
+        with writer:
+            writer.write(tables.ColumnBatch.from_rows(["ID"], [("a",)]))
+            raise ValueError("bad input")
+
+    assert writer.spill.closed
+    assert not path.exists()
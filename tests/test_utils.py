@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from json2rst import manifest
+from json2rst import utils
+from json2rst.errors import InvalidNodeError
+from json2rst.nodes import Nodes
+
+def _per_line(data: str, pad: str) -> str:
+    """The old per-line algorithm, without its ``strlist.index`` bug."""
+    if "\n" not in data:
+        return data
+
+    lines = data.split("\n")
+    output = lines[0] + "\n"
+    for line in lines[1:]:
+        output = output + pad + line + "\n"
+    return output
+
+def _random_values(seed: int, count: int = 500):
+    rng = random.Random(seed)
+    alphabet = ["a", "b", " ", "\t", "\n", "\n", "-", "é", "\r"]
+    for _ in range(count):
+        yield "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("pad", [None, "", "    ", "\t\t"])
+def test_matches_per_line_algorithm(seed, pad):
+    expected_pad = Nodes.LEFTPAD.value if pad is None else pad
+    for data in _random_values(seed):
+        assert utils.handle_newlines(data, pad) == _per_line(data, expected_pad)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_output_lines_are_input_lines(seed):
+    pad = "  "
+    for data in _random_values(seed):
+        out = utils.handle_newlines(data, pad)
+        if "\n" not in data:
+            assert out == data
+            continue
+        assert out.endswith("\n")
+        lines = out[:-1].split("\n")
+        assert lines[0] == data.split("\n")[0]
+        assert all(line.startswith(pad) for line in lines[1:])
+        assert "\n".join([lines[0]] + [line[len(pad):] for line in lines[1:]]) == data
+
+def test_repeated_first_line_is_indented():
+    assert utils.handle_newlines("same\nsame\nsame") == (
+        "same\n" + Nodes.LEFTPAD.value + "same\n" + Nodes.LEFTPAD.value + "same\n"
+    )
+
+def test_trailing_newline():
+    assert utils.handle_newlines("a\nb\n", "  ") == "a\n  b\n  \n"
+
+def test_custom_pad():
+    assert utils.handle_newlines("a\nb", pad="            ") == "a\n            b\n"
+
+def test_single_line_is_unchanged():
+    assert utils.handle_newlines("no newline", "  ") == "no newline"
+
+def test_non_str_raises():
+    with pytest.raises(InvalidNodeError):
+        utils.handle_newlines(3)
+
+@pytest.fixture
+def tree(tmp_path):
+    """An input tree with JSON files, other files, and json2rst's own files, at every level."""
+    for reldir in ["", "2021", "2021/q1", "_output"]:
+        path = tmp_path.joinpath(reldir)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ["page.json", "batch.jsonl", "notes.txt", "pic.png", "page.rst", "json", "page.json.bak"]:
+            path.joinpath(name).write_text("{}")
+        for name in sorted(manifest.OUTPUT_FILES):
+            path.joinpath(name).write_text("{}")
+    return tmp_path
+
+def _found(tree, *args, **kwargs):
+    return [path.relative_to(tree).as_posix() for path in utils.iter_filepaths(str(tree), *args, **kwargs)]
+
+def test_discovery_skips_manifests_and_non_json_files(tree):
+    assert _found(tree) == ["batch.jsonl", "page.json"]
+
+def test_recursive_discovery_skips_manifests_and_non_json_files(tree):
+    assert _found(tree, recursive=True) == [
+        "batch.jsonl",
+        "page.json",
+        "2021/batch.jsonl",
+        "2021/page.json",
+        "2021/q1/batch.jsonl",
+        "2021/q1/page.json",
+        "_output/batch.jsonl",
+        "_output/page.json",
+    ]
+
+def test_recursive_discovery_with_globs(tree):
+    assert _found(tree, recursive=True, include=["*.json"], exclude=["_output"]) == [
+        "page.json",
+        "2021/page.json",
+        "2021/q1/page.json",
+    ]
+
+def test_is_input_file_matches_discovery(tree):
+    found = set(_found(tree, recursive=True))
+    for path in tree.rglob("*"):
+        if path.is_file():
+            relpath = path.relative_to(tree).as_posix()
+            assert utils.is_input_file(str(path), str(tree), recursive=True) == (relpath in found), relpath
@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+
+import pytest
+
+from json2rst import cmd
+from json2rst.manifest import Manifest
+
+def _write(path, obj):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(obj))
+    return str(path)
+
+@pytest.fixture
+def build(tmp_path):
+    """Converts an input tree, like ``--watch`` does on start-up, and returns a function that rebuilds changed paths."""
+    indir = tmp_path.joinpath("in")
+    outdir = tmp_path.joinpath("out")
+    _write(indir.joinpath("a.json"), {"ID": "EIQ-1", "Status": "Open"})
+    _write(indir.joinpath("b.json"), {"ID": "EIQ-2", "Status": "Open"})
+    _write(indir.joinpath("2021", "c.json"), {"ID": "EIQ-3", "Status": "Open"})
+    indir.joinpath("batch.jsonl").write_text("\n".join(json.dumps({"ID": "R-{}".format(n)}) for n in range(3)))
+
+    args = argparse.Namespace(
+        infiles=str(indir), outdir=str(outdir), recursive=True, include=None, exclude=None,
+        jobs=1, force=False, images="embed", name_key=None, json_backend="auto",
+        pipeline=False, read_workers=1, render_workers=1, write_workers=1, queue_size=4,
+    )
+    build_manifest = Manifest(str(outdir.absolute()))
+    assert cmd._convert_json_to_rst(str(indir), str(outdir), jobs=1, recursive=True, build_manifest=build_manifest) == 0
+
+    def rebuild(*changed, **options):
+        for key, val in options.items():
+            setattr(args, key, val)
+        assert cmd._rebuild(args, set(changed), build_manifest) == 0
+        saved = Manifest(str(outdir.absolute()))
+        assert saved.entries == build_manifest.entries #: Saved, if anything changed.
+        return sorted(
+            os.path.relpath(os.path.join(root, name), str(outdir))
+            for root, _, names in os.walk(str(outdir))
+            for name in names
+            if not name.startswith(".")
+        )
+
+    rebuild.indir = indir
+    rebuild.outdir = outdir
+    return rebuild
+
+OUTPUTS = ["2021/c.rst", "a.rst", "b.rst", "batch-00000.rst", "batch-00001.rst", "batch-00002.rst"]
+
+def test_create(build):
+    path = _write(build.indir.joinpath("d.json"), {"ID": "EIQ-4"})
+    assert build(path) == sorted(OUTPUTS + ["d.rst"])
+
+def test_create_directory(build):
+    path = build.indir.joinpath("2022")
+    _write(path.joinpath("e.json"), {"ID": "EIQ-5"})
+    assert build(str(path)) == sorted(OUTPUTS + ["2022/e.rst"])
+
+def test_edit(build):
+    path = _write(build.indir.joinpath("a.json"), {"ID": "EIQ-1", "Status": "Closed"})
+    assert build(path) == OUTPUTS
+    assert "Closed" in build.outdir.joinpath("a.rst").read_text()
+
+def test_delete(build):
+    path = build.indir.joinpath("b.json")
+    path.unlink()
+    assert build(str(path)) == [name for name in OUTPUTS if name != "b.rst"]
+
+def test_delete_directory(build):
+    path = build.indir.joinpath("2021")
+    path.joinpath("c.json").unlink()
+    path.rmdir()
+    assert build(str(path)) == [name for name in OUTPUTS if name != "2021/c.rst"]
+
+def test_removed_records_are_removed(build):
+    path = build.indir.joinpath("batch.jsonl")
+    path.write_text(json.dumps({"ID": "R-0"}))
+    assert build(str(path)) == [name for name in OUTPUTS if name not in ["batch-00001.rst", "batch-00002.rst"]]
+
+def test_renamed_page_is_removed(build):
+    path = build.indir.joinpath("a.json")
+    assert build(str(path), name_key="ID") == sorted([name for name in OUTPUTS if name != "a.rst"] + ["EIQ-1.rst"])
+
+def test_changed_image_rebuilds_pages_that_embed_it(build):
+    pic = build.indir.joinpath("pic.png")
+    pic.write_bytes(b"one")
+    path = _write(build.indir.joinpath("a.json"), {"ID": "EIQ-1", "Pic": [{"image": str(pic)}]})
+    build(path)
+    before = build.outdir.joinpath("a.rst").read_text()
+
+    pic.write_bytes(b"two")
+    assert build(str(pic)) == OUTPUTS
+    assert build.outdir.joinpath("a.rst").read_text() != before